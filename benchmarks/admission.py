@@ -0,0 +1,98 @@
+"""Tail latency under overload, with and without admission control
+
+Drives AdmissionMiddleware in process with an open-loop arrival rate of
+--overload times the capacity of a handler holding one of --slots workers
+for --service-time seconds, as the threadpool and Mongo pool do. Latency is
+measured from the scheduled arrival of each request, so a slow server does
+not slow the load down. Without admission every request waits for a worker
+and latency grows with the backlog; with it, requests over budget are shed
+with 503 and the admitted ones wait at most the queue. Shedding is not free:
+the 503s are answered on the same event loop as the load, which shows in
+the tail of the admitted requests.
+
+Usage: python benchmarks/admission.py [--slots 4] [--service-time 0.01] [--overload 10] [--duration 2]
+                                      [--queue-size 16] [--queue-timeout 0.5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "api"))
+
+from utils.admission import AdmissionBudget, AdmissionMiddleware  # noqa: E402
+
+SCOPE = {"type": "http", "method": "GET", "path": "/roles", "headers": [], "query_string": b""}
+
+
+def percentile(values, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+async def run(args, admission: bool):
+    workers = asyncio.Semaphore(args.slots)
+
+    async def handler(scope, receive, send):
+        async with workers:
+            await asyncio.sleep(args.service_time)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    app = handler
+    if admission:
+        app = AdmissionMiddleware(handler, read_budget=AdmissionBudget(
+            "read", args.slots, args.queue_size, args.queue_timeout))
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    latencies, shed = [], []
+
+    async def request(arrival: float):
+        statuses = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+        await app(dict(SCOPE), receive, send)
+        (latencies if statuses[0] == 200 else shed).append(time.perf_counter() - arrival)
+
+    rate = args.overload * args.slots / args.service_time
+    rng = random.Random(0)
+    tasks = []
+    started = time.perf_counter()
+    arrival = started
+    while arrival < started + args.duration:
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        while arrival <= time.perf_counter():
+            tasks.append(asyncio.ensure_future(request(arrival)))
+            arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return sorted(latencies), sorted(shed), rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots", type=int, default=4, help="concurrent requests the handler serves")
+    parser.add_argument("--service-time", type=float, default=0.01, help="seconds a request holds a slot")
+    parser.add_argument("--overload", type=float, default=10, help="arrival rate over the handler capacity")
+    parser.add_argument("--duration", type=float, default=2,
+                        help="seconds of arrivals, the run without admission takes --overload times longer to drain")
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=0.5)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for admission in (False, True):
+        admitted, shed, rate = loop.run_until_complete(run(args, admission))
+        print("%-17s %6.0f req/s offered  %6d served  p50 %7.1fms  p99 %7.1fms  max %7.1fms  %6d shed  p99 %5.1fms" % (
+            "admission" if admission else "without admission", rate, len(admitted),
+            percentile(admitted, 0.5) * 1000, percentile(admitted, 0.99) * 1000,
+            (admitted[-1] if admitted else float("nan")) * 1000,
+            len(shed), percentile(shed, 0.99) * 1000))
+
+
+if __name__ == "__main__":
+    main()
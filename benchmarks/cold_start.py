@@ -0,0 +1,79 @@
+"""Cold start of a namespace policy, rebuilt from its records or loaded from a snapshot file
+
+Times what a starting worker does before it can decide a check: compiling
+the records into a policy, or reading the snapshot file, checking it and
+compiling the rules while reading the bindings in place. Records are
+generated as in policy_memory.py, so the rebuild figure leaves out reading
+them from Mongo; with --namespace, they are read from the configured Mongo
+and the rebuild figure includes it. Serializing the snapshot bodies is
+timed apart, both paths defer it to the first /policy/snapshot request
+unless the file holds them.
+
+Usage: python benchmarks/cold_start.py [--bindings 1000000] [--directory /tmp/iam-policy] [--bodies] [--namespace default]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "api"))
+
+# Imports models before policy, as the server does
+from policy_memory import generate  # noqa: E402
+from models.permission.permission_model import PERMISSION_MODEL_NAME  # noqa: E402
+from policy.engine import CompiledPolicy  # noqa: E402
+from policy.snapshot import (_snapshot, build_snapshot, load_snapshot,  # noqa: E402
+                             save_snapshot)
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bindings", type=int, default=1000000)
+    parser.add_argument("--roles", type=int, default=500)
+    parser.add_argument("--groups", type=int, default=5000)
+    parser.add_argument("--subjects", type=int, default=50000)
+    parser.add_argument("--per-permission", type=int, default=20)
+    parser.add_argument("--directory", default="/tmp/iam-policy", help="directory of the snapshot file")
+    parser.add_argument("--bodies", action="store_true", help="serialize the snapshot bodies into the file")
+    parser.add_argument("--namespace", help="read the records of this namespace from the configured Mongo")
+    args = parser.parse_args()
+
+    if args.namespace:
+        from db import CRUD
+        from db.journal import CHANGES_SEQUENCE
+        from utils import DB_NAME, get_client
+
+        namespace, db = args.namespace, get_client()[DB_NAME]
+        version = CRUD.current_sequence(db, CHANGES_SEQUENCE)
+        snapshot, rebuild = timed(lambda: build_snapshot(db, namespace, version))
+    else:
+        namespace = "benchmark"
+        records = generate(args.bindings, args.roles, args.groups, args.subjects, args.per_permission)
+        snapshot, rebuild = timed(lambda: _snapshot(namespace, 1, records, CompiledPolicy(1, records)))
+    print("rebuild          %7.2fs%s" % (rebuild, "" if args.namespace else "  (records in memory, Mongo not read)"))
+
+    if args.bodies:
+        _, serialize = timed(lambda: snapshot.buffers.serialized or len(snapshot.buffers))
+        print("serialize bodies %7.2fs" % serialize)
+    path = os.path.join(args.directory, namespace + ".snapshot")
+    if os.path.exists(path):
+        os.remove(path)
+    size, save = timed(lambda: save_snapshot(args.directory, namespace, snapshot))
+    print("save             %7.2fs  %.1f MB" % (save, size / 1e6))
+
+    loaded, load = timed(lambda: load_snapshot(args.directory, namespace))
+    permission = next(iter(loaded.records[PERMISSION_MODEL_NAME].values()), None)
+    subject = (permission or {}).get("subjects") or [{"kind": "USER", "name": "nobody"}]
+    _, check = timed(lambda: loaded.policy.check((subject[0]["kind"], subject[0]["name"]), "EVENT", "event-0-1", "view"))
+    print("load             %7.2fs  first check %.2fms, bodies %s" % (
+        load, check * 1000, "from the file" if loaded.buffers.serialized else "serialized on first request"))
+
+
+if __name__ == "__main__":
+    main()
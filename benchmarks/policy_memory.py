@@ -0,0 +1,120 @@
+"""Memory of the compiled policy per binding
+
+Generates the records of a deployment with the given number of bindings
+(subjects of permissions) and group memberships, compiles them into a
+CompiledPolicy and reports the bytes it allocates per binding or
+membership, next to the cost of the same data held as pydantic models
+(measured on a sample and extrapolated). The records themselves are not
+counted in either figure. With --shared-dir, also reports the size of the
+shared index and what each worker attached to it still allocates.
+
+Usage: python benchmarks/policy_memory.py [--bindings 1000000] [--roles 500] [--groups 5000] [--subjects 50000] [--per-permission 20] [--shared-dir /dev/shm/iam-policy]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "api"))
+
+from models import Group, Permission  # noqa: E402
+from models.group.group_model import GROUP_MODEL_NAME  # noqa: E402
+from models.permission.permission_model import PERMISSION_MODEL_NAME  # noqa: E402
+from models.resource.resource_model import RESOURCE_MODEL_NAME  # noqa: E402
+from models.resource_action.resource_action_model import RESOURCE_ACTION_MODEL_NAME  # noqa: E402
+from models.role.role_model import ROLE_MODEL_NAME  # noqa: E402
+from policy import CompiledPolicy  # noqa: E402
+from policy.shared import SharedIndexes  # noqa: E402
+
+ACTIONS = ["view", "read", "update", "delete", "publish", "invite", "export", "archive"]
+
+
+def generate(bindings: int, roles: int, groups: int, subjects: int, per_permission: int) -> dict:
+    rng = random.Random(0)
+    # Resources are left out, only the bindings are measured
+    records = {model_name: {} for model_name in (ROLE_MODEL_NAME, PERMISSION_MODEL_NAME, GROUP_MODEL_NAME,
+                                                 RESOURCE_ACTION_MODEL_NAME, RESOURCE_MODEL_NAME)}
+    for index in range(roles):
+        records[ROLE_MODEL_NAME]["role-%d" % index] = {
+            "uuid": "role-%d" % index, "metadata": {"name": "role-%d" % index},
+            "rules": [{"resource_kind": "EVENT", "resource": "event-%d-*" % rule,
+                       "resource_actions": rng.sample(ACTIONS, 3)} for rule in range(3)]}
+
+    def subject():
+        if rng.random() < 0.2:
+            return {"kind": "GROUP", "name": "group-%d" % rng.randrange(groups)}
+        return {"kind": "USER", "name": "user-%d@gala.iam.com" % rng.randrange(subjects)}
+
+    for index in range(groups):
+        records[GROUP_MODEL_NAME]["group-%d" % index] = {
+            "uuid": "group-%d" % index, "metadata": {"name": "group-%d" % index},
+            "subjects": [{"kind": "USER", "name": "user-%d@gala.iam.com" % rng.randrange(subjects)}
+                         for _ in range(per_permission)]}
+    for index in range(bindings // per_permission):
+        records[PERMISSION_MODEL_NAME]["permission-%d" % index] = {
+            "uuid": "permission-%d" % index, "metadata": {"name": "permission-%d" % index},
+            "role": "role-%d" % rng.randrange(roles),
+            "subjects": [subject() for _ in range(per_permission)]}
+    return records
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    gc.collect()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del built
+    return allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bindings", type=int, default=1000000)
+    parser.add_argument("--roles", type=int, default=500)
+    parser.add_argument("--groups", type=int, default=5000)
+    parser.add_argument("--subjects", type=int, default=50000)
+    parser.add_argument("--per-permission", type=int, default=20,
+                        help="subjects per permission and per group")
+    parser.add_argument("--sample", type=float, default=0.01,
+                        help="fraction of the records held as pydantic models")
+    parser.add_argument("--shared-dir", help="directory to publish a shared index into, eg. /dev/shm/iam-policy")
+    args = parser.parse_args()
+
+    records = generate(args.bindings, args.roles, args.groups, args.subjects, args.per_permission)
+    bindings = sum(len(permission["subjects"]) for permission in records[PERMISSION_MODEL_NAME].values())
+    memberships = sum(len(group["subjects"]) for group in records[GROUP_MODEL_NAME].values())
+    edges = bindings + memberships
+    print("%d bindings, %d group memberships, %d roles" % (bindings, memberships, args.roles))
+
+    started = time.perf_counter()
+    compiled = measure(lambda: CompiledPolicy(1, records))
+    print("compiled policy  %8.1f MB  %6.1f bytes per binding or membership  (built with tracing in %.1fs)" % (
+        compiled / 1e6, compiled / edges, time.perf_counter() - started))
+
+    if args.shared_dir:
+        index = SharedIndexes(args.shared_dir).get("benchmark", 1, records)
+        attached = measure(lambda: CompiledPolicy(1, records, index))
+        print("shared index     %8.1f MB  %6.1f bytes per binding or membership  (once per host)" % (
+            index.size / 1e6, index.size / edges))
+        print("attached policy  %8.1f MB  %6.1f bytes per binding or membership  (per worker)" % (
+            attached / 1e6, attached / edges))
+
+    permissions = list(records[PERMISSION_MODEL_NAME].values())
+    permissions = permissions[:max(1, int(len(permissions) * args.sample))]
+    groups = list(records[GROUP_MODEL_NAME].values())
+    groups = groups[:max(1, int(len(groups) * args.sample))]
+    sampled = sum(len(record["subjects"]) for record in permissions + groups)
+    models = measure(lambda: [Permission(kind="permissions", **record) for record in permissions] +
+                     [Group(kind="groups", **record) for record in groups])
+    print("pydantic models  %8.1f MB  %6.1f bytes per binding or membership  (extrapolated from %d)" % (
+        models / sampled * edges / 1e6, models / sampled, sampled))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Query plan regression check of the queries issued by the API
+
+Seeds a scratch database of a local mongod, then drives the API through the
+name lookups, the validations of every create and update, the list
+endpoints and the reverse lookups while a command listener records every
+query sent to Mongo. Each distinct query shape is explained once with
+executionStats, and the run fails when a plan contains a COLLSCAN or
+examines more than --max-ratio times the documents it returns.
+
+Substring searches (`search=`) are not exercised: they cannot use an index
+by design.
+
+Usage: python benchmarks/query_plans.py [--uri mongodb://localhost:27017] [--max-ratio 10] [--scale 1]
+"""
+import argparse
+import os
+import sys
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "api"))
+
+from bson import json_util  # noqa: E402
+from pymongo import MongoClient, monitoring  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+from models import ensure_indexes  # noqa: E402
+from utils import get_db  # noqa: E402
+
+DB_NAME = "gala_iam_query_plans"
+QUERY_COMMANDS = ("find", "aggregate", "count", "distinct",
+                  "findAndModify", "update", "delete")
+# Session and routing fields added by the driver, not part of the query
+DRIVER_FIELDS = ("lsid", "txnNumber", "$db", "$clusterTime",
+                 "$readPreference", "readConcern", "writeConcern")
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Keeps the first command of every query shape while recording is on"""
+
+    def __init__(self):
+        self.recording = False
+        self.label = None
+        self.commands: Dict[Tuple[str, str, str], Tuple[str, dict]] = OrderedDict()
+
+    def started(self, event):
+        if not self.recording or event.command_name not in QUERY_COMMANDS or event.database_name != DB_NAME:
+            return
+        command = {key: value for key, value in event.command.items()
+                   if key not in DRIVER_FIELDS}
+        # Multi statement writes are explained one statement at a time
+        for statement in split_statements(event.command_name, command):
+            key = (event.command_name, command[event.command_name], shape(statement))
+            self.commands.setdefault(key, (self.label, statement))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def split_statements(command_name: str, command: dict) -> Iterator[dict]:
+    statements_key = {"update": "updates", "delete": "deletes"}.get(command_name)
+    if statements_key is None:
+        yield command
+        return
+    for statement in command[statements_key]:
+        yield dict(command, **{statements_key: [statement]})
+
+
+def shape(value) -> str:
+    """Query with its values replaced by their type, equal for queries planned alike"""
+    def strip(node):
+        if isinstance(node, dict):
+            return {key: strip(child) for key, child in node.items()}
+        if isinstance(node, list):
+            return [strip(child) for child in node[:1]]
+        return type(node).__name__
+    return json_util.dumps(strip(value), sort_keys=True)
+
+
+def walk(node) -> Iterator[dict]:
+    if isinstance(node, dict):
+        yield node
+        for child in node.values():
+            yield from walk(child)
+    elif isinstance(node, list):
+        for child in node:
+            yield from walk(child)
+
+
+def check_plan(explain: dict, max_ratio: float) -> Tuple[List[str], str]:
+    """Problems of an explained query and a one line summary of its plan"""
+    stages = [node for node in walk(explain) if "stage" in node]
+    winning = [node["stage"] + (" " + node["indexName"] if "indexName" in node else "")
+               for node in stages if "executionTimeMillisEstimate" in node or "works" in node]
+    statistics = [node for node in walk(explain) if "totalDocsExamined" in node]
+    examined = sum(node["totalDocsExamined"] for node in statistics)
+    returned = sum(node.get("nReturned", 0) for node in statistics)
+    matched = max([node.get("nMatched", 0) for node in stages] + [returned, 1])
+
+    problems = []
+    if any(node["stage"] == "COLLSCAN" for node in stages):
+        problems.append("COLLSCAN")
+    if examined > max_ratio * matched:
+        problems.append("examined %d documents for %d" % (examined, matched))
+    return problems, "%s (examined %d, returned %d)" % (" > ".join(winning), examined, matched)
+
+
+def seed(client: TestClient, scale: int):
+    """Policy records of a mid-sized deployment, in two namespaces so that namespace scoping is exercised"""
+    for prefix in ("", "/namespaces/other"):
+        for index in range(100 * scale):
+            client.post(prefix + "/users", json={"metadata": {"name": "user-%d@gala.iam.com" % index}})
+        for index in range(20 * scale):
+            client.post(prefix + "/service_accounts", json={"metadata": {"name": "svc-%d.service.svc@gala.iam.com" % index}})
+        for index in range(50 * scale):
+            resource = "event-%d" % index
+            client.post(prefix + "/resources", json={"metadata": {"name": resource, "resource_kind": "EVENT"}})
+            for action in ("read", "update", "delete"):
+                client.post(prefix + "/resource_actions", json={"metadata": {
+                    "name": action, "resource_kind": "EVENT", "resource": resource}})
+        for index in range(20 * scale):
+            client.post(prefix + "/roles", json={"metadata": {"name": "role-%d" % index}, "rules": [
+                {"resource": "event-%d" % index, "resource_kind": "EVENT", "resource_actions": ["read", "update"]}]})
+        for index in range(20 * scale):
+            subjects = [{"kind": "USER", "name": "user-%d@gala.iam.com" % (index * 5 + offset)} for offset in range(5)]
+            if index:
+                subjects.append({"kind": "GROUP", "name": "group-%d" % (index - 1)})
+            client.post(prefix + "/groups", json={"metadata": {"name": "group-%d" % index}, "subjects": subjects})
+        for index in range(40 * scale):
+            client.post(prefix + "/permissions", json={
+                "metadata": {"name": "permission-%d" % index}, "role": "role-%d" % (index % (20 * scale)),
+                "subjects": [{"kind": "GROUP", "name": "group-%d" % (index % (20 * scale))},
+                             {"kind": "USER", "name": "user-%d@gala.iam.com" % index}]})
+
+
+def exercise(client: TestClient, recorder: QueryRecorder):
+    """Name lookups, validations, list endpoints and reverse lookups"""
+    def run(label: str, method: str, path: str, **kwargs):
+        recorder.label = label
+        return client.request(method, path, **kwargs)
+
+    first = {collection: run("list " + collection, "GET", "/" + collection).json()[0]
+             for collection in ("users", "service_accounts", "groups", "permissions",
+                                "resources", "resource_actions", "roles")}
+    for collection in first:
+        run("list %s with total" % collection, "GET", "/%s?include_total=true&limit=10" % collection)
+        run("list %s sorted" % collection, "GET", "/%s?sort_by=metadata.name" % collection)
+        run("get %s" % collection, "GET", "/%s/%s" % (collection, first[collection]["uuid"]))
+
+    # Creates validate references and run find_by_name for uniqueness
+    run("create user", "POST", "/users", json={"metadata": {"name": "plan-user@gala.iam.com"}})
+    run("create duplicate user", "POST", "/users", json={"metadata": {"name": "user-1@gala.iam.com"}})
+    run("create service account", "POST", "/service_accounts",
+        json={"metadata": {"name": "plan.service.svc@gala.iam.com"}})
+    run("create resource", "POST", "/resources", json={"metadata": {"name": "plan-event", "resource_kind": "EVENT"}})
+    run("create resource action", "POST", "/resource_actions",
+        json={"metadata": {"name": "read", "resource_kind": "EVENT", "resource": "plan-event"}})
+    run("create role", "POST", "/roles", json={"metadata": {"name": "plan-role"}, "rules": [
+        {"resource": "event-1", "resource_kind": "EVENT", "resource_actions": ["read", "delete"]}]})
+    run("create invalid role", "POST", "/roles", json={"metadata": {"name": "plan-invalid-role"}, "rules": [
+        {"resource": "missing", "resource_kind": "EVENT", "resource_actions": ["read"]}]})
+    run("create group", "POST", "/groups", json={"metadata": {"name": "plan-group"}, "subjects": [
+        {"kind": "USER", "name": "user-1@gala.iam.com"},
+        {"kind": "SERVICE_ACCOUNT", "name": "svc-1.service.svc@gala.iam.com"},
+        {"kind": "GROUP", "name": "group-3"}]})
+    run("create permission", "POST", "/permissions", json={
+        "metadata": {"name": "plan-permission"}, "role": "plan-role",
+        "subjects": [{"kind": "USER", "name": "plan-user@gala.iam.com"}, {"kind": "GROUP", "name": "plan-group"}]})
+    run("create invalid permission", "POST", "/permissions", json={
+        "metadata": {"name": "plan-invalid-permission"}, "role": "missing-role", "subjects": []})
+
+    # Updates validate renames, and cascade them to the referencing records
+    run("rename user", "PATCH", "/users/%s" % first["users"]["uuid"],
+        json={"metadata": {"name": "renamed-user@gala.iam.com"}})
+    run("rename role", "PATCH", "/roles/%s" % first["roles"]["uuid"], json={"metadata": {"name": "renamed-role"}})
+    run("update group", "PUT", "/groups/%s" % first["groups"]["uuid"], json={
+        "metadata": {"name": first["groups"]["metadata"]["name"]},
+        "subjects": [{"kind": "USER", "name": "user-2@gala.iam.com"}]})
+    run("update permission", "PUT", "/permissions/%s" % first["permissions"]["uuid"], json={
+        "metadata": {"name": first["permissions"]["metadata"]["name"]}, "role": "role-2",
+        "subjects": [{"kind": "USER", "name": "user-2@gala.iam.com"}]})
+
+    # Reverse lookups
+    run("role permissions", "GET", "/roles/%s/permissions" % first["roles"]["uuid"])
+    run("user groups", "GET", "/users/%s/groups" % first["users"]["uuid"])
+    run("user transitive groups", "GET", "/users/%s/groups?transitive=true" % first["users"]["uuid"])
+    run("user permissions", "GET", "/users/%s/permissions" % first["users"]["uuid"])
+    run("service account permissions", "GET",
+        "/service_accounts/%s/permissions" % first["service_accounts"]["uuid"])
+
+    run("delete user", "DELETE", "/users/%s" % first["users"]["uuid"])
+    run("policy snapshot", "GET", "/policy/snapshot")
+    run("watch", "GET", "/watch?since=0&timeout=0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=os.environ.get("MONGO_DB__URI", "mongodb://localhost:27017"))
+    parser.add_argument("--max-ratio", type=float, default=10,
+                        help="Maximum documents examined per document returned or matched")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier of the seeded record counts")
+    args = parser.parse_args()
+
+    recorder = QueryRecorder()
+    mongo = MongoClient(args.uri, event_listeners=[recorder])
+    mongo.drop_database(DB_NAME)
+    db = mongo[DB_NAME]
+    ensure_indexes(db)
+
+    server.app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(server.app)
+    seed(client, args.scale)
+
+    recorder.recording = True
+    exercise(client, recorder)
+    recorder.recording = False
+
+    failures = 0
+    for label, command in recorder.commands.values():
+        explain = db.command("explain", command, verbosity="executionStats")
+        problems, summary = check_plan(explain, args.max_ratio)
+        failures += bool(problems)
+        print("%-4s %-32s %-16s %s %s" % ("FAIL" if problems else "ok", label, command.get(next(iter(command))),
+                                          summary, "; ".join(problems)))
+        if problems:
+            print("     %s" % json_util.dumps(command))
+
+    print("%d query shapes, %d failing" % (len(recorder.commands), failures))
+    mongo.drop_database(DB_NAME)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Serialization CPU and bytes on the wire of list responses
+
+Renders a page of groups the way the list routes do (jsonable_encoder, then
+the response class) with the stdlib JSONResponse and with ORJSONResponse,
+and reports CPU time per MB rendered and the gzip-compressed size.
+
+Usage: python benchmarks/serialization.py [--groups 200] [--subjects 50] [--rounds 20]
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "api"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from models import Group  # noqa: E402
+from utils.responses import ORJSONResponse, orjson  # noqa: E402
+
+
+def build_page(groups: int, subjects: int):
+    return [Group(uuid="00000000-0000-0000-0000-%012d" % i, kind="groups",
+                  metadata={"name": "group-%d" % i},
+                  subjects=[{"kind": "USER", "name": "user-%d-%d@gala.iam.com" % (i, j)}
+                            for j in range(subjects)])
+            for i in range(groups)]
+
+
+def measure(response_class, page, rounds: int):
+    encoded = jsonable_encoder(page)
+    started = time.process_time()
+    for _ in range(rounds):
+        body = response_class(encoded).body
+    render_cpu = time.process_time() - started
+
+    started = time.process_time()
+    for _ in range(rounds):
+        response_class(jsonable_encoder(page))
+    total_cpu = time.process_time() - started
+    return body, render_cpu, total_cpu
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--subjects", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    page = build_page(args.groups, args.subjects)
+    if orjson is None:
+        print("orjson is not installed, ORJSONResponse falls back to the stdlib encoder")
+
+    print("%-15s %10s %14s %20s %12s" % ("response", "bytes", "render ms/MB",
+                                          "encode+render ms/MB", "gzip bytes"))
+    for response_class in (JSONResponse, ORJSONResponse):
+        body, render_cpu, total_cpu = measure(response_class, page, args.rounds)
+        megabytes = len(body) * args.rounds / 1e6
+        print("%-15s %10d %14.1f %20.1f %12d" % (
+            response_class.__name__, len(body), render_cpu * 1000 / megabytes,
+            total_cpu * 1000 / megabytes, len(gzip.compress(body, compresslevel=9))))
@@ -0,0 +1,131 @@
+"""Throughput of the production server by number of workers
+
+Starts gunicorn with gunicorn.conf.py once per worker count, loads one path
+over keep-alive connections from several client processes, and reports
+requests per second and latency percentiles. Run it on the host the server
+is sized for, against a Mongo instance holding representative data; the
+load generator competes with the workers for cores, so give it --clients
+processes on top of the largest worker count or run it from another host
+with --url.
+
+Usage: python benchmarks/throughput.py [--workers 1,2,4,8] [--path /roles] [--duration 10]
+                                       [--clients 4] [--connections 16] [--url http://host:port]
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import time
+from urllib.parse import urlsplit
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "api")
+
+
+def load(url: str, path: str, connections: int, duration: float, results):
+    """Client process: `connections` threads each sending requests back to back over one connection"""
+    import threading
+
+    parts = urlsplit(url)
+    latencies = []
+    errors = [0]
+    deadline = time.monotonic() + duration
+
+    def run():
+        connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[0] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=run) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((latencies, errors[0]))
+
+
+def measure(url: str, path: str, clients: int, connections: int, duration: float) -> dict:
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=load, args=(url, path, connections, duration, results))
+                 for _ in range(clients)]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        process_latencies, process_errors = results.get()
+        latencies.extend(process_latencies)
+        errors += process_errors
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+
+    def percentile(share):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000 if latencies else 0
+
+    return {"rps": len(latencies) / duration, "p50": percentile(0.5), "p99": percentile(0.99), "errors": errors}
+
+
+def wait_ready(url: str, path: str, timeout: float = 60):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=1)
+            connection.request("GET", path)
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start within %ss" % timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--path", default="/roles")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one per worker count")
+    args = parser.parse_args()
+
+    print("%8s %10s %9s %9s %7s" % ("workers", "req/s", "p50 ms", "p99 ms", "errors"))
+    if args.url:
+        result = measure(args.url, args.path, args.clients, args.connections, args.duration)
+        print("%8s %10.0f %9.1f %9.1f %7d" % ("-", result["rps"], result["p50"], result["p99"], result["errors"]))
+        return
+
+    url = "http://127.0.0.1:%d" % args.port
+    for workers in [int(count) for count in args.workers.split(",")]:
+        env = dict(os.environ, SERVER__WORKERS=str(workers), SERVER__BIND="127.0.0.1:%d" % args.port)
+        server = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py", "server:app"],
+                                  cwd=API_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(url, args.path)
+            # Warm up every worker before measuring
+            measure(url, args.path, args.clients, args.connections, 1)
+            result = measure(url, args.path, args.clients, args.connections, args.duration)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        print("%8d %10.0f %9.1f %9.1f %7d" % (workers, result["rps"], result["p50"], result["p99"], result["errors"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,37 @@
+import hashlib
+import os
 from datetime import datetime
 from typing import List
 from uuid import uuid4
 
+from bson import json_util
 from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING
 from pymongo.collection import ReturnDocument
 
 from utils import RecordNotFoundException
+from utils.cache import TTLCache
+from utils.single_flight import SingleFlight
 from .database import Database
 
+COUNTS__CACHE_TTL = float(os.environ.get("COUNTS__CACHE_TTL", 5))
+SEQUENCE_MODEL_NAME = "sequences"
+
+count_cache = TTLCache(ttl=COUNTS__CACHE_TTL)
+# Coalesces identical concurrent reads, invalidated whenever a change is journaled
+read_flight = SingleFlight("reads")
+
+
+def query_key(filter_params: dict) -> str:
+    """Stable digest of a Mongo filter, equal for filters differing only in key order"""
+    return hashlib.sha1(json_util.dumps(
+        filter_params, sort_keys=True).encode()).hexdigest()
+
 
 class CRUD:
 
     @staticmethod
-    def find(db: Database, model_name, skip: int = 0, limit: int = 25, filter_params: dict = None, sort: List[str] = None) -> List[BaseModel]:
+    def find(db: Database, model_name, skip: int = 0, limit: int = 25, filter_params: dict = None, sort: List[str] = None, hint: list = None) -> List[BaseModel]:
         assert db, "DB not provided"
         assert model_name, "ModelName not provided"
         if not filter_params:
@@ -22,21 +41,65 @@ class CRUD:
 
         sort_params = []
         for param in sort:
-            direction = 1 if param and param[0] == "-" else -1
-            sort_params.append((param, direction))
+            if param.startswith("-"):
+                sort_params.append((param[1:], DESCENDING))
+            else:
+                sort_params.append((param, ASCENDING))
 
-        cursor = db[model_name].find(filter_params).limit(limit)
+        cursor = db[model_name].find(filter_params).skip(skip).limit(limit)
         if sort_params:
             cursor = cursor.sort(sort_params)
+        if hint:
+            cursor = cursor.hint(hint)
         data = [record for record in cursor]
         return data
 
     @staticmethod
-    def find_by_uuid(db: Database, model_name, uuid: str) -> BaseModel:
+    def count(db: Database, model_name, filter_params: dict = None) -> int:
+        """Counts the records matching filter_params, cached for COUNTS__CACHE_TTL seconds
+
+        Unfiltered counts come from the collection metadata, filtered ones
+        from count_documents on the filter's index.
+        """
+        assert db, "DB not provided"
+        assert model_name, "ModelName not provided"
+        if not filter_params:
+            return count_cache.get_or_set(
+                (model_name, None), db[model_name].estimated_document_count)
+
+        return count_cache.get_or_set(
+            (model_name, query_key(filter_params)),
+            lambda: db[model_name].count_documents(filter_params))
+
+    @staticmethod
+    def next_sequence(db: Database, name: str, count: int = 1) -> int:
+        """Atomically increments the named monotonic sequence by count and returns its new value
+
+        The time of the increment is kept in `at`, to tell numbers still
+        being used from numbers whose user gave up.
+        """
+        assert db, "DB not provided"
+        sequence = db[SEQUENCE_MODEL_NAME].find_one_and_update(
+            {"_id": name}, {"$inc": {"value": count}, "$set": {"at": datetime.utcnow()}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        return sequence["value"]
+
+    @staticmethod
+    def current_sequence(db: Database, name: str) -> int:
+        """Returns the last value of the named sequence, 0 if it was never incremented"""
+        assert db, "DB not provided"
+        sequence = db[SEQUENCE_MODEL_NAME].find_one({"_id": name})
+        return sequence["value"] if sequence else 0
+
+    @staticmethod
+    def find_by_uuid(db: Database, model_name, uuid: str, namespace: str = None) -> BaseModel:
         assert db, "DB not provided"
         assert model_name, "ModelName not provided"
         assert uuid, "%s UUID not provided" % model_name
-        record = db[model_name].find_one({"uuid": uuid})
+        filter_params = {"uuid": uuid}
+        if namespace is not None:
+            filter_params["metadata.namespace"] = namespace
+        record = db[model_name].find_one(filter_params)
         if not record:
             raise RecordNotFoundException(model_name, uuid)
         return record
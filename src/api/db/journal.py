@@ -0,0 +1,127 @@
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, IndexModel
+
+from .crud import CRUD, SEQUENCE_MODEL_NAME, read_flight
+from .database import Database
+
+JOURNAL__RETENTION = int(os.environ.get("JOURNAL__RETENTION", 7 * 24 * 3600))
+JOURNAL__GAP_TIMEOUT = float(os.environ.get("JOURNAL__GAP_TIMEOUT", 5))
+
+JOURNAL_MODEL_NAME = "journal"
+# Incremented once per journaled change, shared by every namespace
+CHANGES_SEQUENCE = "changes"
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+JOURNAL_INDEXES = [
+    IndexModel([("seq", ASCENDING)], unique=True),
+    IndexModel([("at", ASCENDING)], expireAfterSeconds=JOURNAL__RETENTION),
+]
+
+
+class JournalTruncatedException(Exception):
+    """Changes after the requested sequence were already dropped from the journal"""
+
+    def __init__(self, since: int, oldest: int):
+        super().__init__("Changes after %d are no longer journaled, oldest is %d" % (since, oldest))
+        self.since = since
+        self.oldest = oldest
+
+
+def ensure_journal_indexes(db: Database) -> List[str]:
+    return db[JOURNAL_MODEL_NAME].create_indexes(JOURNAL_INDEXES)
+
+
+def record_changes(db: Database, model_name: str, namespace: str, uuids: Iterable[str], operation: str = UPSERT) -> int:
+    """Journals changed records, each under its own number of the changes sequence
+
+    Arguments:
+        db {Database} -- Database connection
+        model_name {str} -- Collection of the changed records
+        namespace {str} -- Namespace of the changed records
+        uuids {Iterable[str]} -- UUIDs of the changed records
+
+    Keyword Arguments:
+        operation {str} -- UPSERT, or DELETE for tombstones (default: {UPSERT})
+
+    Returns:
+        int -- Last journaled sequence number, 0 when nothing was journaled
+    """
+    uuids = list(uuids)
+    if not uuids:
+        return 0
+    last = CRUD.next_sequence(db, CHANGES_SEQUENCE, len(uuids))
+    first = last - len(uuids) + 1
+    at = datetime.utcnow()
+    db[JOURNAL_MODEL_NAME].insert_many(
+        [{"seq": first + offset, "namespace": namespace, "kind": model_name,
+          "uuid": uuid, "op": operation, "at": at}
+         for offset, uuid in enumerate(uuids)],
+        ordered=False)
+    read_flight.invalidate()
+    return last
+
+
+def read_changes(db: Database, since: int, namespace: str, kinds: Optional[Set[str]] = None, limit: int = 1000) -> Tuple[List[dict], int]:
+    """Journaled changes of a namespace after a sequence number
+
+    Sequence numbers are allocated before their entry is inserted, so a
+    concurrent writer may leave a hole that is filled a moment later. Reading
+    stops at the first hole younger than JOURNAL__GAP_TIMEOUT, which keeps the
+    returned cursor safe to resume from; older holes are writers that died in
+    between and are skipped, including at the tail once the last number was
+    allocated JOURNAL__GAP_TIMEOUT ago: the cursor then moves to the end of
+    the sequence. Without entries after `since` while the sequence is ahead
+    and none at or before it either, the changes expired: a snapshot file
+    older than the whole journal is not up to date.
+
+    Arguments:
+        db {Database} -- Database connection
+        since {int} -- Last sequence number already seen by the consumer
+        namespace {str} -- Namespace of the changes
+
+    Keyword Arguments:
+        kinds {Optional[Set[str]]} -- Model names to return changes of, all when None (default: {None})
+        limit {int} -- Maximum number of journal entries scanned (default: {1000})
+
+    Raises:
+        JournalTruncatedException -- When changes after `since` expired from the journal
+
+    Returns:
+        Tuple[List[dict], int] -- Changes in sequence order and the sequence number to resume from
+    """
+    settled_before = datetime.utcnow() - timedelta(seconds=JOURNAL__GAP_TIMEOUT)
+    entries = list(db[JOURNAL_MODEL_NAME].find(
+        {"seq": {"$gt": since}}, projection={"_id": False}).sort("seq", ASCENDING).limit(limit))
+    if entries and entries[0]["seq"] > since + 1:
+        oldest = db[JOURNAL_MODEL_NAME].find_one(
+            {}, projection={"seq": True}, sort=[("seq", ASCENDING)])
+        if oldest["seq"] == entries[0]["seq"] and entries[0]["at"] < settled_before:
+            raise JournalTruncatedException(since, oldest["seq"])
+    elif not entries:
+        sequence = db[SEQUENCE_MODEL_NAME].find_one({"_id": CHANGES_SEQUENCE}) or {}
+        latest = sequence.get("value", 0)
+        if latest > since:
+            if db[JOURNAL_MODEL_NAME].find_one({"seq": {"$lte": since}}, projection={"_id": True}) is None:
+                raise JournalTruncatedException(since, latest + 1)
+            # Counters last incremented without a time settle with the next write
+            if sequence.get("at") is not None and sequence["at"] < settled_before:
+                return [], latest
+
+    changes = []
+    cursor = since
+    for entry in entries:
+        if entry["seq"] != cursor + 1 and entry["at"] > settled_before:
+            break
+        cursor = entry["seq"]
+        if entry["namespace"] == namespace and (kinds is None or entry["kind"] in kinds):
+            changes.append(entry)
+    return changes, cursor
+
+
+def latest_sequence(db: Database) -> int:
+    return CRUD.current_sequence(db, CHANGES_SEQUENCE)
@@ -0,0 +1,32 @@
+"""Production server settings: gunicorn managing uvicorn workers
+
+Usage: gunicorn -c gunicorn.conf.py server:app
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("SERVER__BIND", "0.0.0.0:80")
+workers = int(os.environ.get("SERVER__WORKERS", multiprocessing.cpu_count()))
+worker_class = os.environ.get("SERVER__WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+
+# Imported once in the master, workers fork with the app loaded
+preload_app = os.environ.get("SERVER__PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Workers get graceful_timeout seconds to finish in-flight requests on
+# SIGTERM / SIGHUP, and are recycled after max_requests to bound leaks
+timeout = int(os.environ.get("SERVER__TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("SERVER__GRACEFUL_TIMEOUT", 30))
+max_requests = int(os.environ.get("SERVER__MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("SERVER__MAX_REQUESTS_JITTER", 0))
+
+# Longer than the idle timeout of the load balancer in front, so that it closes connections first
+keepalive = int(os.environ.get("SERVER__KEEPALIVE", 75))
+
+accesslog = os.environ.get("SERVER__ACCESS_LOG")
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Never reuse a MongoClient inherited from the master
+    from utils import close_client
+    close_client()
@@ -0,0 +1,120 @@
+"""Removal of expired permissions and group memberships
+
+Permissions past their `expires_at` are deleted and expired subjects are
+pulled from their groups, in bulk, through the sparse `expires_at` indexes.
+Every removal is journaled like an API write, so watchers and policy
+snapshots pick it up; a Mongo TTL index would remove the documents without
+a trace in the journal. Checks do not wait for the sweep, compiled policies
+leave expired entries out as soon as they expire.
+
+Usage: python -m jobs.expire [--interval 60]
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict
+
+from pymongo import MongoClient
+
+from db import Database
+from db.journal import DELETE, record_changes
+from models.group.group_membership import refresh_memberships
+from models.group.group_model import GROUP_MODEL_NAME
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from utils import DB_NAME, MONGO_DB__HOST_PORT, MONGO_DB__HOST_URI
+from utils.namespace import current_namespace
+
+
+def expire_permissions(db: Database, now: datetime) -> int:
+    """Deletes the permissions expired at now
+
+    Arguments:
+        db {Database} -- Database connection
+        now {datetime} -- Current time, naive UTC
+
+    Returns:
+        int -- Number of deleted permissions
+    """
+    expired = defaultdict(list)
+    for permission in db[PERMISSION_MODEL_NAME].find(
+            {"expires_at": {"$lte": now}},
+            projection={"_id": False, "uuid": True, "metadata.namespace": True}):
+        expired[permission["metadata"]["namespace"]].append(permission["uuid"])
+
+    deleted = 0
+    for namespace, uuids in expired.items():
+        result = db[PERMISSION_MODEL_NAME].delete_many(
+            {"uuid": {"$in": uuids}, "expires_at": {"$lte": now}})
+        deleted += result.deleted_count
+        extended = set()
+        if result.deleted_count < len(uuids):
+            # Extended since they were read, they are not tombstoned
+            extended = set(db[PERMISSION_MODEL_NAME].distinct(
+                "uuid", {"uuid": {"$in": uuids}}))
+            record_changes(db, PERMISSION_MODEL_NAME, namespace, extended)
+        record_changes(db, PERMISSION_MODEL_NAME, namespace,
+                       [uuid for uuid in uuids if uuid not in extended], DELETE)
+    return deleted
+
+
+def expire_memberships(db: Database, now: datetime) -> int:
+    """Pulls the subjects expired at now from their groups, and refreshes their ancestor groups
+
+    Arguments:
+        db {Database} -- Database connection
+        now {datetime} -- Current time, naive UTC
+
+    Returns:
+        int -- Number of pulled subjects
+    """
+    # namespace -> uuids of the groups, (kind, name) of the pulled subjects
+    groups = defaultdict(list)
+    subjects = defaultdict(set)
+    pulled = 0
+    for group in db[GROUP_MODEL_NAME].find(
+            {"subjects.expires_at": {"$lte": now}},
+            projection={"_id": False, "uuid": True, "metadata.namespace": True, "subjects": True}):
+        namespace = group["metadata"]["namespace"]
+        groups[namespace].append(group["uuid"])
+        for subject in group["subjects"]:
+            if subject.get("expires_at") is not None and subject["expires_at"] <= now:
+                subjects[namespace].add((subject["kind"], subject["name"]))
+                pulled += 1
+
+    for namespace, uuids in groups.items():
+        db[GROUP_MODEL_NAME].update_many(
+            {"uuid": {"$in": uuids}},
+            {"$pull": {"subjects": {"expires_at": {"$lte": now}}},
+             "$set": {"updated_at": now.isoformat()}})
+        record_changes(db, GROUP_MODEL_NAME, namespace, uuids)
+        token = current_namespace.set(namespace)
+        try:
+            refresh_memberships(db, subjects[namespace])
+        finally:
+            current_namespace.reset(token)
+    return pulled
+
+
+def expire(db: Database) -> Dict[str, int]:
+    now = datetime.utcnow()
+    return {
+        PERMISSION_MODEL_NAME: expire_permissions(db, now),
+        GROUP_MODEL_NAME: expire_memberships(db, now),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=float, default=0,
+                        help="seconds between sweeps, a single sweep when 0")
+    args = parser.parse_args()
+
+    connection = MongoClient(host=MONGO_DB__HOST_URI, port=MONGO_DB__HOST_PORT)
+    while True:
+        report = expire(connection[DB_NAME])
+        print("%s: %d expired permissions, %d expired group memberships" % (
+            datetime.utcnow().isoformat(), report[PERMISSION_MODEL_NAME], report[GROUP_MODEL_NAME]))
+        if not args.interval:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,180 @@
+"""Incremental verification of the references between records
+
+Referencing records are walked in uuid order, a batch at a time, from a
+checkpoint persisted in the database, so every run only looks at the next
+slice of the collections and a full pass is spread over several runs. The
+names referenced by a batch are resolved with one indexed query per
+referenced collection.
+
+Usage: python -m jobs.reconcile [--batch-size 500] [--batches 10] [--fix]
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import MongoClient
+
+from db import Database
+from db.journal import record_changes
+from models.group.group_model import GROUP_MODEL_NAME
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.role.role_model import ROLE_MODEL_NAME
+from models.service_account.service_account_model import \
+    SERVICE_ACCOUNT_MODEL_NAME
+from models.user.user_model import USER_MODEL_NAME
+from utils import DB_NAME, MONGO_DB__HOST_PORT, MONGO_DB__HOST_URI
+
+CHECKPOINT_MODEL_NAME = "reconciliation_checkpoints"
+
+SUBJECT_MODEL_NAMES = {
+    "USER": USER_MODEL_NAME,
+    "SERVICE_ACCOUNT": SERVICE_ACCOUNT_MODEL_NAME,
+    "GROUP": GROUP_MODEL_NAME,
+}
+
+# Referencing collection -> subject kinds it may reference
+REFERENCING_MODEL_NAMES = {
+    GROUP_MODEL_NAME: ["USER", "SERVICE_ACCOUNT", "GROUP"],
+    PERMISSION_MODEL_NAME: ["USER", "SERVICE_ACCOUNT", "GROUP"],
+}
+
+
+def existing_names(db: Database, model_name: str, namespace: str, names: set) -> set:
+    if not names:
+        return set()
+    return set(db[model_name].distinct("metadata.name", {
+        "metadata.namespace": namespace,
+        "metadata.name": {"$in": list(names)},
+    }))
+
+
+def reconcile_batch(db: Database, model_name: str, after_uuid: str, batch_size: int, fix: bool = False) -> dict:
+    """Verifies the references held by the next batch of records of a collection
+
+    Arguments:
+        db {Database} -- Database connection
+        model_name {str} -- Referencing collection
+        after_uuid {str} -- uuid of the last verified record
+        batch_size {int} -- Number of records to verify
+
+    Keyword Arguments:
+        fix {bool} -- Pulls the dangling subjects from the records (default: {False})
+
+    Returns:
+        dict -- Batch report with the last verified uuid and the dangling references per record
+    """
+    records = list(db[model_name].find(
+        {"uuid": {"$gt": after_uuid}},
+        projection={"_id": False, "uuid": True, "metadata.namespace": True,
+                    "role": True, "subjects": True},
+    ).sort("uuid", 1).limit(batch_size))
+
+    # (namespace, kind) -> referenced names, references never cross namespaces
+    referenced = defaultdict(set)
+    for record in records:
+        namespace = record["metadata"]["namespace"]
+        for subject in record.get("subjects") or []:
+            referenced[(namespace, subject["kind"])].add(subject["name"])
+        if record.get("role"):
+            referenced[(namespace, "ROLE")].add(record["role"])
+
+    existing = {}
+    for (namespace, kind), names in referenced.items():
+        if kind == "ROLE":
+            existing[(namespace, kind)] = existing_names(
+                db, ROLE_MODEL_NAME, namespace, names)
+        elif kind in SUBJECT_MODEL_NAMES:
+            existing[(namespace, kind)] = existing_names(
+                db, SUBJECT_MODEL_NAMES[kind], namespace, names)
+
+    dangling: Dict[str, List[dict]] = {}
+    for record in records:
+        namespace = record["metadata"]["namespace"]
+        missing = [subject for subject in record.get("subjects") or []
+                   if subject["kind"] in REFERENCING_MODEL_NAMES[model_name]
+                   and subject["name"] not in existing.get((namespace, subject["kind"]), ())]
+        if fix and missing:
+            missing_names = defaultdict(list)
+            for subject in missing:
+                missing_names[subject["kind"]].append(subject["name"])
+            for kind, names in missing_names.items():
+                db[model_name].update_one(
+                    {"uuid": record["uuid"]},
+                    {"$pull": {"subjects": {"kind": kind, "name": {"$in": names}}},
+                     "$set": {"updated_at": datetime.utcnow().isoformat()}})
+            record_changes(db, model_name, namespace, [record["uuid"]])
+        if record.get("role") and record["role"] not in existing[(namespace, "ROLE")]:
+            # A permission without its role cannot be repaired automatically
+            missing.append({"kind": "ROLE", "name": record["role"]})
+        if missing:
+            dangling[record["uuid"]] = missing
+
+    return {
+        "verified": len(records),
+        "last_uuid": records[-1]["uuid"] if records else None,
+        "dangling": dangling,
+    }
+
+
+def reconcile(db: Database, batch_size: int = 500, batches: int = 10, fix: bool = False) -> Dict[str, dict]:
+    """Runs up to `batches` batches per referencing collection, resuming from the stored checkpoints
+
+    Arguments:
+        db {Database} -- Database connection
+
+    Keyword Arguments:
+        batch_size {int} -- Number of records per batch (default: {500})
+        batches {int} -- Maximum number of batches per collection (default: {10})
+        fix {bool} -- Pulls the dangling subjects from the records (default: {False})
+
+    Returns:
+        Dict[str, dict] -- Report per referencing collection
+    """
+    report = {}
+    for model_name in REFERENCING_MODEL_NAMES:
+        checkpoint = db[CHECKPOINT_MODEL_NAME].find_one(
+            {"_id": model_name}) or {}
+        after_uuid = checkpoint.get("after_uuid", "")
+        collection_report = {"verified": 0, "dangling": {}, "passes": 0}
+
+        for _ in range(batches):
+            batch = reconcile_batch(db, model_name, after_uuid, batch_size, fix)
+            collection_report["verified"] += batch["verified"]
+            collection_report["dangling"].update(batch["dangling"])
+            if batch["verified"] < batch_size:
+                # End of the collection, the next batch starts a new pass
+                after_uuid = ""
+                collection_report["passes"] += 1
+            else:
+                after_uuid = batch["last_uuid"]
+            db[CHECKPOINT_MODEL_NAME].update_one(
+                {"_id": model_name},
+                {"$set": {"after_uuid": after_uuid,
+                          "updated_at": datetime.utcnow().isoformat()}},
+                upsert=True)
+            if not after_uuid:
+                break
+
+        report[model_name] = collection_report
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--fix", action="store_true",
+                        help="pull dangling subjects instead of only reporting them")
+    args = parser.parse_args()
+
+    connection = MongoClient(host=MONGO_DB__HOST_URI, port=MONGO_DB__HOST_PORT)
+    report = reconcile(connection[DB_NAME], batch_size=args.batch_size,
+                       batches=args.batches, fix=args.fix)
+    for model_name, collection_report in report.items():
+        print("%s: %d verified, %d with dangling references, %d completed passes" % (
+            model_name, collection_report["verified"],
+            len(collection_report["dangling"]), collection_report["passes"]))
+        for record_uuid, missing in collection_report["dangling"].items():
+            print("  %s: %s" % (record_uuid, ", ".join(
+                "%s/%s" % (subject["kind"], subject["name"]) for subject in missing)))
@@ -8,7 +8,7 @@ from .group.group_model import Group, GroupCreate, GroupPartial
 from .permission.permission_model import Permission, PermissionCreate, PermissionPartial
 from .resource.resource_model import Resource, ResourceCreate, ResourcePartial
 from .resource_action.resource_action_model import ResourceAction, ResourceActionCreate, ResourceActionPartial
-from .role.role_model import Role, RoleCreate, RolePartial
+from .role.role_model import Role, RoleCreate, RolePartial, RuleEffect
 
 # Managers
 from .user.user_manager import UserManager
@@ -18,3 +18,6 @@ from .permission.permission_manager import PermissionManager
 from .resource.resource_manager import ResourceManager
 from .resource_action.resource_action_manager import ResourceActionManager
 from .role.role_manager import RoleManager
+
+# Indexes
+from .indexes import ensure_group_memberships, ensure_indexes
@@ -6,8 +6,8 @@ from pydantic.main import BaseModel
 from pydantic.schema import Schema
 
 from db import CRUD, Database
-
-DEFAULT_NAMESPACE = "default"
+from db.journal import DELETE, record_changes
+from utils.namespace import get_namespace
 
 
 class BaseRecordConfig(BaseModel, ABC):
@@ -50,14 +50,14 @@ class BaseRecord(BaseRecordConfig, ABC):
 
         data = self.dict()
         data["metadata"] = data.get("metadata", {})
-        data["metadata"]["namespace"] = data["metadata"].get(
-            "namespace", DEFAULT_NAMESPACE)
+        data["metadata"]["namespace"] = get_namespace()
         if self.uuid is None:
             self.uuid = CRUD.create(db, self.model_name, data)
         else:
             CRUD.update(db, self.model_name, self.uuid, data)
 
         self.post_save(db)
+        record_changes(db, self.model_name, get_namespace(), [self.uuid])
 
     def delete(self, db: Database):
         """Deletes the record from the database"""
@@ -70,3 +70,5 @@ class BaseRecord(BaseRecordConfig, ABC):
             CRUD.delete(db, self.model_name, self.uuid)
 
         self.post_delete(db)
+        record_changes(db, self.model_name,
+                       get_namespace(), [self.uuid], DELETE)
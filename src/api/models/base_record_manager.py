@@ -1,20 +1,212 @@
 import re
 from re import IGNORECASE
-from typing import List, Union
+from typing import Dict, List, Union
 
 from pydantic.error_wrappers import ValidationError
 from pydantic.main import BaseModel
+from pymongo import ASCENDING, IndexModel
 
 from db import CRUD, Database
-from models.base_record import DEFAULT_NAMESPACE, BaseRecord
-from utils.exceptions import RecordNotFoundException
+from db.crud import query_key, read_flight
+from models.base_record import BaseRecord
+from models.references import Reference
+from utils.exceptions import (RecordNotFoundException,
+                              UnsupportedExpandException,
+                              UnsupportedSortException)
 from utils.json_merge_patch import json_merge_patch
+from utils.namespace import get_namespace
 
 
 class BaseRecordManager:
 
     model: [BaseRecord] = BaseModel
     model_name: str = "base_record"
+    indexes: List[IndexModel] = [
+        IndexModel([("uuid", ASCENDING)], unique=True),
+        IndexModel([("metadata.namespace", ASCENDING),
+                    ("metadata.name", ASCENDING)]),
+    ]
+    # Fields list endpoints sort by, each backed by a (namespace, field) index
+    sortable_fields: List[str] = ["metadata.name", "created_at", "updated_at"]
+    # References expand= resolves, by name
+    references: Dict[str, Reference] = {}
+
+    @classmethod
+    def ensure_indexes(cls, db: Database) -> List[str]:
+        """Creates the indexes backing the lookups and sorts of the manager, existing indexes are left untouched
+
+        Arguments:
+            db {Database} -- Database connection
+
+        Returns:
+            List[str] -- Names of the ensured indexes
+        """
+        indexes = {index.document["name"]: index for index in cls.indexes}
+        for field in cls.sortable_fields:
+            index = IndexModel(cls.sort_index(field))
+            indexes.setdefault(index.document["name"], index)
+        return db[cls.model_name].create_indexes(list(indexes.values()))
+
+    @staticmethod
+    def sort_index(field: str) -> list:
+        return [("metadata.namespace", ASCENDING), (field, ASCENDING)]
+
+    @classmethod
+    def validate_sort(cls, sort: List[str] = None) -> list:
+        """Checks that the records can be listed in index order, and returns the index to use
+
+        Arguments:
+            sort {List[str]} -- Sort order, a single field of sortable_fields prefixed with "-" for descending order
+
+        Raises:
+            UnsupportedSortException: Raised for several fields or a field without supporting index
+
+        Returns:
+            list -- Keys of the supporting index, None when unsorted
+        """
+        if not sort:
+            return None
+        if len(sort) > 1 or sort[0].lstrip("-") not in cls.sortable_fields:
+            raise UnsupportedSortException(
+                cls.model_name, sort, cls.sortable_fields)
+        return cls.sort_index(sort[0].lstrip("-"))
+
+    @classmethod
+    def validate_expand(cls, expand: List[str] = None) -> List[str]:
+        """Checks that the references to expand are known, each value may hold several comma separated names
+
+        Arguments:
+            expand {List[str]} -- Names of references, eg. ["role,subjects"]
+
+        Raises:
+            UnsupportedExpandException: Raised for a reference missing from references
+
+        Returns:
+            List[str] -- Names of the references, without duplicates
+        """
+        names = [name.strip() for value in expand or [] for name in value.split(",") if name.strip()]
+        unsupported = [name for name in names if name not in cls.references]
+        if unsupported:
+            raise UnsupportedExpandException(
+                cls.model_name, unsupported, list(cls.references))
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def resolve_references(cls, db: Database, documents: List[dict], references: List[str]) -> Dict[tuple, dict]:
+        """Records named by the references of documents, one query per referenced collection
+
+        Names are matched within the namespace of the request, on the
+        (namespace, name) index of each collection.
+
+        Arguments:
+            db {Database} -- Database connection
+            documents {List[dict]} -- Documents holding the references
+            references {List[str]} -- Names of the references to resolve, see validate_expand
+
+        Returns:
+            Dict[tuple, dict] -- Referenced documents by (model name, record name)
+        """
+        names: Dict[str, set] = {}
+        for document in documents:
+            for name in references:
+                reference = cls.references[name]
+                value = document.get(reference.field)
+                if None in reference.targets:
+                    names.setdefault(reference.targets[None][0], set()).add(value)
+                    continue
+                for subject in value or []:
+                    target = reference.targets.get(subject.get("kind"))
+                    if target is not None:
+                        names.setdefault(target[0], set()).add(subject.get("name"))
+
+        found = {}
+        namespace = get_namespace()
+        for model_name, referenced_names in names.items():
+            referenced_names.discard(None)
+            if not referenced_names:
+                continue
+            for match in CRUD.find(db, model_name, limit=0, filter_params={
+                    "metadata.namespace": namespace,
+                    "metadata.name": {"$in": sorted(referenced_names)}}):
+                found[(model_name, match["metadata"]["name"])] = match
+        return found
+
+    @classmethod
+    def embed(cls, document: dict, references: List[str], found: Dict[tuple, dict]) -> dict:
+        """Record of a document with the referenced records under expanded, None for names without record"""
+
+        def resolve(target, referenced_name):
+            if target is None:
+                return None
+            model_name, model = target
+            match = found.get((model_name, referenced_name))
+            return None if match is None else model(**match).dict()
+
+        record = cls.model(**document).dict()
+        expanded = {}
+        for name in references:
+            reference = cls.references[name]
+            value = record.get(reference.field)
+            if None in reference.targets:
+                expanded[name] = resolve(reference.targets[None], value)
+            else:
+                expanded[name] = [resolve(reference.targets.get(subject["kind"]), subject["name"])
+                                  for subject in value or []]
+        record["expanded"] = expanded
+        return record
+
+    @classmethod
+    def find_expanded(cls, db: Database, expand: List[str], skip: int = 0, limit: int = 25, sort: List[str] = None, search: str = None, search_fields: List[str] = None, filter_params=None) -> List[dict]:
+        """Fetches Records as find does, with the referenced records embedded
+
+        The page is read as find reads it, then the records it references
+        are fetched with one query per referenced collection, so a page costs
+        a bounded number of queries whatever its size.
+
+        Arguments:
+            db {Database} -- Database connection
+            expand {List[str]} -- Names of the references to expand, see validate_expand
+
+        Keyword Arguments:
+            skip {int} -- Number of records to be skipped based on index (default: {0})
+            limit {int} -- Number of records to be returned, 0 returns all of them (default: {25})
+            sort {List[str]} -- Sort order, a single field of sortable_fields prefixed with "-" for descending order (default: {None})
+            search {str} -- Search records based on search_fields (default: {None})
+            search_fields {List[str]} -- Provides override for the search feature (default: {None})
+
+        Raises:
+            UnsupportedSortException: Raised when sort is not backed by an index
+            UnsupportedExpandException: Raised for an unknown reference
+
+        Returns:
+            List[dict] -- Records as dicts, each with an expanded field holding the referenced records
+        """
+        references = cls.validate_expand(expand)
+        data = cls.find_documents(db, skip=skip, limit=limit, sort=sort, search=search,
+                                  search_fields=search_fields, filter_params=filter_params)
+        found = cls.resolve_references(db, data, references)
+        return [cls.embed(d, references, found) for d in data]
+
+    @classmethod
+    def find_by_uuid_expanded(cls, db: Database, record_uuid: str, expand: List[str]) -> dict:
+        """Fetches a single record as find_by_uuid does, with the referenced records embedded
+
+        Arguments:
+            db {Database} -- Database connection
+            record_uuid {str} -- Record unique uuid
+            expand {List[str]} -- Names of the references to expand, see validate_expand
+
+        Raises:
+            RecordNotFoundException: Raised when no record of the namespace has the uuid
+            UnsupportedExpandException: Raised for an unknown reference
+
+        Returns:
+            dict -- Record with an expanded field holding the referenced records
+        """
+        records = cls.find_expanded(db, expand, limit=1, filter_params={"uuid": record_uuid})
+        if not records:
+            raise RecordNotFoundException(cls.model_name, record_uuid)
+        return records[0]
 
     @classmethod
     def create(cls, db: Database, record: BaseModel) -> BaseRecord:
@@ -41,15 +233,56 @@ class BaseRecordManager:
         Keyword Arguments:
             skip {int} -- Number of records to be skipped based on index (default: {0})
             limit {int} -- Number of records to be returned (default: {25})
-            sort {List[str]} -- Sort order, based on records property name. This supports nested keys as well (default: {None})
+            sort {List[str]} -- Sort order, a single field of sortable_fields prefixed with "-" for descending order (default: {None})
             search {str} -- Search records based on search_fields (default: {None})
             search_fields {List[str]} -- Provides override for the search feature, basic support is added on uuid and name. This supports nested keys as well (default: {None})
 
+        Raises:
+            UnsupportedSortException: Raised when sort is not backed by an index
+
         Returns:
             List[BaseRecord] -- List of BaseRecord instances that are persisted in DB
         """
+        data = cls.find_documents(db, skip=skip, limit=limit, sort=sort, search=search,
+                                  search_fields=search_fields, filter_params=filter_params)
+        return [cls.model(**d) for d in data]
+
+    @classmethod
+    def find_documents(cls, db: Database, skip: int = 0, limit: int = 25, sort: List[str] = None, search: str = None, search_fields: List[str] = None, filter_params=None) -> List[dict]:
+        """Documents find builds its records from, shared with the concurrent identical reads and not to be modified"""
+        hint = cls.validate_sort(sort)
+        filter_params = cls.build_filter(search, search_fields, filter_params)
+        # Identical concurrent reads share one query, each caller builds its own records
+        return read_flight.do(
+            (cls.model_name, query_key(filter_params), skip, limit, tuple(sort or ())),
+            lambda: CRUD.find(db, cls.model_name, skip=skip,
+                              limit=limit,
+                              filter_params=filter_params,
+                              sort=sort, hint=hint))
+
+    @classmethod
+    def count(cls, db: Database, search: str = None, search_fields: List[str] = None, filter_params=None) -> int:
+        """Counts the Records matching the same criteria as find
+
+        Arguments:
+            db {Database} -- Database connection
+
+        Keyword Arguments:
+            search {str} -- Search records based on search_fields (default: {None})
+            search_fields {List[str]} -- Provides override for the search feature (default: {None})
+
+        Returns:
+            int -- Number of matching records, cached for a few seconds
+        """
+        filter_params = cls.build_filter(search, search_fields, filter_params)
+        return CRUD.count(db, cls.model_name, filter_params=filter_params)
+
+    @staticmethod
+    def build_filter(search: str = None, search_fields: List[str] = None, filter_params=None) -> dict:
+        """Builds the Mongo filter of find and count, scoped to the namespace of the request"""
         if filter_params is None or not isinstance(filter_params, dict):
             filter_params = dict()
+        filter_params["metadata.namespace"] = get_namespace()
 
         if search_fields is None:
             search_fields = ["uuid"]
@@ -60,12 +293,7 @@ class BaseRecordManager:
                 filter_params["$or"].append({
                     search_field: re.compile(search, re.IGNORECASE)
                 })
-
-        data = CRUD.find(db, cls.model_name, skip=skip,
-                         limit=limit,
-                         filter_params=filter_params,
-                         sort=sort)
-        return [cls.model(**d) for d in data]
+        return filter_params
 
     @classmethod
     def find_by_uuid(cls, db: Database, record_uuid: str) -> BaseRecord:
@@ -78,14 +306,16 @@ class BaseRecordManager:
         Returns:
             BaseRecord -- BaseRecord subclass instance which has been persisted in DB
         """
-        data = CRUD.find_by_uuid(
-            db, cls.model_name, record_uuid)
+        namespace = get_namespace()
+        data = read_flight.do(
+            (cls.model_name, namespace, record_uuid),
+            lambda: CRUD.find_by_uuid(db, cls.model_name, record_uuid, namespace=namespace))
         record = cls.model(**data)
         return record
 
     @classmethod
     def find_by_name(cls, db: Database, name: str, unique=True) -> Union[BaseRecord, List[BaseRecord]]:
-        """Finds record/records based on name.
+        """Finds record/records based on name, matched exactly on the (namespace, name) index.
 
         Arguments:
             db {Database} -- Database connection
@@ -101,8 +331,7 @@ class BaseRecordManager:
         Returns:
             List[BaseRecord] -- Returns a list of BaseRecord.
         """
-        records = cls.find(db, search=name, search_fields=[
-            "name", "metadata.name"])
+        records = cls.find(db, filter_params={"metadata.name": name})
 
         if unique:
             if len(records) > 1:
@@ -1,12 +1,25 @@
+from typing import List
+
 from pydantic.error_wrappers import ValidationError
+from pymongo import ASCENDING, IndexModel
 
 from db.database import Database
 from models.base_record_manager import BaseRecordManager
+from models.group.group_membership import (find_ancestor_groups,
+                                           refresh_memberships,
+                                           remove_membership,
+                                           rename_membership,
+                                           would_create_cycle)
 from models.group.group_model import (GROUP_MODEL_NAME, Group, GroupCreate,
                                       GroupPartial)
+from models.references import Reference
 from models.service_account.service_account_manager import \
     ServiceAccountManager
+from models.service_account.service_account_model import (
+    SERVICE_ACCOUNT_MODEL_NAME, ServiceAccount)
 from models.user.user_manager import UserManager
+from models.user.user_model import USER_MODEL_NAME, User
+from utils.json_merge_patch import json_merge_patch
 
 
 class GroupManager(BaseRecordManager):
@@ -14,16 +27,78 @@ class GroupManager(BaseRecordManager):
 
     model = Group
     model_name = GROUP_MODEL_NAME
+    indexes = BaseRecordManager.indexes + [
+        IndexModel([("metadata.namespace", ASCENDING),
+                    ("subjects.kind", ASCENDING),
+                    ("subjects.name", ASCENDING)]),
+        # Expiry sweeps, across namespaces
+        IndexModel([("subjects.expires_at", ASCENDING)], sparse=True),
+    ]
+    references = {
+        "subjects": Reference("subjects", {
+            "USER": (USER_MODEL_NAME, User),
+            "SERVICE_ACCOUNT": (SERVICE_ACCOUNT_MODEL_NAME, ServiceAccount),
+            "GROUP": (GROUP_MODEL_NAME, Group),
+        }),
+    }
+
+    @classmethod
+    def find_by_subject(cls, db: Database, subject_kind: str, subject_name: str, skip: int = 0, limit: int = 25) -> List[Group]:
+        """Finds the groups having the subject as a member, served by the subjects multikey index
+
+        Arguments:
+            db {Database} -- Database connection
+            subject_kind {str} -- Kind of the member subject
+            subject_name {str} -- Name of the member subject
+
+        Keyword Arguments:
+            skip {int} -- Number of records to be skipped based on index (default: {0})
+            limit {int} -- Number of records to be returned, 0 returns all of them (default: {25})
+
+        Returns:
+            List[Group] -- Groups having the subject as a member
+        """
+        return cls.find(db, skip=skip, limit=limit, filter_params={
+            "subjects": {"$elemMatch": {"kind": subject_kind, "name": subject_name}}
+        })
+
     @classmethod
-    def validate_group(cls, db: Database, record: GroupCreate):
+    def find_ancestors(cls, db: Database, subject_kind: str, subject_name: str, skip: int = 0, limit: int = 25) -> List[Group]:
+        """Finds every group containing the subject, directly or through nested groups
+
+        Arguments:
+            db {Database} -- Database connection
+            subject_kind {str} -- Kind of the member subject
+            subject_name {str} -- Name of the member subject
+
+        Keyword Arguments:
+            skip {int} -- Number of records to be skipped based on index (default: {0})
+            limit {int} -- Number of records to be returned, 0 returns all of them (default: {25})
+
+        Returns:
+            List[Group] -- Groups containing the subject
+        """
+        group_names = find_ancestor_groups(db, subject_kind, subject_name)
+        if not group_names:
+            return []
+        return cls.find(db, skip=skip, limit=limit, filter_params={
+            "metadata.name": {"$in": group_names}
+        })
+
+    @classmethod
+    def validate_group(cls, db: Database, record: GroupCreate, persisted_name: str = None):
         """Validates group record
 
         Arguments:
             db {Database} -- Database connection
             record {GroupCreate} -- New Group data
 
+        Keyword Arguments:
+            persisted_name {str} -- Stored name of an updated group, used to detect nesting cycles (default: {None})
+
         Raises:
             ValidationError: Raises ValidationError if subject kind is not supported
+            ValidationError: Raises ValidationError if the group would contain itself
         """
         new_group = record
         for subject in new_group.subjects:
@@ -38,10 +113,45 @@ class GroupManager(BaseRecordManager):
                     raise ValidationError(
                         "Service Account [%s] does not exist" % subject.name)
 
+            elif subject_kind == "GROUP":
+                if not cls.find(db, filter_params={"metadata.name": subject.name}):
+                    raise ValidationError(
+                        "Group [%s] does not exist" % subject.name)
+
             else:
                 raise ValidationError(
                     "Subject kind %s not supported" % subject_kind)
 
+        group_name = persisted_name or new_group.metadata.name
+        if would_create_cycle(db, group_name, [(subject.kind, subject.name) for subject in new_group.subjects]):
+            raise ValidationError(
+                "Group [%s] cannot contain itself" % group_name)
+
+    @classmethod
+    def refresh_memberships(cls, db: Database, existing_group: Group, updated_group: Group):
+        """Updates the maintained group memberships after the group changed
+
+        Arguments:
+            db {Database} -- Database connection
+            existing_group {Group} -- Group before the change, None for new groups
+            updated_group {Group} -- Group after the change, None for deleted groups
+        """
+        members = set()
+        if existing_group is not None:
+            members.update((subject.kind, subject.name)
+                           for subject in existing_group.subjects)
+        if updated_group is not None:
+            members.update((subject.kind, subject.name)
+                           for subject in updated_group.subjects)
+
+        if existing_group is not None and updated_group is None:
+            remove_membership(db, "GROUP", existing_group.metadata.name)
+        elif existing_group is not None and existing_group.metadata.name != updated_group.metadata.name:
+            rename_membership(db, "GROUP", existing_group.metadata.name,
+                              updated_group.metadata.name)
+
+        refresh_memberships(db, members)
+
     @classmethod
     def create(cls, db: Database, record: GroupCreate) -> Group:
         """Creates a new Group after validating subjects.
@@ -60,7 +170,9 @@ class GroupManager(BaseRecordManager):
                 "Group with name [%s] already exists" % record.metadata.name)
 
         cls.validate_group(db, record)
-        return super(GroupManager, cls).create(db, record)
+        new_group = super(GroupManager, cls).create(db, record)
+        cls.refresh_memberships(db, None, new_group)
+        return new_group
 
     @classmethod
     def update(cls, db: Database, record_uuid: str, record: GroupPartial) -> Group:
@@ -80,5 +192,47 @@ class GroupManager(BaseRecordManager):
             if GroupManager.find_by_name(db, updated_record.metadata.name):
                 raise ValidationError(
                     "Group with name [%s] already exists" % record.metadata.name)
-        cls.validate_group(db, updated_record)
-        return super(GroupManager, cls).update(db, record_uuid, record)
+        cls.validate_group(db, updated_record, existing_group.metadata.name)
+        updated_group = super(GroupManager, cls).update(db, record_uuid, record)
+        cls.refresh_memberships(db, existing_group, updated_group)
+        return updated_group
+
+    @classmethod
+    def partial_update(cls, db: Database, record_uuid: str, record: GroupPartial) -> Group:
+        """Updates the existing Group by partial changes after validating data
+
+        Arguments:
+            db {Database} -- Database connection
+            record_uuid {str} -- unique record uuid
+            record {GroupPartial} -- updating record data
+
+        Returns:
+            Group -- Updated record
+        """
+        existing_group = cls.find_by_uuid(db, record_uuid)
+        updated_record = cls.model(**json_merge_patch(
+            existing_group.dict(), record.dict(skip_defaults=True)))
+        if updated_record.metadata.name != existing_group.metadata.name:
+            if GroupManager.find_by_name(db, updated_record.metadata.name):
+                raise ValidationError(
+                    "Group with name [%s] already exists" % updated_record.metadata.name)
+        cls.validate_group(db, updated_record, existing_group.metadata.name)
+        updated_group = super(GroupManager, cls).partial_update(
+            db, record_uuid, record)
+        cls.refresh_memberships(db, existing_group, updated_group)
+        return updated_group
+
+    @classmethod
+    def delete(cls, db: Database, record_uuid: str) -> Group:
+        """Deletes existing Group and the memberships it provided
+
+        Arguments:
+            db {Database} -- Database connection
+            record_uuid {str} -- unique record uuid
+
+        Returns:
+            Group -- Deleted record
+        """
+        deleted_group = super(GroupManager, cls).delete(db, record_uuid)
+        cls.refresh_memberships(db, deleted_group, None)
+        return deleted_group
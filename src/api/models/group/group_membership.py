@@ -0,0 +1,218 @@
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from db import Database
+from models.group.group_model import GROUP_MODEL_NAME, GroupSubjectKind
+from utils.namespace import get_namespace
+
+GROUP_MEMBERSHIP_MODEL_NAME = "group_memberships"
+
+# One document per subject: {"namespace", "kind", "name", "groups": [every group containing it, however deep]}
+GROUP_MEMBERSHIP_INDEXES = [
+    IndexModel([("namespace", ASCENDING), ("kind", ASCENDING),
+                ("name", ASCENDING)], unique=True),
+    IndexModel([("namespace", ASCENDING), ("groups", ASCENDING)]),
+]
+
+Subject = Tuple[str, str]
+
+
+def ensure_membership_indexes(db: Database) -> List[str]:
+    return db[GROUP_MEMBERSHIP_MODEL_NAME].create_indexes(GROUP_MEMBERSHIP_INDEXES)
+
+
+def find_ancestor_groups(db: Database, subject_kind: str, subject_name: str) -> List[str]:
+    """Names of every group containing the subject, directly or through nested groups
+
+    Arguments:
+        db {Database} -- Database connection
+        subject_kind {str} -- Kind of the subject
+        subject_name {str} -- Name of the subject
+
+    Returns:
+        List[str] -- Group names, resolved with a single indexed lookup
+    """
+    membership = db[GROUP_MEMBERSHIP_MODEL_NAME].find_one(
+        {"namespace": get_namespace(), "kind": subject_kind, "name": subject_name},
+        projection={"groups": True})
+    return membership["groups"] if membership else []
+
+
+def _direct_members(db: Database, group_names: List[str]) -> Dict[str, List[Subject]]:
+    groups = db[GROUP_MODEL_NAME].find(
+        {"metadata.namespace": get_namespace(),
+         "metadata.name": {"$in": group_names}},
+        projection={"metadata.name": True, "subjects": True})
+    return {group["metadata"]["name"]: [(s["kind"], s["name"]) for s in group.get("subjects") or []]
+            for group in groups}
+
+
+def _direct_parents(db: Database, subject: Subject) -> List[str]:
+    kind, name = subject
+    groups = db[GROUP_MODEL_NAME].find(
+        {"metadata.namespace": get_namespace(),
+         "subjects": {"$elemMatch": {"kind": kind, "name": name}}},
+        projection={"metadata.name": True})
+    return [group["metadata"]["name"] for group in groups]
+
+
+def refresh_memberships(db: Database, subjects: Iterable[Subject]):
+    """Recomputes the ancestor groups of subjects whose direct parents changed, and of everything nested below them
+
+    Ancestors of a subject are the union of its direct parents and their
+    ancestors, so the affected subjects are processed parents first and the
+    ancestors of unaffected parents are read back from their stored
+    memberships. The work is proportional to the affected subtree, not to
+    the number of groups.
+
+    Arguments:
+        db {Database} -- Database connection
+        subjects {Iterable[Subject]} -- (kind, name) of the subjects whose direct parents changed
+    """
+    group_kind = GroupSubjectKind.GROUP.value
+    namespace = get_namespace()
+
+    # Affected subjects and the nesting edges between them
+    affected: Set[Subject] = set()
+    children: Dict[Subject, List[Subject]] = {}
+    queue = deque(subjects)
+    while queue:
+        level = []
+        while queue:
+            subject = queue.popleft()
+            if subject not in affected:
+                affected.add(subject)
+                if subject[0] == group_kind:
+                    level.append(subject[1])
+        if level:
+            for group_name, members in _direct_members(db, level).items():
+                children[(group_kind, group_name)] = members
+                queue.extend(members)
+
+    parents = {subject: _direct_parents(db, subject) for subject in affected}
+
+    stored_parents = {parent for subject_parents in parents.values() for parent in subject_parents
+                      if (group_kind, parent) not in affected}
+    ancestors: Dict[str, Set[str]] = {name: set() for name in stored_parents}
+    for membership in db[GROUP_MEMBERSHIP_MODEL_NAME].find(
+            {"namespace": namespace, "kind": group_kind,
+             "name": {"$in": list(stored_parents)}},
+            projection={"name": True, "groups": True}):
+        ancestors[membership["name"]] = set(membership["groups"])
+
+    # Kahn's algorithm over the affected subgraph, parents before children
+    pending = {subject: sum(1 for parent in parents[subject] if (group_kind, parent) in affected)
+               for subject in affected}
+    ready = deque(subject for subject, count in pending.items() if count == 0)
+    requests = []
+    while ready:
+        subject = ready.popleft()
+        subject_ancestors = set()
+        for parent in parents[subject]:
+            subject_ancestors.add(parent)
+            subject_ancestors |= ancestors[parent]
+        if subject[0] == group_kind:
+            ancestors[subject[1]] = subject_ancestors
+        requests.append(UpdateOne(
+            {"namespace": namespace, "kind": subject[0], "name": subject[1]},
+            {"$set": {"groups": sorted(subject_ancestors)}},
+            upsert=True))
+        for child in children.get(subject, []):
+            if child in pending:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    ready.append(child)
+
+    if requests:
+        db[GROUP_MEMBERSHIP_MODEL_NAME].bulk_write(requests, ordered=False)
+
+
+def rename_membership(db: Database, subject_kind: str, old_name: str, new_name: str):
+    """Renames a subject in the memberships, and in the ancestors of its members for groups"""
+    namespace = get_namespace()
+    db[GROUP_MEMBERSHIP_MODEL_NAME].update_one(
+        {"namespace": namespace, "kind": subject_kind, "name": old_name},
+        {"$set": {"name": new_name}})
+    if subject_kind == GroupSubjectKind.GROUP:
+        db[GROUP_MEMBERSHIP_MODEL_NAME].update_many(
+            {"namespace": namespace, "groups": old_name},
+            {"$set": {"groups.$": new_name}})
+
+
+def remove_membership(db: Database, subject_kind: str, subject_name: str):
+    db[GROUP_MEMBERSHIP_MODEL_NAME].delete_one(
+        {"namespace": get_namespace(), "kind": subject_kind, "name": subject_name})
+
+
+def would_create_cycle(db: Database, group_name: str, subjects: Iterable[Subject]) -> bool:
+    """Checks whether a group containing the subjects would (transitively) contain itself
+
+    Arguments:
+        db {Database} -- Database connection
+        group_name {str} -- Persisted name of the group
+        subjects {Iterable[Subject]} -- (kind, name) of the members of the group
+
+    Returns:
+        bool -- True if a member group is the group itself or one of its ancestors
+    """
+    member_groups = {name for kind, name in subjects if kind == GroupSubjectKind.GROUP}
+    if group_name in member_groups:
+        return True
+    if not member_groups:
+        return False
+    return not member_groups.isdisjoint(find_ancestor_groups(db, GroupSubjectKind.GROUP.value, group_name))
+
+
+def rebuild_memberships(db: Database) -> int:
+    """Recomputes the memberships of every namespace from the groups, used to initialise the collection
+
+    Memberships are upserted in place and only the subjects no longer in
+    any group are deleted afterwards, lookups never see an empty collection.
+
+    Arguments:
+        db {Database} -- Database connection
+
+    Returns:
+        int -- Number of subjects with at least one group
+    """
+    group_kind = GroupSubjectKind.GROUP.value
+    # (namespace, kind, name) -> names of the groups directly containing the subject
+    parents: Dict[Tuple[str, str, str], Set[str]] = {}
+    for group in db[GROUP_MODEL_NAME].find(projection={"metadata": True, "subjects": True}):
+        namespace = group["metadata"].get("namespace")
+        for subject in group.get("subjects") or []:
+            parents.setdefault((namespace, subject["kind"], subject["name"]), set()).add(
+                group["metadata"]["name"])
+
+    ancestors: Dict[Tuple[str, str, str], Set[str]] = {}
+
+    def resolve(subject: Tuple[str, str, str], visiting: set) -> Set[str]:
+        if subject in ancestors:
+            return ancestors[subject]
+        visiting.add(subject)
+        resolved = set()
+        for parent in parents.get(subject, ()):
+            resolved.add(parent)
+            parent_subject = (subject[0], group_kind, parent)
+            if parent_subject not in visiting:
+                resolved |= resolve(parent_subject, visiting)
+        visiting.discard(subject)
+        ancestors[subject] = resolved
+        return resolved
+
+    requests = []
+    for subject in parents:
+        requests.append(UpdateOne(
+            {"namespace": subject[0], "kind": subject[1], "name": subject[2]},
+            {"$set": {"groups": sorted(resolve(subject, set()))}},
+            upsert=True))
+    if requests:
+        db[GROUP_MEMBERSHIP_MODEL_NAME].bulk_write(requests, ordered=False)
+    stale = [membership["_id"] for membership in db[GROUP_MEMBERSHIP_MODEL_NAME].find(
+        projection={"namespace": True, "kind": True, "name": True})
+        if (membership["namespace"], membership["kind"], membership["name"]) not in parents]
+    if stale:
+        db[GROUP_MEMBERSHIP_MODEL_NAME].delete_many({"_id": {"$in": stale}})
+    return len(requests)
@@ -6,7 +6,12 @@ from uuid import UUID
 from pydantic import BaseModel
 from pydantic.schema import Schema
 
-from models.base_record import DEFAULT_NAMESPACE, BaseRecord, BaseRecordConfig
+from db import Database
+from models.base_record import BaseRecord, BaseRecordConfig
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.references import (ReferencedRecord, pull_subject,
+                               rename_subject)
+from models.validity import Validity
 
 GROUP_MODEL_NAME = "groups"
 
@@ -14,9 +19,10 @@ GROUP_MODEL_NAME = "groups"
 class GroupSubjectKind(str, Enum):
     USER = "USER"
     SERVICE_ACCOUNT = "SERVICE_ACCOUNT"
+    GROUP = "GROUP"
 
 
-class GroupSubject(BaseRecordConfig):
+class GroupSubject(Validity):
     kind: GroupSubjectKind
     name: str
 
@@ -30,11 +36,18 @@ class GroupCreate(BaseRecordConfig):
     subjects: List[GroupSubject]
 
 
-class Group(BaseRecord, GroupCreate):
+class Group(ReferencedRecord, GroupCreate):
     @property
     def model_name(self):
         return GROUP_MODEL_NAME
 
+    def cascade_rename(self, db: Database, old_name: str, new_name: str):
+        rename_subject(db, [GROUP_MODEL_NAME, PERMISSION_MODEL_NAME],
+                       "GROUP", old_name, new_name)
+
+    def cascade_delete(self, db: Database, name: str):
+        pull_subject(db, [GROUP_MODEL_NAME, PERMISSION_MODEL_NAME], "GROUP", name)
+
 
 class GroupPartial(BaseRecordConfig):
     metadata: GroupMetadata = None
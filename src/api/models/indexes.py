@@ -0,0 +1,81 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from pymongo.errors import DuplicateKeyError
+
+from db import Database
+from db.journal import JOURNAL_MODEL_NAME, ensure_journal_indexes
+from models.group.group_manager import GroupManager
+from models.group.group_membership import (GROUP_MEMBERSHIP_MODEL_NAME,
+                                           ensure_membership_indexes,
+                                           rebuild_memberships)
+from models.permission.permission_manager import PermissionManager
+from models.resource.resource_manager import ResourceManager
+from models.resource_action.resource_action_manager import \
+    ResourceActionManager
+from models.role.role_manager import RoleManager
+from models.service_account.service_account_manager import \
+    ServiceAccountManager
+from models.user.user_manager import UserManager
+
+# Seconds after which a membership rebuild that never finished, its worker died, is claimed again
+MEMBERSHIPS__REBUILD_TIMEOUT = float(os.environ.get("MEMBERSHIPS__REBUILD_TIMEOUT", 600))
+
+# One document per one-off data migration: {"_id": name, "started_at", "finished_at"}
+MIGRATION_MODEL_NAME = "migrations"
+
+MANAGERS = (UserManager, ServiceAccountManager, GroupManager, PermissionManager,
+            ResourceManager, ResourceActionManager, RoleManager)
+
+
+def ensure_indexes(db: Database) -> Dict[str, List[str]]:
+    """Creates the indexes of every model collection
+
+    Arguments:
+        db {Database} -- Database connection
+
+    Returns:
+        Dict[str, List[str]] -- Ensured index names per collection
+    """
+    indexes = {manager.model_name: manager.ensure_indexes(db)
+               for manager in MANAGERS}
+    indexes[GROUP_MEMBERSHIP_MODEL_NAME] = ensure_membership_indexes(db)
+    indexes[JOURNAL_MODEL_NAME] = ensure_journal_indexes(db)
+    return indexes
+
+
+def _claim_migration(db: Database, name: str, timeout: float) -> bool:
+    """Claims a migration never finished nor started in the last timeout seconds, atomically across processes"""
+    now = datetime.utcnow()
+    try:
+        # Upserting a claimed or finished migration collides with its _id
+        db[MIGRATION_MODEL_NAME].update_one(
+            {"_id": name, "finished_at": None, "started_at": {"$lt": now - timedelta(seconds=timeout)}},
+            {"$set": {"started_at": now}}, upsert=True)
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def ensure_group_memberships(db: Database) -> int:
+    """Builds the group memberships of databases predating nested groups
+
+    Every worker warms up at the same time, the first one claims the
+    rebuild and the others move on.
+
+    Arguments:
+        db {Database} -- Database connection
+
+    Returns:
+        int -- Number of built memberships, 0 if they were already maintained or built by another worker
+    """
+    memberships = db[GROUP_MEMBERSHIP_MODEL_NAME]
+    if memberships.estimated_document_count() or not db[GroupManager.model_name].estimated_document_count():
+        return 0
+    if not _claim_migration(db, GROUP_MEMBERSHIP_MODEL_NAME, MEMBERSHIPS__REBUILD_TIMEOUT):
+        return 0
+    built = rebuild_memberships(db)
+    db[MIGRATION_MODEL_NAME].update_one(
+        {"_id": GROUP_MEMBERSHIP_MODEL_NAME}, {"$set": {"finished_at": datetime.utcnow()}})
+    return built
@@ -1,13 +1,19 @@
+from typing import List
+
 from pydantic.error_wrappers import ValidationError
+from pymongo import ASCENDING, IndexModel
 
 from db.database import Database
 from models.base_record_manager import BaseRecordManager
 from models.group.group_manager import GroupManager
+from models.group.group_membership import find_ancestor_groups
 from models.permission.permission_model import (PERMISSION_MODEL_NAME,
                                                 Permission, PermissionCreate,
                                                 PermissionPartial,
                                                 PermissionSubjectKind)
+from models.references import Reference
 from models.role.role_manager import RoleManager
+from models.role.role_model import ROLE_MODEL_NAME, Role
 from models.service_account.service_account_manager import \
     ServiceAccountManager
 from models.user.user_manager import UserManager
@@ -18,6 +24,65 @@ class PermissionManager(BaseRecordManager):
 
     model = Permission
     model_name = PERMISSION_MODEL_NAME
+    sortable_fields = BaseRecordManager.sortable_fields + ["role"]
+    indexes = BaseRecordManager.indexes + [
+        IndexModel([("metadata.namespace", ASCENDING),
+                    ("role", ASCENDING)]),
+        IndexModel([("metadata.namespace", ASCENDING),
+                    ("subjects.kind", ASCENDING),
+                    ("subjects.name", ASCENDING)]),
+        # Expiry sweeps, across namespaces
+        IndexModel([("expires_at", ASCENDING)], sparse=True),
+    ]
+    references = {
+        "role": Reference("role", {None: (ROLE_MODEL_NAME, Role)}),
+        # Permissions bind the same kinds of subjects as groups hold
+        "subjects": GroupManager.references["subjects"],
+    }
+
+    @classmethod
+    def find_by_role(cls, db: Database, role_name: str, skip: int = 0, limit: int = 25) -> List[Permission]:
+        """Finds the permissions binding a role, served by the role index
+
+        Arguments:
+            db {Database} -- Database connection
+            role_name {str} -- Name of the bound role
+
+        Keyword Arguments:
+            skip {int} -- Number of records to be skipped based on index (default: {0})
+            limit {int} -- Number of records to be returned (default: {25})
+
+        Returns:
+            List[Permission] -- Permissions binding the role
+        """
+        return cls.find(db, skip=skip, limit=limit, filter_params={"role": role_name})
+
+    @classmethod
+    def find_by_subject(cls, db: Database, subject_kind: str, subject_name: str, skip: int = 0, limit: int = 25) -> List[Permission]:
+        """Finds the permissions granted to a subject, directly or through the groups it is a member of, however nested
+
+        Arguments:
+            db {Database} -- Database connection
+            subject_kind {str} -- Kind of the subject
+            subject_name {str} -- Name of the subject
+
+        Keyword Arguments:
+            skip {int} -- Number of records to be skipped based on index (default: {0})
+            limit {int} -- Number of records to be returned (default: {25})
+
+        Returns:
+            List[Permission] -- Permissions granted to the subject
+        """
+        subjects = [(subject_kind, subject_name)]
+        subjects += [(PermissionSubjectKind.GROUP.value, group_name)
+                     for group_name in find_ancestor_groups(db, subject_kind, subject_name)]
+
+        # One $elemMatch per subject so each clause is bounded on both keys of the index
+        return cls.find(db, skip=skip, limit=limit, filter_params={"$or": [
+            {"subjects": {"$elemMatch": {"kind": kind, "name": name}}}
+            for kind, name in subjects
+        ]})
+
     @classmethod
     def validate_permission(cls, db: Database, record: PermissionCreate):
         """Validates permission record
@@ -6,6 +6,7 @@ from uuid import UUID
 from pydantic import BaseModel
 
 from models.base_record import BaseRecord, BaseRecordConfig
+from models.validity import Validity
 
 PERMISSION_MODEL_NAME = "permissions"
 
@@ -25,7 +26,7 @@ class PermissionMetadata(BaseRecordConfig):
     name: str
 
 
-class PermissionCreate(BaseRecordConfig):
+class PermissionCreate(Validity):
     metadata: PermissionMetadata
     role: str
     subjects: List[PermissionSubject] = None
@@ -38,7 +39,7 @@ class Permission(BaseRecord, PermissionCreate):
         return PERMISSION_MODEL_NAME
 
 
-class PermissionPartial(BaseRecordConfig):
+class PermissionPartial(Validity):
     metadata: PermissionMetadata = None
     role: str = None
     subjects: List[PermissionSubject]
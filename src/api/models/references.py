@@ -0,0 +1,135 @@
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+
+from db import CRUD, Database
+from db.journal import record_changes
+from models.base_record import BaseRecord
+from utils.namespace import get_namespace
+
+
+class Reference(NamedTuple):
+    """Field of a record holding the names of other records, resolved by expand=
+
+    targets maps the subject kind to the (model name, model) of the records
+    it names, None for a field holding a single name such as the role of a
+    permission.
+    """
+    field: str
+    targets: Dict[Optional[str], Tuple[str, Type[BaseRecord]]]
+
+
+def _update_journaled(db: Database, model_name: str, filter_params: dict, update: dict, **kwargs) -> int:
+    """Runs update_many on the records matching filter_params and journals each of them"""
+    uuids = [record["uuid"] for record in db[model_name].find(
+        filter_params, projection={"uuid": True})]
+    if not uuids:
+        return 0
+    filter_params = dict(filter_params, uuid={"$in": uuids})
+    result = db[model_name].update_many(filter_params, update, **kwargs)
+    record_changes(db, model_name, get_namespace(), uuids)
+    return result.modified_count
+
+
+def pull_subject(db: Database, model_names: List[str], subject_kind: str, subject_name: str) -> Dict[str, int]:
+    """Removes a subject from the subjects of every record referencing it, one statement per collection
+
+    Arguments:
+        db {Database} -- Database connection
+        model_names {List[str]} -- Collections having a subjects list
+        subject_kind {str} -- Kind of the removed subject
+        subject_name {str} -- Name of the removed subject
+
+    Returns:
+        Dict[str, int] -- Number of modified records per collection
+    """
+    subject = {"kind": subject_kind, "name": subject_name}
+    modified = {}
+    for model_name in model_names:
+        modified[model_name] = _update_journaled(
+            db, model_name,
+            {"metadata.namespace": get_namespace(),
+             "subjects": {"$elemMatch": subject}},
+            {"$pull": {"subjects": subject},
+             "$set": {"updated_at": datetime.utcnow().isoformat()}})
+    return modified
+
+
+def rename_subject(db: Database, model_names: List[str], subject_kind: str, old_name: str, new_name: str) -> Dict[str, int]:
+    """Renames a subject in the subjects of every record referencing it, one statement per collection
+
+    Arguments:
+        db {Database} -- Database connection
+        model_names {List[str]} -- Collections having a subjects list
+        subject_kind {str} -- Kind of the renamed subject
+        old_name {str} -- Previous name of the subject
+        new_name {str} -- New name of the subject
+
+    Returns:
+        Dict[str, int] -- Number of modified records per collection
+    """
+    modified = {}
+    for model_name in model_names:
+        modified[model_name] = _update_journaled(
+            db, model_name,
+            {"metadata.namespace": get_namespace(),
+             "subjects": {"$elemMatch": {"kind": subject_kind, "name": old_name}}},
+            {"$set": {"subjects.$[subject].name": new_name,
+                      "updated_at": datetime.utcnow().isoformat()}},
+            array_filters=[{"subject.kind": subject_kind, "subject.name": old_name}])
+    return modified
+
+
+def rename_field(db: Database, model_name: str, field: str, old_name: str, new_name: str) -> int:
+    """Renames a reference held in a plain field, eg. the role of permissions
+
+    Arguments:
+        db {Database} -- Database connection
+        model_name {str} -- Referencing collection
+        field {str} -- Field holding the referenced name
+        old_name {str} -- Previous name of the referenced record
+        new_name {str} -- New name of the referenced record
+
+    Returns:
+        int -- Number of modified records
+    """
+    return _update_journaled(
+        db, model_name,
+        {"metadata.namespace": get_namespace(), field: old_name},
+        {"$set": {field: new_name, "updated_at": datetime.utcnow().isoformat()}})
+
+
+class ReferencedRecord(BaseRecord):
+    """BaseRecord referenced by name from other records
+
+    Subclasses implement cascade_rename and cascade_delete, which are run from
+    post_save when metadata.name changed and from post_delete respectively.
+    """
+
+    def pre_save(self, db: Database):
+        persisted = None
+        if self.uuid is not None:
+            persisted = CRUD.find_by_uuid(
+                db, self.model_name, self.uuid, namespace=get_namespace())
+        # Not a model field, kept out of dict() and the persisted document
+        object.__setattr__(self, "_persisted", persisted)
+
+    @property
+    def persisted(self) -> Optional[dict]:
+        """Document stored before the running save, None for new records"""
+        return getattr(self, "_persisted", None)
+
+    def post_save(self, db: Database):
+        if self.persisted is None:
+            return
+        persisted_name = self.persisted.get("metadata", {}).get("name")
+        if persisted_name is not None and persisted_name != self.metadata.name:
+            self.cascade_rename(db, persisted_name, self.metadata.name)
+
+    def post_delete(self, db: Database):
+        self.cascade_delete(db, self.metadata.name)
+
+    def cascade_rename(self, db: Database, old_name: str, new_name: str):
+        """Hook to override to rename the references to the record"""
+
+    def cascade_delete(self, db: Database, name: str):
+        """Hook to override to remove the references to the record"""
@@ -11,6 +11,8 @@ class ResourceManager(BaseRecordManager):
 
     model = Resource
     model_name = RESOURCE_MODEL_NAME
+    sortable_fields = BaseRecordManager.sortable_fields + \
+        ["metadata.resource_kind"]
 
     @classmethod
     def create(cls, db: Database, record: ResourceCreate) -> Resource:
@@ -1,4 +1,5 @@
 from pydantic.error_wrappers import ValidationError
+from pymongo import ASCENDING, IndexModel
 
 from db.database import Database
 from models.base_record_manager import BaseRecordManager
@@ -13,6 +14,15 @@ class ResourceActionManager(BaseRecordManager):
 
     model = ResourceAction
     model_name = RESOURCE_ACTION_MODEL_NAME
+    sortable_fields = BaseRecordManager.sortable_fields + \
+        ["metadata.resource_kind"]
+    # Action names repeat across resources, lookups match all three
+    indexes = BaseRecordManager.indexes + [
+        IndexModel([("metadata.namespace", ASCENDING),
+                    ("metadata.name", ASCENDING),
+                    ("metadata.resource_kind", ASCENDING),
+                    ("metadata.resource", ASCENDING)]),
+    ]
 
     @classmethod
     def validate_resource_action(cls, db: Database, record: ResourceActionCreate):
@@ -7,6 +7,8 @@ from models.resource_action.resource_action_manager import \
     ResourceActionManager
 from models.role.role_model import (ROLE_MODEL_NAME, Role, RoleCreate,
                                     RolePartial)
+from utils.conditions import check_condition
+from utils.patterns import check_pattern, is_pattern
 
 
 class RoleManager(BaseRecordManager):
@@ -27,7 +29,17 @@ class RoleManager(BaseRecordManager):
         """
         new_role = record
         for rule in new_role.rules:
-            if rule.resource:
+            for value in [rule.resource or ""] + rule.resource_actions:
+                error = check_pattern(value)
+                if error:
+                    raise ValidationError(error)
+            if rule.condition is not None:
+                error = check_condition(rule.condition)
+                if error:
+                    raise ValidationError(error)
+
+            # Patterns cover resources and actions created later, they are not looked up
+            if rule.resource and not is_pattern(rule.resource):
                 resources = ResourceManager.find(db, filter_params={
                     "metadata.name": rule.resource,
                     "metadata.resource_kind": rule.resource_kind,
@@ -39,8 +51,18 @@ class RoleManager(BaseRecordManager):
                     raise ValidationError(message)
 
             for resource_action in rule.resource_actions:
+                if is_pattern(resource_action):
+                    continue
                 resource_kind = rule.resource_kind
                 resource = rule.resource
+                if is_pattern(resource):
+                    # The action must exist on some resource of the kind
+                    if not ResourceActionManager.find(db, limit=1, filter_params={
+                            "metadata.name": resource_action,
+                            "metadata.resource_kind": resource_kind}):
+                        raise ValidationError(
+                            f"ResourceAction [{resource_action}] of Kind [{resource_kind}] doesn't exist.")
+                    continue
 
                 filter_params = {
                     "metadata.name": resource_action,
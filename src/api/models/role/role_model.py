@@ -5,7 +5,10 @@ from uuid import UUID
 
 from pydantic import BaseModel
 
+from db import Database
 from models.base_record import BaseRecord, BaseRecordConfig
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.references import ReferencedRecord, rename_field
 from models.resource.resource_model import ResourceKind
 
 ROLE_MODEL_NAME = "roles"
@@ -15,10 +18,19 @@ class RoleMetadata(BaseRecordConfig):
     name: str
 
 
+class RuleEffect(str, Enum):
+    ALLOW = "ALLOW"
+    DENY = "DENY"
+
+
 class RoleRule(BaseRecordConfig):
     resource: Optional[str] = None
     resource_kind: ResourceKind = ResourceKind.EVENT
     resource_actions: List[str]
+    # Denies win over allows of any other rule or role of the subject
+    effect: RuleEffect = RuleEffect.ALLOW
+    # Evaluated against the context of the check, eg. 'request.ip in cidr("10.0.0.0/8")'
+    condition: Optional[str] = None
 
 
 class RoleCreate(BaseRecordConfig):
@@ -26,11 +38,14 @@ class RoleCreate(BaseRecordConfig):
     rules: List[RoleRule] = []
 
 
-class Role(BaseRecord, RoleCreate):
+class Role(ReferencedRecord, RoleCreate):
     @property
     def model_name(self):
         return ROLE_MODEL_NAME
 
+    def cascade_rename(self, db: Database, old_name: str, new_name: str):
+        rename_field(db, PERMISSION_MODEL_NAME, "role", old_name, new_name)
+
 
 class RolePartial(BaseRecordConfig):
     metadata: RoleMetadata = None
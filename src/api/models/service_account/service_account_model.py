@@ -4,8 +4,15 @@ from uuid import UUID
 
 from pydantic import BaseModel
 
+from db import Database
 from models.base_record import BaseRecord, BaseRecordConfig
 from models.base_record_manager import BaseRecordManager
+from models.group.group_membership import (remove_membership,
+                                           rename_membership)
+from models.group.group_model import GROUP_MODEL_NAME
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.references import (ReferencedRecord, pull_subject,
+                               rename_subject)
 
 SERVICE_ACCOUNT_MODEL_NAME = "service_accounts"
 
@@ -19,12 +26,21 @@ class ServiceAccountCreate(BaseRecordConfig):
     metadata: ServiceAccountMetadata
 
 
-class ServiceAccount(BaseRecord, ServiceAccountCreate):
+class ServiceAccount(ReferencedRecord, ServiceAccountCreate):
     metadata: ServiceAccountMetadata
     @property
     def model_name(self):
         return SERVICE_ACCOUNT_MODEL_NAME
 
+    def cascade_rename(self, db: Database, old_name: str, new_name: str):
+        rename_subject(db, [GROUP_MODEL_NAME, PERMISSION_MODEL_NAME],
+                       "SERVICE_ACCOUNT", old_name, new_name)
+        rename_membership(db, "SERVICE_ACCOUNT", old_name, new_name)
+
+    def cascade_delete(self, db: Database, name: str):
+        pull_subject(db, [GROUP_MODEL_NAME, PERMISSION_MODEL_NAME], "SERVICE_ACCOUNT", name)
+        remove_membership(db, "SERVICE_ACCOUNT", name)
+
 
 class ServiceAccountPartial(BaseRecordConfig):
     metadata: ServiceAccountMetadata = None
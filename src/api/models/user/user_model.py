@@ -4,8 +4,15 @@ from uuid import UUID
 
 from pydantic import BaseModel
 
+from db import Database
 from models.base_record import BaseRecord, BaseRecordConfig
 from models.base_record_manager import BaseRecordManager
+from models.group.group_membership import (remove_membership,
+                                           rename_membership)
+from models.group.group_model import GROUP_MODEL_NAME
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.references import (ReferencedRecord, pull_subject,
+                               rename_subject)
 
 USER_MODEL_NAME = "users"
 
@@ -19,12 +26,21 @@ class UserCreate(BaseRecordConfig):
     metadata: UserMetadata
 
 
-class User(BaseRecord, UserCreate):
+class User(ReferencedRecord, UserCreate):
     metadata: UserMetadata
     @property
     def model_name(self):
         return USER_MODEL_NAME
 
+    def cascade_rename(self, db: Database, old_name: str, new_name: str):
+        rename_subject(db, [GROUP_MODEL_NAME, PERMISSION_MODEL_NAME],
+                       "USER", old_name, new_name)
+        rename_membership(db, "USER", old_name, new_name)
+
+    def cascade_delete(self, db: Database, name: str):
+        pull_subject(db, [GROUP_MODEL_NAME, PERMISSION_MODEL_NAME], "USER", name)
+        remove_membership(db, "USER", name)
+
 
 class UserPartial(BaseRecordConfig):
     metadata: UserMetadata = None
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from pydantic import validator
+
+from models.base_record import BaseRecordConfig
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC datetime, as Mongo stores and returns them"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class Validity(BaseRecordConfig):
+    """Optional window during which a permission or a group membership applies"""
+    not_before: datetime = None
+    expires_at: datetime = None
+
+    @validator("not_before")
+    def not_before_in_utc(cls, value):
+        return to_utc(value)
+
+    @validator("expires_at")
+    def expires_after_not_before(cls, value, values):
+        value = to_utc(value)
+        not_before = values.get("not_before")
+        if value is not None and not_before is not None and value <= not_before:
+            raise ValueError("expires_at must be later than not_before")
+        return value
+
+
+def is_valid_at(record: dict, now: datetime) -> bool:
+    """Whether now falls in the validity window of a stored permission or group subject"""
+    not_before, expires_at = record.get("not_before"), record.get("expires_at")
+    return (not_before is None or not_before <= now) and (expires_at is None or now < expires_at)
+
+
+def transitions_after(record: dict, now: datetime) -> Iterator[datetime]:
+    """Instants after now at which the record starts or stops applying"""
+    for instant in (record.get("not_before"), record.get("expires_at")):
+        if instant is not None and instant > now:
+            yield instant
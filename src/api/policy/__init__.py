@@ -0,0 +1,4 @@
+from .engine import AccessCheck, CompiledPolicy, Grant
+from .snapshot import (JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, PolicySnapshot,
+                       SnapshotCache, snapshot_cache)
+from .warmup import WarmUp, warm_up
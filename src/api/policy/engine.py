@@ -0,0 +1,627 @@
+import heapq
+import os
+from array import array
+from bisect import bisect_left
+from collections import deque
+from copy import copy
+from datetime import datetime
+from itertools import chain
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from models.base_record import BaseRecordConfig
+from models.group.group_model import GROUP_MODEL_NAME, GroupSubjectKind
+from models.permission.permission_model import (PERMISSION_MODEL_NAME,
+                                                PermissionSubject)
+from models.resource.resource_model import RESOURCE_MODEL_NAME, ResourceKind
+from models.role.role_model import ROLE_MODEL_NAME, RuleEffect
+from models.validity import is_valid_at, transitions_after
+from utils.conditions import (Condition, ConditionError, compile_condition,
+                              evaluate)
+from utils.patterns import WILDCARD, PatternTrie, is_pattern
+
+POLICY__DECISION_TABLE_SIZE = int(
+    os.environ.get("POLICY__DECISION_TABLE_SIZE", 100000))
+
+# Separates the resource kind from the resource name in the keys of the rule trie,
+# and the subject kind from the subject name in the interned subjects
+KIND_SEPARATOR = "\x1f"
+# Action bitset of the rules covering every action, all bits set
+ALL_ACTIONS = -1
+# Typecode of the id tables, unsigned 32 bits on the supported platforms
+ID_TYPECODE = "I"
+
+Subject = Tuple[str, str]
+# Fields of the policy a transition recomputes an entry of
+GRANTS, PARENTS = "grants", "parents"
+# model name -> uuid -> record
+Records = Dict[str, Dict[str, dict]]
+
+_NO_IDS = array(ID_TYPECODE)
+# Sorts after every character of a resource name
+_LAST_CHARACTER = chr(0x10FFFF)
+
+
+class AccessCheck(BaseRecordConfig):
+    subject: PermissionSubject
+    resource_kind: ResourceKind = ResourceKind.EVENT
+    resource: str
+    action: str
+    # Values the conditions of the rules are evaluated against, "now" defaults to the current time
+    context: Dict[str, Any] = {}
+
+
+class Grant(NamedTuple):
+    permission: str
+    role: str
+    effect: str
+
+
+class CompiledRule(NamedTuple):
+    role: int
+    deny: bool
+    # Bit i is set when the rule covers the action of id i
+    actions: int
+    # Prefixes of the action patterns other than "*"
+    prefixes: Tuple[str, ...]
+    condition: Optional[Condition]
+
+
+class Decision(NamedTuple):
+    """Rules of the roles of one subject covering one resource, split by effect
+
+    Entries are (actions bitset, action prefixes, condition or None, Grant),
+    a check tests one bit per entry.
+    """
+    allow: Tuple[tuple, ...]
+    deny: Tuple[tuple, ...]
+
+
+class Interner:
+    """Dense integer ids of names, each name stored once
+
+    Ids are only ever added: policies of successive versions share their
+    interners, and an id stays valid for every policy that saw it.
+    """
+    __slots__ = ("ids", "names")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, name: str) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            # Appended first, an id found in ids always has its name
+            self.names.append(name)
+            name_id = self.ids[name] = len(self.names) - 1
+        return name_id
+
+    def get(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def resource_key(resource_kind: str, resource: Optional[str]) -> str:
+    """Trie key of a resource, or of a resource pattern; rules without resource cover the whole kind"""
+    return resource_kind + KIND_SEPARATOR + (resource or WILDCARD)
+
+
+def subject_key(kind: str, name: str) -> str:
+    return kind + KIND_SEPARATOR + name
+
+
+class ResourceIndex:
+    """Resources of a namespace numbered in (kind, name) order
+
+    A set of resources is a bitmap over their numbers. Resources covered by
+    a prefix pattern, or by a whole kind, have consecutive numbers, so the
+    bitmap of any rule is a single shifted mask.
+    """
+    __slots__ = ("keys",)
+
+    def __init__(self, resources: Iterable[dict]):
+        self.keys = sorted(resource_key(resource["metadata"]["resource_kind"], resource["metadata"]["name"])
+                           for resource in resources)
+
+    def bitmap(self, key: str) -> int:
+        """Resources covered by a rule trie key"""
+        if key.endswith(WILDCARD):
+            low = bisect_left(self.keys, key[:-1])
+            high = bisect_left(self.keys, key[:-1] + _LAST_CHARACTER, low)
+            return ((1 << (high - low)) - 1) << low
+        index = bisect_left(self.keys, key)
+        return 1 << index if index < len(self.keys) and self.keys[index] == key else 0
+
+    def resources(self, bitmap: int, skip: int = 0, limit: int = 0) -> List[Tuple[str, str]]:
+        """(kind, name) of the resources of a bitmap, in (kind, name) order"""
+        bits = format(bitmap, "b")[::-1]
+        found, index = [], bits.find("1")
+        while index >= 0 and (not limit or len(found) < limit):
+            if skip:
+                skip -= 1
+            else:
+                found.append(tuple(self.keys[index].split(KIND_SEPARATOR, 1)))
+            index = bits.find("1", index + 1)
+        return found
+
+
+def _undecided(context: dict):
+    raise ValueError("invalid condition")
+
+
+def compile_rule_condition(source: Optional[str]) -> Optional[Condition]:
+    if not source:
+        return None
+    try:
+        return compile_condition(source)
+    except ConditionError:
+        # Stored before validation: never allows, always denies
+        return _undecided
+
+
+def compile_actions(resource_actions: Iterable[str], actions: Interner) -> Tuple[int, Tuple[str, ...]]:
+    """Bitset of the exact actions, and prefixes of the action patterns"""
+    bitset, prefixes = 0, []
+    for action in resource_actions:
+        if not is_pattern(action):
+            bitset |= 1 << actions.intern(action)
+        elif action == WILDCARD:
+            bitset = ALL_ACTIONS
+        else:
+            prefixes.append(action[:-1])
+    return bitset, tuple(prefixes)
+
+
+def compile_role(role: dict, names: Interner, actions: Interner) -> List[Tuple[str, CompiledRule]]:
+    compiled = []
+    for rule in role.get("rules") or []:
+        bitset, prefixes = compile_actions(rule["resource_actions"], actions)
+        compiled.append((resource_key(rule["resource_kind"], rule.get("resource")), CompiledRule(
+            names.intern(role["metadata"]["name"]), rule.get("effect") == RuleEffect.DENY.value,
+            bitset, prefixes, compile_rule_condition(rule.get("condition")))))
+    return compiled
+
+
+def _is_timed(record: dict) -> bool:
+    """Whether a permission or group subject has a validity window"""
+    return record.get("not_before") is not None or record.get("expires_at") is not None
+
+
+def _covers(bitset: int, prefixes: Tuple[str, ...], action: str, action_id: Optional[int]) -> bool:
+    if bitset == ALL_ACTIONS or (action_id is not None and bitset >> action_id & 1):
+        return True
+    return any(action.startswith(prefix) for prefix in prefixes)
+
+
+class CompiledPolicy:
+    """Decision structures of a namespace, compiled once per policy version
+
+    The rules of every role live in one trie keyed by resource kind and
+    resource name, so the rules covering a resource are found in
+    O(len(resource)) whatever the number of rules and patterns. Decisions
+    merge the allowing and denying rules a subject gets on a resource; they
+    are compiled on first use into a bounded table, so later checks cost a
+    lookup and a bit test per rule, denies or not.
+
+    Subjects, roles, permissions and actions are interned into integer ids.
+    The bindings of a subject are one array of (role, permission) id pairs
+    and its direct groups one array of subject ids, so a binding costs a
+    few bytes rather than a record, and the rules hold their actions as a
+    bitset over the action ids.
+
+    Permissions and group memberships outside of their validity window are
+    left out. The instants they start or stop applying are kept in a heap,
+    so moving the policy forward in time only recomputes the subjects whose
+    window opened or closed.
+
+    Given a SharedIndex of the same records, subjects, names and the
+    bindings and memberships without validity window are read in place
+    from it, only the rules and the entries with a validity window are
+    compiled.
+    """
+
+    def __init__(self, version: int, records: Records, index=None):
+        self.version = version
+        self.actions = Interner()
+        self._attach(index)
+        self._compile_roles(records)
+        self._compile_subjects(records, datetime.utcnow())
+        self._index_resources(records)
+        self._reset_caches()
+
+    def _reset_caches(self):
+        self.decisions: Dict[Tuple[int, str], Decision] = {}
+        # role id -> subject ids holding it, group subject id -> member subject ids, built on first use
+        self.reverse: Optional[Tuple[Dict[int, array], Dict[int, array]]] = None
+        # (resource key, action) -> sorted subject keys, for unconditional audiences
+        self.audiences: Dict[Tuple[str, str], List[str]] = {}
+
+    def _attach(self, index):
+        """Subjects and names of the shared index, private interners without one"""
+        self.index = index
+        if index is None:
+            self.subjects = Interner()
+            # Names of roles and permissions
+            self.names = Interner()
+        else:
+            self.subjects, self.names = index.subjects, index.names
+
+    def _compile_roles(self, records: Records):
+        self.rules = PatternTrie()
+        # role uuid -> (trie key, rule) added for it, to replace them when the role changes
+        self.role_rules: Dict[str, List[Tuple[str, CompiledRule]]] = {}
+        # role name id -> role uuid
+        self.role_uuids: Dict[int, str] = {}
+        for uuid, role in records[ROLE_MODEL_NAME].items():
+            self._add_role(uuid, role)
+
+    def _add_role(self, uuid: str, role: dict):
+        self.role_rules[uuid] = compile_role(role, self.names, self.actions)
+        self.role_uuids[self.names.intern(role["metadata"]["name"])] = uuid
+        for key, rule in self.role_rules[uuid]:
+            self.rules.add(key, rule)
+
+    def _remove_role(self, uuid: str):
+        for key, rule in self.role_rules.pop(uuid, ()):
+            self.rules.remove(key, rule)
+        for role_id in [role_id for role_id, role_uuid in self.role_uuids.items() if role_uuid == uuid]:
+            del self.role_uuids[role_id]
+
+    def _index_resources(self, records: Records):
+        self.resources = ResourceIndex(records[RESOURCE_MODEL_NAME].values())
+        # rule trie key -> bitmap of the resources it covers, filled on first use
+        self.resource_bitmaps: Dict[str, int] = {}
+
+    def _compile_subjects(self, records: Records, now: datetime):
+        # A shared index holds the entries without validity window, and the ids of every subject
+        shared = self.index is not None
+        intern_subject = self.subjects.get if shared else self.subjects.intern
+        intern_name = self.names.intern
+        group_kind = GroupSubjectKind.GROUP.value
+        grants: Dict[int, List[int]] = {}
+        parents: Dict[int, List[int]] = {}
+        # subject id -> (role id, permission id, record) of the permissions naming it with a validity window
+        self.timed_grants: Dict[int, List[Tuple[int, int, dict]]] = {}
+        # subject id -> (group subject id, subject entry of the group) of the groups listing it with a validity window
+        self.timed_parents: Dict[int, List[Tuple[int, dict]]] = {}
+        # heap of (instant, field, subject id) to recompute once the instant has passed
+        self.transitions: List[Tuple[datetime, str, int]] = []
+
+        for permission in records[PERMISSION_MODEL_NAME].values():
+            timed = _is_timed(permission)
+            if shared and not timed:
+                continue
+            role, name = intern_name(permission["role"]), intern_name(permission["metadata"]["name"])
+            for subject in permission.get("subjects") or []:
+                subject_id = intern_subject(subject_key(subject["kind"], subject["name"]))
+                if subject_id is None:
+                    # Written after the shared index was compiled, it comes with the next version
+                    continue
+                if timed:
+                    self.timed_grants.setdefault(subject_id, []).append((role, name, permission))
+                    self.transitions.extend((instant, GRANTS, subject_id)
+                                            for instant in transitions_after(permission, now))
+                else:
+                    binding = grants.setdefault(subject_id, [])
+                    binding.append(role)
+                    binding.append(name)
+        for group in records[GROUP_MODEL_NAME].values():
+            if shared and not any(_is_timed(subject) for subject in group.get("subjects") or []):
+                continue
+            group_id = intern_subject(subject_key(group_kind, group["metadata"]["name"]))
+            if group_id is None:
+                continue
+            for subject in group.get("subjects") or []:
+                timed = _is_timed(subject)
+                if shared and not timed:
+                    continue
+                subject_id = intern_subject(subject_key(subject["kind"], subject["name"]))
+                if subject_id is None:
+                    continue
+                if timed:
+                    self.timed_parents.setdefault(subject_id, []).append((group_id, subject))
+                    self.transitions.extend((instant, PARENTS, subject_id)
+                                            for instant in transitions_after(subject, now))
+                else:
+                    parents.setdefault(subject_id, []).append(group_id)
+        heapq.heapify(self.transitions)
+
+        if shared:
+            self.static_grants, self.static_parents = self.index.grants, self.index.parents
+        else:
+            # subject id -> (role id, permission id) pairs of its bindings without validity window
+            self.static_grants = {subject_id: array(ID_TYPECODE, ids) for subject_id, ids in grants.items()}
+            # subject id -> subject ids of the groups directly containing it, without validity window
+            self.static_parents = {subject_id: array(ID_TYPECODE, ids) for subject_id, ids in parents.items()}
+        # Every entry of the subjects with validity windows, as of now
+        self.active_grants = {subject_id: self._grants_of(subject_id, now)
+                              for subject_id in self.timed_grants}
+        self.active_parents = {subject_id: self._parents_of(subject_id, now)
+                               for subject_id in self.timed_parents}
+
+    def _grants_of(self, subject_id: int, now: datetime) -> array:
+        grants = array(ID_TYPECODE, self.static_grants.get(subject_id, _NO_IDS))
+        for role, permission, record in self.timed_grants[subject_id]:
+            if is_valid_at(record, now):
+                grants.append(role)
+                grants.append(permission)
+        return grants
+
+    def _parents_of(self, subject_id: int, now: datetime) -> array:
+        parents = array(ID_TYPECODE, self.static_parents.get(subject_id, _NO_IDS))
+        parents.extend(group_id for group_id, entry in self.timed_parents[subject_id]
+                       if is_valid_at(entry, now))
+        return parents
+
+    def grants(self, subject_id: int) -> array:
+        grants = self.active_grants.get(subject_id)
+        return grants if grants is not None else self.static_grants.get(subject_id, _NO_IDS)
+
+    def parents(self, subject_id: int) -> array:
+        parents = self.active_parents.get(subject_id)
+        return parents if parents is not None else self.static_parents.get(subject_id, _NO_IDS)
+
+    def is_due(self, now: datetime) -> bool:
+        """Whether a permission or membership started or stopped applying since the policy was compiled"""
+        return bool(self.transitions) and self.transitions[0][0] <= now
+
+    def advanced(self, now: datetime) -> "CompiledPolicy":
+        """Same version of the policy, as of now
+
+        Pops the due transitions off the heap and recomputes the entries of
+        their subjects only. The heap moves to the new policy, checks
+        running on this one are not affected.
+
+        Arguments:
+            now {datetime} -- Current time, naive UTC
+
+        Returns:
+            CompiledPolicy -- New policy, sharing the rules and the heap of this one
+        """
+        policy = copy(self)
+        policy.active_grants, policy.active_parents = dict(self.active_grants), dict(self.active_parents)
+        while policy.is_due(now):
+            _, field, subject_id = heapq.heappop(policy.transitions)
+            if field == GRANTS:
+                policy.active_grants[subject_id] = policy._grants_of(subject_id, now)
+            else:
+                policy.active_parents[subject_id] = policy._parents_of(subject_id, now)
+        policy._reset_caches()
+        return policy
+
+    def updated(self, version: int, records: Records, changed: Dict[str, Set[str]], index=None) -> "CompiledPolicy":
+        """Policy of a later version, recompiling only the changed roles
+
+        The rule trie is copied on write, checks running on this policy are
+        not affected. When permissions or groups changed and either policy
+        uses a shared index, names get the ids of the new index and every
+        role is recompiled.
+
+        Arguments:
+            version {int} -- Version of the records
+            records {Records} -- Every record of the later version
+            changed {Dict[str, Set[str]]} -- uuids of the changed records per model name
+            index {SharedIndex} -- Shared index of the later version, None to compile privately
+
+        Returns:
+            CompiledPolicy -- New policy, this one is left untouched
+        """
+        policy = copy(self)
+        policy.version = version
+        subjects_changed = bool(changed.get(PERMISSION_MODEL_NAME) or changed.get(GROUP_MODEL_NAME))
+        if subjects_changed and (index is not None or self.index is not None):
+            policy._attach(index)
+            policy._compile_roles(records)
+        else:
+            policy.rules = self.rules.copy()
+            policy.role_rules, policy.role_uuids = dict(self.role_rules), dict(self.role_uuids)
+            for uuid in changed.get(ROLE_MODEL_NAME, ()):
+                policy._remove_role(uuid)
+                if uuid in records[ROLE_MODEL_NAME]:
+                    policy._add_role(uuid, records[ROLE_MODEL_NAME][uuid])
+        if subjects_changed:
+            policy._compile_subjects(records, datetime.utcnow())
+        if changed.get(RESOURCE_MODEL_NAME):
+            policy._index_resources(records)
+        policy._reset_caches()
+        return policy
+
+    def ancestor_groups(self, subject_id: int) -> Set[int]:
+        """Subject ids of the groups containing the subject, directly or through nested groups"""
+        groups: Set[int] = set()
+        queue = deque(self.parents(subject_id))
+        while queue:
+            group_id = queue.popleft()
+            if group_id not in groups:
+                groups.add(group_id)
+                queue.extend(self.parents(group_id))
+        return groups
+
+    def roles_of(self, subject_id: int) -> Dict[int, int]:
+        """Role ids of the subject and of its groups, with the id of the permission granting each"""
+        roles: Dict[int, int] = {}
+        for holder in [subject_id, *self.ancestor_groups(subject_id)]:
+            grants = self.grants(holder)
+            for index in range(0, len(grants), 2):
+                roles.setdefault(grants[index], grants[index + 1])
+        return roles
+
+    def decision(self, subject_id: int, resource_kind: str, resource: str) -> Decision:
+        key = resource_key(resource_kind, resource)
+        decision = self.decisions.get((subject_id, key))
+        if decision is not None:
+            return decision
+
+        allow, deny = [], []
+        roles = self.roles_of(subject_id)
+        if roles:
+            names = self.names.names
+            for rule in self.rules.match(key):
+                permission = roles.get(rule.role)
+                if permission is not None:
+                    effect = RuleEffect.DENY.value if rule.deny else RuleEffect.ALLOW.value
+                    (deny if rule.deny else allow).append((
+                        rule.actions, rule.prefixes, rule.condition,
+                        Grant(names[permission], names[rule.role], effect)))
+        decision = Decision(tuple(allow), tuple(deny))
+        if len(self.decisions) >= POLICY__DECISION_TABLE_SIZE:
+            self.decisions.clear()
+        self.decisions[(subject_id, key)] = decision
+        return decision
+
+    def resource_bitmap(self, key: str) -> int:
+        bitmap = self.resource_bitmaps.get(key)
+        if bitmap is None:
+            bitmap = self.resource_bitmaps[key] = self.resources.bitmap(key)
+        return bitmap
+
+    def allowed_resources(self, subject: Subject, action: str, context: dict = None) -> int:
+        """Bitmap of the resources the subject may run action on, as check would decide one by one
+
+        The bitmaps of the rules of the subject's roles are ORed, denied
+        ones masked out: the work depends on the number of rules of the
+        subject's roles, not on the number of resources. Conditions are
+        evaluated once per rule, the context does not depend on the resource.
+
+        Arguments:
+            subject {Subject} -- (kind, name) of the subject
+            action {str} -- Name of the resource action
+            context {dict} -- Values the rule conditions are evaluated against
+
+        Returns:
+            int -- Bitmap over the numbers of self.resources
+        """
+        subject_id = self.subjects.get(subject_key(*subject))
+        if subject_id is None:
+            return 0
+        context = context or {}
+        action_id = self.actions.get(action)
+        allowed = denied = 0
+        for role_id in self.roles_of(subject_id):
+            for key, rule in self.role_rules.get(self.role_uuids.get(role_id), ()):
+                if not _covers(rule.actions, rule.prefixes, action, action_id):
+                    continue
+                if rule.condition is not None:
+                    decided = evaluate(rule.condition, context)
+                    if (decided is False) if rule.deny else (decided is not True):
+                        continue
+                if rule.deny:
+                    denied |= self.resource_bitmap(key)
+                else:
+                    allowed |= self.resource_bitmap(key)
+        return allowed & ~denied
+
+    def _reverse_index(self) -> Tuple[Dict[int, array], Dict[int, array]]:
+        if self.reverse is None:
+            holders: Dict[int, List[int]] = {}
+            members: Dict[int, List[int]] = {}
+            for subject_id in chain(self.static_grants, (subject_id for subject_id in self.active_grants
+                                                         if subject_id not in self.static_grants)):
+                grants = self.grants(subject_id)
+                for index in range(0, len(grants), 2):
+                    holders.setdefault(grants[index], []).append(subject_id)
+            for subject_id in chain(self.static_parents, (subject_id for subject_id in self.active_parents
+                                                          if subject_id not in self.static_parents)):
+                for group_id in self.parents(subject_id):
+                    members.setdefault(group_id, []).append(subject_id)
+            self.reverse = ({role_id: array(ID_TYPECODE, ids) for role_id, ids in holders.items()},
+                            {group_id: array(ID_TYPECODE, ids) for group_id, ids in members.items()})
+        return self.reverse
+
+    def _expand(self, holders: Iterable[int], members: Dict[int, array]) -> Set[int]:
+        """The holders, and the members of the groups among them however nested"""
+        subjects: Set[int] = set()
+        queue = deque(holders)
+        while queue:
+            subject_id = queue.popleft()
+            if subject_id not in subjects:
+                subjects.add(subject_id)
+                queue.extend(members.get(subject_id, ()))
+        return subjects
+
+    def audience(self, resource_kind: str, resource: str, action: str, context: dict = None) -> List[str]:
+        """Every subject allowed to run action on the resource, as check would decide subject by subject
+
+        The rules covering the resource are found in the rule trie, their
+        roles lead to the subjects holding them through the reverse index
+        of the bindings, and groups are expanded to their members however
+        nested; subjects reached through a denying role are taken out. The
+        reverse index is built once per policy, audiences without
+        conditions are cached.
+
+        Arguments:
+            resource_kind {str} -- Kind of the resource
+            resource {str} -- Name of the resource
+            action {str} -- Name of the resource action
+            context {dict} -- Values the rule conditions are evaluated against
+
+        Returns:
+            List[str] -- Sorted keys of the allowed subjects, see subject_key
+        """
+        key = resource_key(resource_kind, resource)
+        audience = self.audiences.get((key, action))
+        if audience is not None:
+            return audience
+
+        context = context or {}
+        action_id = self.actions.get(action)
+        allowing, denying, conditional = set(), set(), False
+        for rule in self.rules.match(key):
+            if not _covers(rule.actions, rule.prefixes, action, action_id):
+                continue
+            if rule.condition is not None:
+                conditional = True
+                decided = evaluate(rule.condition, context)
+                if (decided is False) if rule.deny else (decided is not True):
+                    continue
+            (denying if rule.deny else allowing).add(rule.role)
+
+        holders, members = self._reverse_index()
+        allowed = self._expand((subject_id for role_id in allowing for subject_id in holders.get(role_id, ())),
+                               members)
+        if allowed and denying:
+            allowed -= self._expand((subject_id for role_id in denying for subject_id in holders.get(role_id, ())),
+                                    members)
+        names = self.subjects.names
+        audience = sorted(names[subject_id] for subject_id in allowed)
+        if not conditional:
+            if len(self.audiences) >= POLICY__DECISION_TABLE_SIZE:
+                self.audiences.clear()
+            self.audiences[(key, action)] = audience
+        return audience
+
+    def check(self, subject: Subject, resource_kind: str, resource: str, action: str,
+              context: dict = None) -> Optional[Grant]:
+        """Decides whether the subject may run action on the resource, denies overriding allows
+
+        A conditional allow applies when its condition holds, a conditional
+        deny unless its condition fails: a context missing the values of a
+        condition never grants more access.
+
+        Arguments:
+            subject {Subject} -- (kind, name) of the subject
+            resource_kind {str} -- Kind of the resource
+            resource {str} -- Name of the resource
+            action {str} -- Name of the resource action
+            context {dict} -- Values the rule conditions are evaluated against
+
+        Returns:
+            Optional[Grant] -- Deciding permission, role and effect, None when no rule applies
+        """
+        subject_id = self.subjects.get(subject_key(*subject))
+        if subject_id is None:
+            return None
+        context = context or {}
+        action_id = self.actions.get(action)
+        decision = self.decision(subject_id, resource_kind, resource)
+        for bitset, prefixes, condition, grant in decision.deny:
+            if _covers(bitset, prefixes, action, action_id) and (
+                    condition is None or evaluate(condition, context) is not False):
+                return grant
+        for bitset, prefixes, condition, grant in decision.allow:
+            if _covers(bitset, prefixes, action, action_id) and (
+                    condition is None or evaluate(condition, context)):
+                return grant
+        return None
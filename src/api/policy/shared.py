@@ -0,0 +1,276 @@
+"""Compiled policy indexes shared by the worker processes of a host
+
+The bindings and group memberships of a namespace, the bulk of a compiled
+policy, are published once per host and policy version into a file of
+POLICY__SHARED_DIR, a tmpfs such as /dev/shm. Workers map it read-only and
+read the ids in place: the pages are shared through the page cache, so the
+memory of the index does not grow with the number of workers, and a single
+worker compiles each version while the others wait for it and attach.
+
+A new generation is written next to the current one and renamed over it:
+workers holding the previous generation keep their mapping, the file is
+released once the last of them moved on.
+"""
+import fcntl
+import mmap
+import os
+import struct
+from array import array
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from policy.engine import ID_TYPECODE, CompiledPolicy, Interner, Records
+from utils.metrics import Counter
+
+# Directory of the shared indexes, eg. /dev/shm/iam-policy; indexes are private to each process when empty
+POLICY__SHARED_DIR = os.environ.get("POLICY__SHARED_DIR", "")
+
+SHARED_INDEXES = Counter(
+    "gala_iam_policy_shared_indexes_total",
+    "Shared policy indexes by event, published by the worker that compiled them or attached by the others",
+    ("event",))
+
+MAGIC = b"GIAM"
+FORMAT = 1
+# magic, format, reserved, policy version, then the number of subjects, names,
+# grant ids and parent ids and the bytes of the subject and name blobs
+HEADER = struct.Struct("=4sHHQ6I")
+
+
+class SortedNames:
+    """Interner over names stored sorted by their UTF-8 bytes, the id of a name is its rank
+
+    Names missing from the index, such as the name of a role created since,
+    are interned privately with ids following the shared ones.
+    """
+    __slots__ = ("offsets", "blob", "count", "extra", "names")
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+        self.count = len(offsets) - 1
+        self.extra = Interner()
+        # Same interface as Interner, names[id] is the name of an id
+        self.names = self
+
+    def _encoded(self, name_id: int) -> bytes:
+        return bytes(self.blob[self.offsets[name_id]:self.offsets[name_id + 1]])
+
+    def __getitem__(self, name_id: int) -> str:
+        if name_id >= self.count:
+            return self.extra.names[name_id - self.count]
+        return self._encoded(name_id).decode()
+
+    def __len__(self) -> int:
+        return self.count + len(self.extra)
+
+    def get(self, name: str) -> Optional[int]:
+        encoded = name.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._encoded(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._encoded(low) == encoded:
+            return low
+        extra_id = self.extra.get(name)
+        return None if extra_id is None else self.count + extra_id
+
+    def intern(self, name: str) -> int:
+        name_id = self.get(name)
+        if name_id is None:
+            name_id = self.count + self.extra.intern(name)
+        return name_id
+
+
+class IdLists:
+    """Lists of ids per subject id, as offsets into one flat array of ids
+
+    Reads like the dict of arrays of a private policy, without a Python
+    object per subject.
+    """
+    __slots__ = ("offsets", "ids")
+
+    def __init__(self, offsets: memoryview, ids: memoryview):
+        self.offsets = offsets
+        self.ids = ids
+
+    def get(self, subject_id: int, default=None):
+        if subject_id + 1 < len(self.offsets):
+            start, end = self.offsets[subject_id], self.offsets[subject_id + 1]
+            if start < end:
+                return self.ids[start:end]
+        return default
+
+    def __contains__(self, subject_id: int) -> bool:
+        return self.get(subject_id) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        offsets = self.offsets
+        return (subject_id for subject_id in range(len(offsets) - 1)
+                if offsets[subject_id] < offsets[subject_id + 1])
+
+
+class SharedIndex:
+    """Subjects, names, bindings and memberships of one policy version, mapped from a shared file"""
+
+    def __init__(self, buffer: mmap.mmap):
+        view = memoryview(buffer)
+        magic, file_format, _, self.version, subjects, names, grant_ids, parent_ids, subjects_size, names_size = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC or file_format != FORMAT:
+            raise ValueError("not a shared policy index of format %d" % FORMAT)
+        # Content of the index, as encoded
+        self.buffer = view
+        self.size = len(view)
+        position = HEADER.size
+
+        def ids(count: int) -> memoryview:
+            nonlocal position
+            start, position = position, position + count * 4
+            return view[start:position].cast(ID_TYPECODE)
+
+        subject_offsets = ids(subjects + 1)
+        self.grants = IdLists(ids(subjects + 1), ids(grant_ids))
+        self.parents = IdLists(ids(subjects + 1), ids(parent_ids))
+        name_offsets = ids(names + 1)
+        self.subjects = SortedNames(subject_offsets, view[position:position + subjects_size])
+        position += subjects_size
+        self.names = SortedNames(name_offsets, view[position:position + names_size])
+
+
+def _ranks(names: Sequence[str]) -> Tuple[List[bytes], List[int], array]:
+    """Encoded names, ids in the order of the encoded names, and the rank of each id"""
+    encoded = [name.encode() for name in names]
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+    ranks = array(ID_TYPECODE, bytes(len(order) * 4))
+    for rank, name_id in enumerate(order):
+        ranks[name_id] = rank
+    return encoded, order, ranks
+
+
+def _flatten(lists: Iterable[Iterable[int]]) -> Tuple[array, array]:
+    """Offsets and ids of id lists"""
+    offsets, ids = array(ID_TYPECODE, [0]), array(ID_TYPECODE)
+    for values in lists:
+        ids.extend(values)
+        offsets.append(len(ids))
+    return offsets, ids
+
+
+def _strings(strings: Sequence[bytes]) -> Tuple[array, bytes]:
+    """Offsets and blob of encoded strings"""
+    offsets, position = array(ID_TYPECODE, [0]), 0
+    for string in strings:
+        position += len(string)
+        offsets.append(position)
+    return offsets, b"".join(strings)
+
+
+def encode(policy: CompiledPolicy) -> bytes:
+    """Shared index of a privately compiled policy
+
+    Subjects and names are renumbered in the order of their keys, so that
+    workers find them by bisection.
+
+    Arguments:
+        policy {CompiledPolicy} -- Policy compiled without shared index
+
+    Returns:
+        bytes -- Content of the shared index file
+    """
+    subjects, order, subject_ranks = _ranks(policy.subjects.names)
+    names, name_order, name_ranks = _ranks(policy.names.names)
+
+    grant_offsets, grant_ids = _flatten(
+        (name_ranks[name_id] for name_id in policy.static_grants.get(subject_id, ()))
+        for subject_id in order)
+    parent_offsets, parent_ids = _flatten(
+        (subject_ranks[group_id] for group_id in policy.static_parents.get(subject_id, ()))
+        for subject_id in order)
+    subject_offsets, subject_blob = _strings([subjects[subject_id] for subject_id in order])
+    name_offsets, name_blob = _strings([names[name_id] for name_id in name_order])
+    header = HEADER.pack(MAGIC, FORMAT, 0, policy.version, len(order), len(name_order),
+                         len(grant_ids), len(parent_ids), len(subject_blob), len(name_blob))
+    return b"".join([header, subject_offsets.tobytes(), grant_offsets.tobytes(), grant_ids.tobytes(),
+                     parent_offsets.tobytes(), parent_ids.tobytes(), name_offsets.tobytes(),
+                     subject_blob, name_blob])
+
+
+@contextmanager
+def _locked(path: str):
+    with open(path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class SharedIndexes:
+    """Shared index of each namespace, published by the first worker needing a version and attached by the others"""
+
+    def __init__(self, directory: str = POLICY__SHARED_DIR):
+        self.directory = directory
+
+    def _path(self, namespace: str) -> str:
+        # Namespaces are validated DNS labels, safe as file names
+        return os.path.join(self.directory, namespace + ".policy")
+
+    def attach(self, namespace: str) -> Optional[SharedIndex]:
+        """Current generation of the shared index of a namespace, None when missing or of another format"""
+        try:
+            with open(self._path(namespace), "rb") as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            return SharedIndex(buffer)
+        except (ValueError, struct.error):
+            return None
+
+    def publish(self, namespace: str, version: int, records: Records) -> SharedIndex:
+        """Compiles the records and renames their index over the current generation"""
+        path = self._path(namespace)
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(temporary, "wb") as file:
+                file.write(encode(CompiledPolicy(version, records)))
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        SHARED_INDEXES.inc(event="published")
+        return self.attach(namespace)
+
+    def get(self, namespace: str, version: int, records: Records) -> Optional[SharedIndex]:
+        """Shared index of the records of a namespace at a version
+
+        Arguments:
+            namespace {str} -- Namespace of the records
+            version {int} -- Version of the records
+            records {Records} -- Every record of the version, compiled when no worker published it yet
+
+        Returns:
+            Optional[SharedIndex] -- None when sharing is disabled, or when another worker already published a later version
+        """
+        if not self.directory:
+            return None
+        index = self.attach(namespace)
+        if index is None or index.version < version:
+            os.makedirs(self.directory, exist_ok=True)
+            # One worker compiles, the others wait and attach its generation
+            with _locked(self._path(namespace) + ".lock"):
+                index = self.attach(namespace)
+                if index is None or index.version < version:
+                    return self.publish(namespace, version, records)
+        if index.version != version:
+            # Ahead of this worker, its policy is compiled privately until it catches up
+            return None
+        SHARED_INDEXES.inc(event="attached")
+        return index
+
+
+shared_indexes = SharedIndexes()
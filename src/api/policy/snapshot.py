@@ -0,0 +1,324 @@
+import gzip
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Mapping, NamedTuple, Optional, Tuple
+
+from db import CRUD, Database
+from db.journal import (CHANGES_SEQUENCE, JournalTruncatedException,
+                        read_changes)
+from models.group.group_model import GROUP_MODEL_NAME
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.resource.resource_model import RESOURCE_MODEL_NAME
+from models.resource_action.resource_action_model import \
+    RESOURCE_ACTION_MODEL_NAME
+from models.role.role_model import ROLE_MODEL_NAME
+from policy.engine import CompiledPolicy, Records
+from policy.shared import encode, shared_indexes
+from policy.snapshot_file import (read_snapshot_file, snapshot_file_version,
+                                  try_locked, write_snapshot_file)
+from utils.cache import TTLCache
+from utils.metrics import Counter
+from utils.responses import ORJSONResponse
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+POLICY__VERSION_TTL = float(os.environ.get("POLICY__VERSION_TTL", 1))
+# Past this many journaled changes a snapshot is rebuilt from scratch
+POLICY__INCREMENTAL_LIMIT = int(os.environ.get("POLICY__INCREMENTAL_LIMIT", 1000))
+# Directory of the snapshot files read at cold start, eg. a volume of the pod; none are written when empty
+POLICY__SNAPSHOT_DIR = os.environ.get("POLICY__SNAPSHOT_DIR", "")
+# Minimum seconds between two snapshot files of a namespace
+POLICY__SNAPSHOT_INTERVAL = float(os.environ.get("POLICY__SNAPSHOT_INTERVAL", 300))
+
+SNAPSHOT_FILES = Counter(
+    "gala_iam_policy_snapshot_files_total",
+    "Policy snapshot files by event, saved, loaded at cold start or invalid and ignored",
+    ("event",))
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MODEL_NAMES = (ROLE_MODEL_NAME, PERMISSION_MODEL_NAME,
+                        GROUP_MODEL_NAME, RESOURCE_ACTION_MODEL_NAME)
+# Records compiled into the policy, resources are indexed but not served in the snapshot
+COMPILED_MODEL_NAMES = SNAPSHOT_MODEL_NAMES + (RESOURCE_MODEL_NAME,)
+SNAPSHOT_PROJECTION = {"_id": False, "kind": False,
+                       "created_at": False, "updated_at": False}
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+JSON_MEDIA_TYPE = "application/json"
+
+
+class PolicySnapshot(NamedTuple):
+    version: int
+    etag: str
+    # (media type, content encoding or None) -> body, see SnapshotBuffers
+    buffers: Mapping[Tuple[str, Optional[str]], bytes]
+    # model name -> number of records
+    counts: Dict[str, int]
+    policy: CompiledPolicy
+    records: Records
+
+
+def _msgpack_default(value):
+    # Validity windows, formatted as in the JSON snapshot
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError("Cannot serialize %r" % (value,))
+
+
+def serialize(namespace: str, version: int, records: Records) -> Dict[Tuple[str, Optional[str]], bytes]:
+    """Serializes the records once per supported media type and encoding"""
+    image = {"version": version, "namespace": namespace}
+    for model_name in SNAPSHOT_MODEL_NAMES:
+        image[model_name] = list(records[model_name].values())
+
+    buffers = {(JSON_MEDIA_TYPE, None): ORJSONResponse(image).body}
+    if msgpack is not None:
+        buffers[(MSGPACK_MEDIA_TYPE, None)] = msgpack.packb(
+            image, use_bin_type=True, default=_msgpack_default)
+    for media_type, _ in list(buffers):
+        buffers[(media_type, "gzip")] = gzip.compress(
+            buffers[(media_type, None)])
+    return buffers
+
+
+class SnapshotBuffers(Mapping):
+    """Bodies of a snapshot, serialized on first use unless read from a snapshot file
+
+    Versions that no client fetches are compiled for checks but never
+    serialized.
+    """
+
+    def __init__(self, namespace: str, version: int, records: Records,
+                 serialized: Optional[Dict[Tuple[str, Optional[str]], bytes]] = None):
+        self._arguments = (namespace, version, records)
+        self.serialized = serialized
+        self._lock = threading.Lock()
+
+    def _buffers(self) -> Dict[Tuple[str, Optional[str]], bytes]:
+        if self.serialized is None:
+            with self._lock:
+                if self.serialized is None:
+                    self.serialized = serialize(*self._arguments)
+        return self.serialized
+
+    def __getitem__(self, key: Tuple[str, Optional[str]]) -> bytes:
+        return self._buffers()[key]
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[str]]]:
+        return iter(self._buffers())
+
+    def __len__(self) -> int:
+        return len(self._buffers())
+
+
+def _snapshot(namespace: str, version: int, records: Records, policy: CompiledPolicy,
+              buffers: Optional[Dict[Tuple[str, Optional[str]], bytes]] = None) -> PolicySnapshot:
+    return PolicySnapshot(version=version, etag='"%s-%d"' % (namespace, version),
+                          buffers=SnapshotBuffers(namespace, version, records, buffers),
+                          counts={model_name: len(records[model_name])
+                                  for model_name in COMPILED_MODEL_NAMES},
+                          policy=policy, records=records)
+
+
+def build_snapshot(db: Database, namespace: str, version: int) -> PolicySnapshot:
+    """Reads every policy record of a namespace, serializes and compiles them
+
+    Arguments:
+        db {Database} -- Database connection
+        namespace {str} -- Namespace of the records
+        version {int} -- Changes sequence read before the records
+
+    Returns:
+        PolicySnapshot -- Serialized snapshot
+    """
+    records = {model_name: {record["uuid"]: record for record in db[model_name].find(
+        {"metadata.namespace": namespace}, projection=SNAPSHOT_PROJECTION)}
+        for model_name in COMPILED_MODEL_NAMES}
+    return _snapshot(namespace, version, records,
+                     CompiledPolicy(version, records, shared_indexes.get(namespace, version, records)))
+
+
+def update_snapshot(db: Database, namespace: str, snapshot: PolicySnapshot, version: int) -> Optional[PolicySnapshot]:
+    """Applies the journaled changes after the snapshot, reading only the changed records
+
+    Arguments:
+        db {Database} -- Database connection
+        namespace {str} -- Namespace of the snapshot
+        snapshot {PolicySnapshot} -- Snapshot to start from, left untouched
+        version {int} -- Current changes sequence
+
+    Returns:
+        Optional[PolicySnapshot] -- Updated snapshot, None when the snapshot is to be rebuilt from scratch
+    """
+    changes, cursor = [], snapshot.version
+    try:
+        while cursor < version and len(changes) <= POLICY__INCREMENTAL_LIMIT:
+            page, page_cursor = read_changes(
+                db, cursor, namespace, set(COMPILED_MODEL_NAMES))
+            if page_cursor == cursor:
+                # Concurrent write not journaled yet, it is picked up next time
+                break
+            changes.extend(page)
+            cursor = page_cursor
+    except JournalTruncatedException:
+        return None
+    if len(changes) > POLICY__INCREMENTAL_LIMIT:
+        return None
+    if cursor == snapshot.version:
+        return snapshot
+
+    changed: Dict[str, set] = {}
+    for change in changes:
+        changed.setdefault(change["kind"], set()).add(change["uuid"])
+    records = dict(snapshot.records)
+    for model_name, uuids in changed.items():
+        records[model_name] = dict(records[model_name])
+        for uuid in uuids:
+            records[model_name].pop(uuid, None)
+        # Deleted records are not found, tombstones need no special case
+        for record in db[model_name].find({"uuid": {"$in": list(uuids)}, "metadata.namespace": namespace},
+                                          projection=SNAPSHOT_PROJECTION):
+            records[model_name][record["uuid"]] = record
+    index = None
+    if changed.keys() & {PERMISSION_MODEL_NAME, GROUP_MODEL_NAME}:
+        index = shared_indexes.get(namespace, cursor, records)
+    return _snapshot(namespace, cursor, records, snapshot.policy.updated(cursor, records, changed, index))
+
+
+def _snapshot_path(directory: str, namespace: str) -> str:
+    # Namespaces are validated DNS labels, safe as file names
+    return os.path.join(directory, namespace + ".snapshot")
+
+
+def save_snapshot(directory: str, namespace: str, snapshot: PolicySnapshot) -> Optional[int]:
+    """Writes the snapshot file of a namespace, with the bodies only if they were serialized
+
+    Arguments:
+        directory {str} -- Directory of the snapshot files
+        namespace {str} -- Namespace of the snapshot
+        snapshot {PolicySnapshot} -- Snapshot to persist
+
+    Returns:
+        Optional[int] -- Size of the file, None when another process is saving or the file is as recent
+    """
+    path = _snapshot_path(directory, namespace)
+    os.makedirs(directory, exist_ok=True)
+    with try_locked(path + ".lock") as locked:
+        saved = snapshot_file_version(path)
+        if not locked or (saved is not None and saved >= snapshot.version):
+            return None
+        policy = snapshot.policy
+        # Roles only changes keep the index of an earlier version, its bindings are the same
+        index = bytes(policy.index.buffer) if policy.index is not None else encode(policy)
+        size = write_snapshot_file(path, namespace, snapshot.version, index,
+                                   snapshot.records, snapshot.buffers.serialized)
+    SNAPSHOT_FILES.inc(event="saved")
+    return size
+
+
+def load_snapshot(directory: str, namespace: str) -> Optional[PolicySnapshot]:
+    """Snapshot of the namespace's file, its policy reading the bindings in place from the file
+
+    Arguments:
+        directory {str} -- Directory of the snapshot files
+        namespace {str} -- Namespace of the snapshot
+
+    Returns:
+        Optional[PolicySnapshot] -- Snapshot as of the version of the file, None when missing or invalid
+    """
+    try:
+        loaded = read_snapshot_file(_snapshot_path(directory, namespace), namespace)
+        if loaded is not None and any(model_name not in loaded.records for model_name in COMPILED_MODEL_NAMES):
+            raise ValueError("missing records")
+    except ValueError as exc:
+        logger.warning("Ignoring the policy snapshot file of namespace %s: %s", namespace, exc)
+        SNAPSHOT_FILES.inc(event="invalid")
+        return None
+    if loaded is None:
+        return None
+    SNAPSHOT_FILES.inc(event="loaded")
+    return _snapshot(namespace, loaded.version, loaded.records,
+                     CompiledPolicy(loaded.version, loaded.records, loaded.index), loaded.buffers)
+
+
+class SnapshotCache:
+    """Serialized policy snapshots per namespace, updated from the journal when the changes sequence moved
+
+    The sequence itself is re-read at most every POLICY__VERSION_TTL seconds,
+    so serving a cached snapshot does not touch Mongo at all. With a
+    directory, a namespace first starts from its snapshot file and reads
+    only the changes since, and new versions are saved in the background at
+    most every save_interval seconds.
+    """
+
+    def __init__(self, version_ttl: float = POLICY__VERSION_TTL, directory: str = POLICY__SNAPSHOT_DIR,
+                 save_interval: float = POLICY__SNAPSHOT_INTERVAL):
+        self._versions = TTLCache(ttl=version_ttl)
+        self._snapshots: Dict[str, PolicySnapshot] = {}
+        self._lock = threading.Lock()
+        self.directory = directory
+        self.save_interval = save_interval
+        # namespace -> monotonic time of the last save
+        self._saved: Dict[str, float] = {}
+
+    def current_version(self, db: Database) -> int:
+        return self._versions.get_or_set(
+            CHANGES_SEQUENCE, lambda: CRUD.current_sequence(db, CHANGES_SEQUENCE))
+
+    def get(self, db: Database, namespace: str) -> PolicySnapshot:
+        version = self.current_version(db)
+        snapshot = self._snapshots.get(namespace)
+        if snapshot is not None and snapshot.version >= version:
+            if snapshot.policy.is_due(datetime.utcnow()):
+                return self._advance(namespace)
+            return snapshot
+
+        # One rebuild at a time, concurrent requests get the freshly built snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(namespace)
+            if snapshot is None or snapshot.version < version:
+                updated = None
+                if snapshot is None and self.directory:
+                    snapshot = load_snapshot(self.directory, namespace)
+                    if snapshot is not None and snapshot.version > version:
+                        # Saved against another database, or one restored since
+                        snapshot = None
+                if snapshot is not None:
+                    updated = update_snapshot(db, namespace, snapshot, version)
+                snapshot = updated or build_snapshot(db, namespace, version)
+                self._snapshots[namespace] = snapshot
+                self._save_later(namespace, snapshot)
+        return snapshot
+
+    def _save_later(self, namespace: str, snapshot: PolicySnapshot):
+        if not self.directory or time.monotonic() - self._saved.get(namespace, float("-inf")) < self.save_interval:
+            return
+        self._saved[namespace] = time.monotonic()
+        threading.Thread(target=self._save, args=(namespace, snapshot),
+                         name="gala-iam-snapshot-save", daemon=True).start()
+
+    def _save(self, namespace: str, snapshot: PolicySnapshot):
+        try:
+            save_snapshot(self.directory, namespace, snapshot)
+        except Exception as exc:
+            logger.warning("Saving the policy snapshot file of namespace %s failed: %s", namespace, exc)
+
+    def _advance(self, namespace: str) -> PolicySnapshot:
+        """Applies the permissions and memberships starting or expiring since the snapshot was compiled"""
+        with self._lock:
+            snapshot = self._snapshots[namespace]
+            now = datetime.utcnow()
+            if snapshot.policy.is_due(now):
+                snapshot = snapshot._replace(policy=snapshot.policy.advanced(now))
+                self._snapshots[namespace] = snapshot
+        return snapshot
+
+
+snapshot_cache = SnapshotCache()
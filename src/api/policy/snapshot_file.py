@@ -0,0 +1,245 @@
+"""Policy snapshots persisted to local files, for a fast cold start
+
+A snapshot file holds, for one namespace and policy version, the shared
+index of the bindings and memberships, the records and the serialized
+snapshot bodies when they were built. A starting worker maps it, uses the
+index in place and only reads the changes journaled since its version from
+Mongo, instead of every record of the namespace.
+
+Layout: a fixed header (magic, format, policy version, manifest size and
+the CRC-32 of everything after the header), a JSON manifest locating the
+sections, then the sections, each aligned on 8 bytes. Records are encoded
+with msgpack, or as JSON when msgpack is not installed; the manifest tells
+which.
+"""
+import fcntl
+import gc
+import json
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+from policy.engine import Records
+from policy.shared import SharedIndex
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+MAGIC = b"GIAS"
+FORMAT = 1
+# magic, format, reserved, policy version, manifest size, CRC-32 of the manifest and sections
+HEADER = struct.Struct("=4sHHQII")
+ALIGNMENT = 8
+# msgpack extension type of the datetimes of the records, validity windows
+DATETIME_EXT = 1
+# Key of the JSON object standing for a datetime, record keys never start with "$"
+DATETIME_KEY = "$datetime"
+
+INDEX_SECTION, RECORDS_SECTION, BODY_SECTION = "index", "records", "body"
+MSGPACK_FORMAT, JSON_FORMAT = "msgpack", "json"
+
+
+class SnapshotFile(NamedTuple):
+    version: int
+    index: SharedIndex
+    records: Records
+    # (media type, content encoding or None) -> body, None when the bodies were not built yet when saved
+    buffers: Optional[Dict[Tuple[str, Optional[str]], bytes]]
+    size: int
+
+
+def _pack_default(value):
+    if isinstance(value, datetime):
+        return msgpack.ExtType(DATETIME_EXT, value.isoformat().encode())
+    raise TypeError("Cannot serialize %r" % (value,))
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == DATETIME_EXT:
+        return datetime.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    raise TypeError("Cannot serialize %r" % (value,))
+
+
+def _json_object_hook(value: dict):
+    if len(value) == 1 and DATETIME_KEY in value:
+        return datetime.fromisoformat(value[DATETIME_KEY])
+    return value
+
+
+def _encode_records(records: Records) -> Tuple[str, bytes]:
+    """Format and content of the records section"""
+    if msgpack is None:
+        return JSON_FORMAT, json.dumps(records, separators=(",", ":"), default=_json_default).encode()
+    return MSGPACK_FORMAT, msgpack.packb(records, use_bin_type=True, default=_pack_default)
+
+
+def _decode_records(records_format: str, content: memoryview) -> Records:
+    if records_format == JSON_FORMAT:
+        return json.loads(bytes(content), object_hook=_json_object_hook)
+    if records_format != MSGPACK_FORMAT:
+        raise ValueError("records encoded as %s" % records_format)
+    if msgpack is None:
+        raise ValueError("records encoded with msgpack, which is not installed")
+    return msgpack.unpackb(content, raw=False, ext_hook=_ext_hook)
+
+
+def _dumps(value) -> bytes:
+    if orjson is None:
+        return json.dumps(value, separators=(",", ":")).encode()
+    return orjson.dumps(value)
+
+
+def _loads(content: bytes):
+    return json.loads(content) if orjson is None else orjson.loads(content)
+
+
+def _padding(size: int) -> bytes:
+    return bytes(-size % ALIGNMENT)
+
+
+def write_snapshot_file(path: str, namespace: str, version: int, index: bytes, records: Records,
+                        buffers: Optional[Dict[Tuple[str, Optional[str]], bytes]]) -> int:
+    """Writes a snapshot file next to path and renames it over path
+
+    Arguments:
+        path {str} -- Path of the snapshot file
+        namespace {str} -- Namespace of the snapshot
+        version {int} -- Policy version of the records
+        index {bytes} -- Shared index of the records, see policy.shared.encode
+        records {Records} -- Every record of the version
+        buffers {Optional[Dict]} -- Serialized snapshot bodies, None to leave them out
+
+    Returns:
+        int -- Size of the file
+    """
+    records_format, encoded_records = _encode_records(records)
+    sections = [({"name": INDEX_SECTION}, index),
+                ({"name": RECORDS_SECTION, "format": records_format}, encoded_records)]
+    for (media_type, encoding), body in (buffers or {}).items():
+        sections.append(({"name": BODY_SECTION, "media_type": media_type, "encoding": encoding}, body))
+
+    offset = 0
+    for section, content in sections:
+        section["offset"], section["size"] = offset, len(content)
+        offset += len(content) + len(_padding(len(content)))
+    manifest = _dumps({"namespace": namespace, "version": version,
+                             "sections": [section for section, _ in sections]})
+    manifest += _padding(HEADER.size + len(manifest))
+
+    checksum = zlib.crc32(manifest)
+    for _, content in sections:
+        checksum = zlib.crc32(content, checksum)
+        checksum = zlib.crc32(_padding(len(content)), checksum)
+
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(MAGIC, FORMAT, 0, version, len(manifest), checksum))
+            file.write(manifest)
+            for _, content in sections:
+                file.write(content)
+                file.write(_padding(len(content)))
+            size = file.tell()
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return size
+
+
+def snapshot_file_version(path: str) -> Optional[int]:
+    """Policy version in the header of a snapshot file, None when missing or of another format"""
+    try:
+        with open(path, "rb") as file:
+            magic, file_format, _, version, _, _ = HEADER.unpack(file.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return version if magic == MAGIC and file_format == FORMAT else None
+
+
+def read_snapshot_file(path: str, namespace: str) -> Optional[SnapshotFile]:
+    """Maps a snapshot file and decodes its records, the index is read in place
+
+    Arguments:
+        path {str} -- Path of the snapshot file
+        namespace {str} -- Namespace expected in the file
+
+    Raises:
+        ValueError: Raised if the file is truncated, corrupted, of another format or of another namespace
+
+    Returns:
+        Optional[SnapshotFile] -- Snapshot, None when there is no file
+    """
+    try:
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    view = memoryview(buffer)
+    try:
+        magic, file_format, _, version, manifest_size, checksum = HEADER.unpack_from(view)
+    except struct.error:
+        raise ValueError("truncated header")
+    if magic != MAGIC or file_format != FORMAT:
+        raise ValueError("not a policy snapshot file of format %d" % FORMAT)
+    if zlib.crc32(view[HEADER.size:]) != checksum:
+        raise ValueError("checksum mismatch")
+
+    start = HEADER.size + manifest_size
+    manifest = _loads(bytes(view[HEADER.size:start]).rstrip(b"\0"))
+    if manifest["namespace"] != namespace or manifest["version"] != version:
+        raise ValueError("snapshot of namespace %s version %s" % (manifest["namespace"], manifest["version"]))
+
+    index, records, buffers = None, None, {}
+    for section in manifest["sections"]:
+        content = view[start + section["offset"]:start + section["offset"] + section["size"]]
+        if section["name"] == INDEX_SECTION:
+            index = SharedIndex(content)
+        elif section["name"] == RECORDS_SECTION:
+            # A container per record and subject, collections while decoding would walk them all for nothing
+            enabled = gc.isenabled()
+            gc.disable()
+            try:
+                # Files written before the format was recorded hold msgpack
+                records = _decode_records(section.get("format", MSGPACK_FORMAT), content)
+            finally:
+                if enabled:
+                    gc.enable()
+        elif section["name"] == BODY_SECTION:
+            buffers[(section["media_type"], section["encoding"])] = bytes(content)
+    if index is None or records is None:
+        raise ValueError("missing section")
+    return SnapshotFile(version=version, index=index, records=records,
+                        buffers=buffers or None, size=len(view))
+
+
+@contextmanager
+def try_locked(path: str) -> Iterator[bool]:
+    """Exclusive lock on path while in the block, False when another process holds it"""
+    with open(path, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from db import Database
+from models.indexes import ensure_group_memberships, ensure_indexes
+from models.resource.resource_model import RESOURCE_MODEL_NAME
+from models.role.role_model import ROLE_MODEL_NAME
+from policy.snapshot import snapshot_cache
+from utils.metrics import Gauge
+
+WARM_UP__RETRY_INTERVAL = float(os.environ.get("WARM_UP__RETRY_INTERVAL", 5))
+WARM_UP__MAX_NAMESPACES = int(os.environ.get("WARM_UP__MAX_NAMESPACES", 100))
+
+WARM_UP_DURATION = Gauge(
+    "gala_iam_warm_up_duration_seconds", "Duration of the startup warm-up by phase", ("phase",))
+WARM_UP_DOCUMENTS = Gauge(
+    "gala_iam_warm_up_documents", "Documents loaded by the startup warm-up by collection", ("model",))
+WARM_UP_BYTES = Gauge(
+    "gala_iam_warm_up_bytes", "Size of the policy snapshots built by the startup warm-up")
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """Startup phase run once per process before it reports ready
+
+    Opens the Mongo pool, verifies the indexes, builds the policy snapshot
+    of the busiest namespaces (roles, resource actions, permissions and
+    groups) and reads the resources once so Mongo has them in its cache.
+    Failures are retried every WARM_UP__RETRY_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+        self.report: Dict[str, object] = {}
+        self._thread = None
+
+    def start(self, db: Database):
+        """Runs the warm-up in a background thread, the server accepts requests meanwhile"""
+        self._thread = threading.Thread(
+            target=self._run, args=(db,), name="gala-iam-warm-up", daemon=True)
+        self._thread.start()
+
+    def _run(self, db: Database):
+        while True:
+            try:
+                self.report = self.run(db)
+                self.error = None
+                self.ready.set()
+                logger.info("Warm-up done: %s", self.report)
+                return
+            except Exception as exc:
+                self.error = str(exc)
+                logger.warning("Warm-up failed, retrying in %ss: %s",
+                               WARM_UP__RETRY_INTERVAL, exc)
+                time.sleep(WARM_UP__RETRY_INTERVAL)
+
+    def run(self, db: Database) -> Dict[str, object]:
+        """Runs every phase and returns their durations and loaded volumes
+
+        Arguments:
+            db {Database} -- Database connection
+
+        Returns:
+            Dict[str, object] -- Warm-up report
+        """
+        durations = {}
+        started = phase_started = time.perf_counter()
+
+        def phase_done(phase: str):
+            nonlocal phase_started
+            now = time.perf_counter()
+            durations[phase] = round(now - phase_started, 3)
+            WARM_UP_DURATION.set(now - phase_started, phase=phase)
+            phase_started = now
+
+        db.command("ping")
+        phase_done("connect")
+
+        ensure_indexes(db)
+        ensure_group_memberships(db)
+        phase_done("indexes")
+
+        # Namespaces holding the most roles first
+        namespaces = [group["_id"] for group in db[ROLE_MODEL_NAME].aggregate([
+            {"$group": {"_id": "$metadata.namespace", "roles": {"$sum": 1}}},
+            {"$sort": {"roles": -1}},
+            {"$limit": WARM_UP__MAX_NAMESPACES}])]
+        documents: Dict[str, int] = {}
+        snapshot_bytes = 0
+        for namespace in namespaces:
+            snapshot = snapshot_cache.get(db, namespace)
+            snapshot_bytes += sum(len(buffer) for (_, encoding), buffer in snapshot.buffers.items()
+                                  if encoding is None)
+            for model_name, count in snapshot.counts.items():
+                documents[model_name] = documents.get(model_name, 0) + count
+        phase_done("policy")
+
+        # Whole documents, so that they are paged in Mongo's cache
+        documents[RESOURCE_MODEL_NAME] = sum(
+            1 for _ in db[RESOURCE_MODEL_NAME].find().batch_size(1000))
+        phase_done("resources")
+
+        for model_name, count in documents.items():
+            WARM_UP_DOCUMENTS.set(count, model=model_name)
+        WARM_UP_BYTES.set(snapshot_bytes)
+        durations["total"] = round(time.perf_counter() - started, 3)
+        return {"durations": durations, "namespaces": len(namespaces),
+                "documents": documents, "snapshot_bytes": snapshot_bytes}
+
+
+warm_up = WarmUp()
@@ -3,7 +3,8 @@ from os.path import join
 from typing import Dict, List
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import Body, Depends, Query
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from pydantic.error_wrappers import ValidationError
 from starlette.responses import JSONResponse, Response
@@ -15,9 +16,12 @@ from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
 from db import CRUD, Database
 from models import Group, GroupCreate, GroupManager, GroupPartial
 from utils import get_db, json_merge_patch
-from utils.exceptions import RecordNotFoundException
+from utils.exceptions import (RecordNotFoundException,
+                              UnsupportedExpandException,
+                              UnsupportedSortException)
+from utils.responses import ORJSONResponse, ORJSONRouter
 
-routes = APIRouter()
+routes = ORJSONRouter()
 
 
 @routes.post("/groups", response_model=Group)
@@ -40,25 +44,42 @@ def get_groups_api(response: Response,
                    skip: int = 0,
                    limit: int = 25,
                    search: str = None,
-                   sort: List[str] = Query([], alias="sort_by")):
+                   sort: List[str] = Query([], alias="sort_by"),
+                   include_total: bool = False,
+                   expand: List[str] = Query([])):
     try:
         response.status_code = HTTP_200_OK
-        groups = GroupManager.find(db, skip=skip, limit=limit,
-                                   search=search, sort=sort)
+        if expand:
+            # Embedded records do not fit the response model, rendered as they are
+            groups = response = ORJSONResponse(jsonable_encoder(GroupManager.find_expanded(
+                db, expand, skip=skip, limit=limit, search=search, sort=sort)))
+        else:
+            groups = GroupManager.find(db, skip=skip, limit=limit,
+                                       search=search, sort=sort)
+        if include_total:
+            response.headers["X-Total-Count"] = str(
+                GroupManager.count(db, search=search))
         return groups
+    except (UnsupportedSortException, UnsupportedExpandException) as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
     except Exception as exc:
         response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
         return JSONResponse(dict(error="Failed to get groups. %s" % str(exc)))
 
 
 @routes.get("/groups/{group_id}", response_model=Group)
-def get_group_api(group_id: str, response: Response, db=Depends(get_db)):
+def get_group_api(group_id: str, response: Response, db=Depends(get_db), expand: List[str] = Query([])):
     try:
+        if expand:
+            return ORJSONResponse(jsonable_encoder(
+                GroupManager.find_by_uuid_expanded(db, group_id, expand)))
         group = GroupManager.find_by_uuid(db, group_id)
         return group
     except RecordNotFoundException as exc:
         response.status_code = HTTP_404_NOT_FOUND
         return JSONResponse(dict(error=str(exc)))
+    except UnsupportedExpandException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
 
 
 @routes.put("/groups/{group_id}", response_model=Group)
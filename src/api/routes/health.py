@@ -0,0 +1,20 @@
+from starlette.responses import JSONResponse
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
+
+from policy.warmup import warm_up
+from utils.responses import ORJSONRouter
+
+routes = ORJSONRouter()
+
+
+@routes.get("/livez")
+def get_liveness_api():
+    return {"status": "alive"}
+
+
+@routes.get("/readyz")
+def get_readiness_api():
+    if warm_up.ready.is_set():
+        return {"status": "ready", "warm_up": warm_up.report}
+    return JSONResponse({"status": "warming_up", "error": warm_up.error},
+                        status_code=HTTP_503_SERVICE_UNAVAILABLE)
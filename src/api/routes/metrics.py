@@ -0,0 +1,13 @@
+from starlette.responses import PlainTextResponse
+
+from utils.metrics import registry
+from utils.responses import ORJSONRouter
+
+routes = ORJSONRouter()
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+
+@routes.get("/metrics", response_class=PlainTextResponse)
+def get_metrics_api():
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
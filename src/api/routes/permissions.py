@@ -3,7 +3,8 @@ from os.path import join
 from typing import Dict, List
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import Body, Depends, Query
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from pydantic.error_wrappers import ValidationError
 from starlette.responses import JSONResponse, Response
@@ -15,9 +16,12 @@ from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
 from db import CRUD, Database
 from models import Permission, PermissionCreate, PermissionManager, PermissionPartial
 from utils import get_db, json_merge_patch
-from utils.exceptions import RecordNotFoundException
+from utils.exceptions import (RecordNotFoundException,
+                              UnsupportedExpandException,
+                              UnsupportedSortException)
+from utils.responses import ORJSONResponse, ORJSONRouter
 
-routes = APIRouter()
+routes = ORJSONRouter()
 
 
 @routes.post("/permissions", response_model=Permission)
@@ -37,25 +41,42 @@ def get_permissions_api(response: Response,
                         skip: int = 0,
                         limit: int = 25,
                         search: str = None,
-                        sort: List[str] = Query([], alias="sort_by")):
+                        sort: List[str] = Query([], alias="sort_by"),
+                        include_total: bool = False,
+                        expand: List[str] = Query([])):
     try:
         response.status_code = HTTP_200_OK
-        permissions = PermissionManager.find(db, skip=skip, limit=limit,
-                                             search=search, sort=sort)
+        if expand:
+            # Embedded records do not fit the response model, rendered as they are
+            permissions = response = ORJSONResponse(jsonable_encoder(PermissionManager.find_expanded(
+                db, expand, skip=skip, limit=limit, search=search, sort=sort)))
+        else:
+            permissions = PermissionManager.find(db, skip=skip, limit=limit,
+                                                 search=search, sort=sort)
+        if include_total:
+            response.headers["X-Total-Count"] = str(
+                PermissionManager.count(db, search=search))
         return permissions
+    except (UnsupportedSortException, UnsupportedExpandException) as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
     except Exception as exc:
         response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
         return JSONResponse(dict(error="Failed to get permissions. %s" % str(exc)))
 
 
 @routes.get("/permissions/{permission_id}", response_model=Permission)
-def get_permission_api(permission_id: str, response: Response, db=Depends(get_db)):
+def get_permission_api(permission_id: str, response: Response, db=Depends(get_db), expand: List[str] = Query([])):
     try:
+        if expand:
+            return ORJSONResponse(jsonable_encoder(
+                PermissionManager.find_by_uuid_expanded(db, permission_id, expand)))
         permission = PermissionManager.find_by_uuid(db, permission_id)
         return permission
     except RecordNotFoundException as exc:
         response.status_code = HTTP_404_NOT_FOUND
         return JSONResponse(dict(error=str(exc)))
+    except UnsupportedExpandException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
 
 
 @routes.put("/permissions/{permission_id}", response_model=Permission)
@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timezone
+
+from fastapi import Depends, Query
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from models import RuleEffect
+from models.permission.permission_model import PermissionSubjectKind
+from models.resource.resource_model import ResourceKind
+from policy import (JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, AccessCheck,
+                    snapshot_cache)
+from policy.engine import resource_key
+from utils import get_db
+from utils.namespace import get_namespace
+from utils.responses import ORJSONRouter
+
+# Largest page of /subjects/{kind}/{name}/resources
+POLICY__RESOURCES_MAX_LIMIT = int(os.environ.get("POLICY__RESOURCES_MAX_LIMIT", 1000))
+
+routes = ORJSONRouter()
+
+
+@routes.get("/policy/snapshot")
+def get_policy_snapshot_api(request: Request, db=Depends(get_db)):
+    snapshot = snapshot_cache.get(db, get_namespace())
+    headers = {
+        "ETag": snapshot.etag,
+        "X-Policy-Version": str(snapshot.version),
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if snapshot.etag in [etag.strip() for etag in if_none_match.split(",")]:
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = MSGPACK_MEDIA_TYPE
+    if JSON_MEDIA_TYPE in request.headers.get("accept", "") or (MSGPACK_MEDIA_TYPE, None) not in snapshot.buffers:
+        media_type = JSON_MEDIA_TYPE
+    encoding = None
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        encoding = headers["Content-Encoding"] = "gzip"
+    return Response(snapshot.buffers[(media_type, encoding)],
+                    media_type=media_type, headers=headers)
+
+
+@routes.post("/policy/check")
+def check_access_api(check: AccessCheck, db=Depends(get_db)):
+    snapshot = snapshot_cache.get(db, get_namespace())
+    context = dict(check.context)
+    context.setdefault("now", datetime.now(timezone.utc))
+    grant = snapshot.policy.check((check.subject.kind, check.subject.name),
+                                  check.resource_kind, check.resource, check.action, context)
+    return {
+        "allowed": grant is not None and grant.effect == RuleEffect.ALLOW,
+        "version": snapshot.version,
+        "effect": grant.effect if grant else None,
+        "permission": grant.permission if grant else None,
+        "role": grant.role if grant else None,
+    }
+
+
+@routes.get("/subjects/{kind}/{name}/resources")
+def list_subject_resources_api(kind: PermissionSubjectKind, name: str, action: str,
+                               resource_kind: ResourceKind = None, skip: int = Query(0, ge=0),
+                               limit: int = Query(25, ge=1, le=POLICY__RESOURCES_MAX_LIMIT),
+                               db=Depends(get_db)):
+    """Resources the subject may run the action on, decided like /policy/check with the current time as context"""
+    snapshot = snapshot_cache.get(db, get_namespace())
+    policy = snapshot.policy
+    allowed = policy.allowed_resources((kind, name), action, {"now": datetime.now(timezone.utc)})
+    if resource_kind is not None:
+        allowed &= policy.resources.bitmap(resource_key(resource_kind, None))
+    return {
+        "version": snapshot.version,
+        "action": action,
+        "count": bin(allowed).count("1"),
+        "resources": [{"resource_kind": key[0], "resource": key[1]}
+                      for key in policy.resources.resources(allowed, skip, limit)],
+    }
@@ -3,7 +3,7 @@ from os.path import join
 from typing import Dict, List
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import Body, Depends, Query
 from pydantic import BaseModel
 from pydantic.error_wrappers import ValidationError
 from starlette.responses import JSONResponse, Response
@@ -15,9 +15,10 @@ from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
 from db import CRUD, Database
 from models import ResourceAction, ResourceActionCreate, ResourceActionManager, ResourceActionPartial
 from utils import get_db, json_merge_patch
-from utils.exceptions import RecordNotFoundException
+from utils.exceptions import RecordNotFoundException, UnsupportedSortException
+from utils.responses import ORJSONRouter
 
-routes = APIRouter()
+routes = ORJSONRouter()
 
 
 @routes.post("/resource_actions", response_model=ResourceAction)
@@ -37,12 +38,18 @@ def get_resource_actions_api(response: Response,
                              skip: int = 0,
                              limit: int = 25,
                              search: str = None,
-                             sort: List[str] = Query([], alias="sort_by")):
+                             sort: List[str] = Query([], alias="sort_by"),
+                             include_total: bool = False):
     try:
         response.status_code = HTTP_200_OK
         resource_actions = ResourceActionManager.find(db, skip=skip, limit=limit,
                                                       search=search, sort=sort)
+        if include_total:
+            response.headers["X-Total-Count"] = str(
+                ResourceActionManager.count(db, search=search))
         return resource_actions
+    except UnsupportedSortException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
     except Exception as exc:
         response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
         return JSONResponse(dict(error="Failed to get resource_actions. %s" % str(exc)))
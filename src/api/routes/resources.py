@@ -1,11 +1,14 @@
 import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
 from os.path import join
 from typing import Dict, List
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import Body, Depends, Query
 from pydantic import BaseModel
 from pydantic.error_wrappers import ValidationError
+from starlette.requests import Request
 from starlette.responses import JSONResponse, Response
 from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
                               HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST,
@@ -14,10 +17,15 @@ from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
 
 from db import CRUD, Database
 from models import Resource, ResourceCreate, ResourceManager, ResourcePartial
+from models.permission.permission_model import PermissionSubjectKind
+from policy import snapshot_cache
+from policy.engine import KIND_SEPARATOR, subject_key
 from utils import get_db, json_merge_patch
-from utils.exceptions import RecordNotFoundException
+from utils.exceptions import RecordNotFoundException, UnsupportedSortException
+from utils.namespace import get_namespace
+from utils.responses import NDJSONResponse, ORJSONRouter
 
-routes = APIRouter()
+routes = ORJSONRouter()
 
 
 @routes.post("/resources", response_model=Resource)
@@ -37,12 +45,18 @@ def get_resources_api(response: Response,
                       skip: int = 0,
                       limit: int = 25,
                       search: str = None,
-                      sort: List[str] = Query([], alias="sort_by")):
+                      sort: List[str] = Query([], alias="sort_by"),
+                      include_total: bool = False):
     try:
         response.status_code = HTTP_200_OK
         resources = ResourceManager.find(db, skip=skip, limit=limit,
                                          search=search, sort=sort)
+        if include_total:
+            response.headers["X-Total-Count"] = str(
+                ResourceManager.count(db, search=search))
         return resources
+    except UnsupportedSortException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
     except Exception as exc:
         response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
         return JSONResponse(dict(error="Failed to get resources. %s" % str(exc)))
@@ -95,3 +109,50 @@ def delete_resource_api(resource_id: str, response: Response, db=Depends(get_db)
     except RecordNotFoundException as exc:
         response.status_code = HTTP_404_NOT_FOUND
         return JSONResponse(dict(error=str(exc)))
+
+
+# Sorts after every character of a subject name
+_LAST_CHARACTER = chr(0x10FFFF)
+
+
+@routes.get("/resources/{resource_id}/subjects")
+def get_resource_subjects_api(resource_id: str, action: str, request: Request,
+                              kind: PermissionSubjectKind = None, after: str = None, limit: int = 1000,
+                              db=Depends(get_db)):
+    """Subjects allowed to run the action on the resource, in (kind, name) order
+
+    Pages resume after the `next` cursor of the previous one, `limit=0`
+    returns every subject. With `Accept: application/x-ndjson` subjects are
+    streamed one per line instead.
+    """
+    try:
+        resource = ResourceManager.find_by_uuid(db, resource_id)
+    except RecordNotFoundException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_404_NOT_FOUND)
+
+    snapshot = snapshot_cache.get(db, get_namespace())
+    audience = snapshot.policy.audience(resource.metadata.resource_kind, resource.metadata.name, action,
+                                        {"now": datetime.now(timezone.utc)})
+    start, end = 0, len(audience)
+    if kind is not None:
+        start = bisect_left(audience, subject_key(kind, ""))
+        end = bisect_left(audience, subject_key(kind, _LAST_CHARACTER), start)
+    if after:
+        # Cursors are "KIND:name", kinds have no colon
+        after_kind, _, after_name = after.partition(":")
+        start = max(start, bisect_right(audience, subject_key(after_kind, after_name)))
+    stop = end
+    if limit:
+        end = min(stop, start + limit)
+
+    subjects = ({"kind": key[0], "name": key[1]}
+                for key in (subject.split(KIND_SEPARATOR, 1) for subject in audience[start:end]))
+    if NDJSONResponse.media_type in request.headers.get("accept", ""):
+        return NDJSONResponse(subjects, headers={"X-Policy-Version": str(snapshot.version)})
+    subjects = list(subjects)
+    return {
+        "version": snapshot.version,
+        "action": action,
+        "subjects": subjects,
+        "next": "%s:%s" % (subjects[-1]["kind"], subjects[-1]["name"]) if subjects and end < stop else None,
+    }
@@ -3,7 +3,7 @@ from os.path import join
 from typing import Dict, List
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import Body, Depends, Query
 from pydantic import BaseModel
 from pydantic.error_wrappers import ValidationError
 from starlette.responses import JSONResponse, Response
@@ -13,11 +13,13 @@ from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
                               HTTP_500_INTERNAL_SERVER_ERROR)
 
 from db import CRUD, Database
-from models import Role, RoleCreate, RoleManager, RolePartial
+from models import (Permission, PermissionManager, Role, RoleCreate,
+                    RoleManager, RolePartial)
 from utils import get_db, json_merge_patch
-from utils.exceptions import RecordNotFoundException
+from utils.exceptions import RecordNotFoundException, UnsupportedSortException
+from utils.responses import ORJSONRouter
 
-routes = APIRouter()
+routes = ORJSONRouter()
 
 
 @routes.post("/roles", response_model=Role)
@@ -37,12 +39,18 @@ def get_roles_api(response: Response,
                   skip: int = 0,
                   limit: int = 25,
                   search: str = None,
-                  sort: List[str] = Query([], alias="sort_by")):
+                  sort: List[str] = Query([], alias="sort_by"),
+                  include_total: bool = False):
     try:
         response.status_code = HTTP_200_OK
         roles = RoleManager.find(db, skip=skip, limit=limit,
                                  search=search, sort=sort)
+        if include_total:
+            response.headers["X-Total-Count"] = str(
+                RoleManager.count(db, search=search))
         return roles
+    except UnsupportedSortException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
     except Exception as exc:
         response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
         return JSONResponse(dict(error="Failed to get roles. %s" % str(exc)))
@@ -58,6 +66,21 @@ def get_role_api(role_id: str, response: Response, db=Depends(get_db)):
         return JSONResponse(dict(error=str(exc)))
 
 
+@routes.get("/roles/{role_id}/permissions", response_model=List[Permission])
+def get_role_permissions_api(role_id: str,
+                             response: Response,
+                             db=Depends(get_db),
+                             skip: int = 0,
+                             limit: int = 25):
+    try:
+        role = RoleManager.find_by_uuid(db, role_id)
+        return PermissionManager.find_by_role(db, role.metadata.name,
+                                              skip=skip, limit=limit)
+    except RecordNotFoundException as exc:
+        response.status_code = HTTP_404_NOT_FOUND
+        return JSONResponse(dict(error=str(exc)))
+
+
 @routes.put("/roles/{role_id}", response_model=Role)
 def update_role_api(role_id: str, role: RoleCreate, response: Response, db=Depends(get_db)):
     try:
@@ -3,7 +3,7 @@ from os.path import join
 from typing import Dict, List
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import Body, Depends, Query
 from pydantic import BaseModel
 from pydantic.error_wrappers import ValidationError
 from starlette.responses import JSONResponse, Response
@@ -13,11 +13,14 @@ from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
                               HTTP_500_INTERNAL_SERVER_ERROR)
 
 from db import CRUD, Database
-from models import ServiceAccount, ServiceAccountCreate, ServiceAccountManager, ServiceAccountPartial
+from models import (Group, GroupManager, Permission, PermissionManager,
+                    ServiceAccount, ServiceAccountCreate,
+                    ServiceAccountManager, ServiceAccountPartial)
 from utils import get_db, json_merge_patch
-from utils.exceptions import RecordNotFoundException
+from utils.exceptions import RecordNotFoundException, UnsupportedSortException
+from utils.responses import ORJSONRouter
 
-routes = APIRouter()
+routes = ORJSONRouter()
 
 
 @routes.post("/service_accounts", response_model=ServiceAccount)
@@ -37,12 +40,18 @@ def get_service_accounts_api(response: Response,
                              skip: int = 0,
                              limit: int = 25,
                              search: str = None,
-                             sort: List[str] = Query([], alias="sort_by")):
+                             sort: List[str] = Query([], alias="sort_by"),
+                             include_total: bool = False):
     try:
         response.status_code = HTTP_200_OK
         service_accounts = ServiceAccountManager.find(db, skip=skip, limit=limit,
                                                       search=search, sort=sort)
+        if include_total:
+            response.headers["X-Total-Count"] = str(
+                ServiceAccountManager.count(db, search=search))
         return service_accounts
+    except UnsupportedSortException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
     except Exception as exc:
         response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
         return JSONResponse(dict(error="Failed to get service_accounts. %s" % str(exc)))
@@ -59,6 +68,42 @@ def get_service_account_api(service_account_id: str, response: Response, db=Depe
         return JSONResponse(dict(error=str(exc)))
 
 
+@routes.get("/service_accounts/{service_account_id}/groups", response_model=List[Group])
+def get_service_account_groups_api(service_account_id: str,
+                                   response: Response,
+                                   db=Depends(get_db),
+                                   skip: int = 0,
+                                   limit: int = 25,
+                                   transitive: bool = False):
+    try:
+        service_account = ServiceAccountManager.find_by_uuid(
+            db, service_account_id)
+        find_groups = GroupManager.find_ancestors if transitive else GroupManager.find_by_subject
+        return find_groups(db, "SERVICE_ACCOUNT",
+                           service_account.metadata.name,
+                           skip=skip, limit=limit)
+    except RecordNotFoundException as exc:
+        response.status_code = HTTP_404_NOT_FOUND
+        return JSONResponse(dict(error=str(exc)))
+
+
+@routes.get("/service_accounts/{service_account_id}/permissions", response_model=List[Permission])
+def get_service_account_permissions_api(service_account_id: str,
+                                        response: Response,
+                                        db=Depends(get_db),
+                                        skip: int = 0,
+                                        limit: int = 25):
+    try:
+        service_account = ServiceAccountManager.find_by_uuid(
+            db, service_account_id)
+        return PermissionManager.find_by_subject(db, "SERVICE_ACCOUNT",
+                                                 service_account.metadata.name,
+                                                 skip=skip, limit=limit)
+    except RecordNotFoundException as exc:
+        response.status_code = HTTP_404_NOT_FOUND
+        return JSONResponse(dict(error=str(exc)))
+
+
 @routes.put("/service_accounts/{service_account_id}", response_model=ServiceAccount)
 def update_service_account_api(service_account_id: str, service_account: ServiceAccountCreate, response: Response, db=Depends(get_db)):
     try:
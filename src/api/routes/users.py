@@ -3,7 +3,7 @@ from os.path import join
 from typing import Dict, List
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Depends, Query
+from fastapi import Body, Depends, Query
 from pydantic import BaseModel
 from pydantic.error_wrappers import ValidationError
 from starlette.responses import JSONResponse, Response
@@ -13,11 +13,13 @@ from starlette.status import (HTTP_200_OK, HTTP_201_CREATED,
                               HTTP_500_INTERNAL_SERVER_ERROR)
 
 from db import CRUD, Database
-from models import User, UserCreate, UserManager, UserPartial
+from models import (Group, GroupManager, Permission, PermissionManager,
+                    User, UserCreate, UserManager, UserPartial)
 from utils import get_db, json_merge_patch
-from utils.exceptions import RecordNotFoundException
+from utils.exceptions import RecordNotFoundException, UnsupportedSortException
+from utils.responses import ORJSONRouter
 
-routes = APIRouter()
+routes = ORJSONRouter()
 
 
 @routes.post("/users", response_model=User)
@@ -37,12 +39,18 @@ def get_users_api(response: Response,
                   skip: int = 0,
                   limit: int = 25,
                   search: str = None,
-                  sort: List[str] = Query([], alias="sort_by")):
+                  sort: List[str] = Query([], alias="sort_by"),
+                  include_total: bool = False):
     try:
         response.status_code = HTTP_200_OK
         users = UserManager.find(db, skip=skip, limit=limit,
                                  search=search, sort=sort)
+        if include_total:
+            response.headers["X-Total-Count"] = str(
+                UserManager.count(db, search=search))
         return users
+    except UnsupportedSortException as exc:
+        return JSONResponse(dict(error=str(exc)), status_code=HTTP_400_BAD_REQUEST)
     except Exception as exc:
         response.status_code = HTTP_500_INTERNAL_SERVER_ERROR
         return JSONResponse(dict(error="Failed to get users. %s" % str(exc)))
@@ -58,6 +66,38 @@ def get_user_api(user_id: str, response: Response, db=Depends(get_db)):
         return JSONResponse(dict(error=str(exc)))
 
 
+@routes.get("/users/{user_id}/groups", response_model=List[Group])
+def get_user_groups_api(user_id: str,
+                        response: Response,
+                        db=Depends(get_db),
+                        skip: int = 0,
+                        limit: int = 25,
+                        transitive: bool = False):
+    try:
+        user = UserManager.find_by_uuid(db, user_id)
+        find_groups = GroupManager.find_ancestors if transitive else GroupManager.find_by_subject
+        return find_groups(db, "USER", user.metadata.name,
+                           skip=skip, limit=limit)
+    except RecordNotFoundException as exc:
+        response.status_code = HTTP_404_NOT_FOUND
+        return JSONResponse(dict(error=str(exc)))
+
+
+@routes.get("/users/{user_id}/permissions", response_model=List[Permission])
+def get_user_permissions_api(user_id: str,
+                             response: Response,
+                             db=Depends(get_db),
+                             skip: int = 0,
+                             limit: int = 25):
+    try:
+        user = UserManager.find_by_uuid(db, user_id)
+        return PermissionManager.find_by_subject(db, "USER", user.metadata.name,
+                                                 skip=skip, limit=limit)
+    except RecordNotFoundException as exc:
+        response.status_code = HTTP_404_NOT_FOUND
+        return JSONResponse(dict(error=str(exc)))
+
+
 @routes.put("/users/{user_id}", response_model=User)
 def update_user_api(user_id: str, user: UserCreate, response: Response, db=Depends(get_db)):
     try:
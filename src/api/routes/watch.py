@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+from fastapi import Depends, Query
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.status import HTTP_410_GONE
+
+from db import Database
+from db.journal import (DELETE, JournalTruncatedException, latest_sequence,
+                        read_changes)
+from utils import get_db
+from utils.cache import TTLCache
+from utils.namespace import get_namespace
+from utils.responses import ORJSONRouter
+
+WATCH__POLL_INTERVAL = float(os.environ.get("WATCH__POLL_INTERVAL", 0.5))
+WATCH__MAX_TIMEOUT = float(os.environ.get("WATCH__MAX_TIMEOUT", 60))
+
+routes = ORJSONRouter()
+
+# Shared by every waiting request, the sequence is read at most once per interval per process
+latest_sequence_cache = TTLCache(ttl=WATCH__POLL_INTERVAL)
+
+
+def _with_records(db: Database, changes: List[dict]) -> List[dict]:
+    """Attaches the current document of upserted records, one query per kind"""
+    uuids: Dict[str, List[str]] = {}
+    for change in changes:
+        if change["op"] != DELETE:
+            uuids.setdefault(change["kind"], []).append(change["uuid"])
+    records = {}
+    for kind, kind_uuids in uuids.items():
+        for record in db[kind].find({"uuid": {"$in": kind_uuids}}, projection={"_id": False}):
+            records[(kind, record["uuid"])] = record
+
+    return [{"seq": change["seq"], "kind": change["kind"], "uuid": change["uuid"], "op": change["op"],
+             "record": records.get((change["kind"], change["uuid"]))}
+            for change in changes]
+
+
+@routes.get("/watch")
+async def watch_api(db=Depends(get_db),
+                    since: int = Query(0, ge=0),
+                    kinds: str = None,
+                    limit: int = Query(1000, ge=1, le=10000),
+                    timeout: float = Query(30, ge=0)):
+    """Changes of the namespace after `since`, waiting up to `timeout` seconds for the first one
+
+    Upserts carry the current record, which may already include later
+    changes; deletes are tombstones without record. Resume with the returned
+    `since`. Responds 410 when the journal no longer reaches back to `since`,
+    the consumer then reloads /policy/snapshot and watches from its version.
+    """
+    namespace = get_namespace()
+    kind_set = set(kinds.split(",")) if kinds else None
+    deadline = time.monotonic() + min(timeout, WATCH__MAX_TIMEOUT)
+    while True:
+        try:
+            changes, cursor = await run_in_threadpool(read_changes, db, since, namespace, kind_set, limit)
+        except JournalTruncatedException as exc:
+            return JSONResponse({"error": str(exc), "oldest": exc.oldest}, status_code=HTTP_410_GONE)
+        if changes or time.monotonic() >= deadline:
+            break
+        since = cursor
+        # Scanned entries of other namespaces or kinds still move the cursor
+        while time.monotonic() < deadline:
+            await asyncio.sleep(WATCH__POLL_INTERVAL)
+            latest = await run_in_threadpool(
+                latest_sequence_cache.get_or_set, "latest", lambda: latest_sequence(db))
+            if latest > since:
+                break
+
+    records = await run_in_threadpool(_with_records, db, changes)
+    return {"since": cursor, "changes": records}
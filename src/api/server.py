@@ -1,32 +1,89 @@
-import os
+import logging
 
 from fastapi import Depends, FastAPI
-from pymongo import MongoClient
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import PlainTextResponse
 
 from db import Database
-from routes import permissions, roles, service_accounts, groups, users, resources, resource_actions
-from utils import get_db
+from policy.warmup import warm_up
+from routes import permissions, roles, service_accounts, groups, users, resources, resource_actions, policy, watch, metrics, health
+from utils import DB_NAME, close_client, get_client
+from utils.admission import AdmissionMiddleware
+from utils.namespace import NamespaceMiddleware
+from utils.profiling import (StackSampler, acquire_profiling_session,
+                             profiling_requested, release_profiling_session,
+                             write_profile)
+from utils.responses import GZIP__MINIMUM_SIZE, GZipMiddleware
 
-MONGO_DB__HOST_URI = os.environ.get("MONGO_DB__HOST_URI", "localhost")
-MONGO_DB__HOST_PORT = int(os.environ.get("MONGO_DB__HOST_PORT", 27017))
-db_connection = MongoClient(host=MONGO_DB__HOST_URI, port=MONGO_DB__HOST_PORT)
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="GALA Identity and Access Management API",
               description="Authentication and Authorization Management module for GALA resources",
               openapi_url="/gala_iam_api__openapi.json")
 
 
+@app.on_event("startup")
+def start_warm_up():
+    # Indexes, pool and caches are warmed in the background, /readyz reports when done
+    warm_up.start(get_client()[DB_NAME])
+
+
+@app.on_event("shutdown")
+def close_connection():
+    close_client()
+
+
+# Innermost so it sees whole response bodies and can honor minimum_size,
+# the http middlewares below stream whatever they wrap
+app.add_middleware(GZipMiddleware, minimum_size=GZIP__MINIMUM_SIZE)
+app.add_middleware(NamespaceMiddleware)
+
+
 @app.middleware("http")
 async def db_session_middleware(request: Request, call_next):
-    response = Response("Internal server error", status_code=500)
+    # The client and its connection pool are shared by the requests of the process
+    request.state.db = Database(get_client())
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def profiling_middleware(request: Request, call_next):
+    mode = profiling_requested(request.headers)
+    if mode is None or not acquire_profiling_session():
+        return await call_next(request)
+
+    sampler = StackSampler()
     try:
-        request.state.db = Database(db_connection)
-        response = await call_next(request)
+        sampler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            sampler.stop()
+
+        headers = {
+            "X-Gala-Profile-Duration": "%.1f" % (sampler.duration * 1000),
+            "X-Gala-Profile-Samples": str(sampler.samples),
+        }
+        if mode == "inline":
+            headers["X-Gala-Profile-Status"] = str(response.status_code)
+            return PlainTextResponse(sampler.folded(), headers=headers)
+
+        try:
+            headers["X-Gala-Profile-File"] = await run_in_threadpool(
+                write_profile, sampler, request.method, request.url.path)
+        except OSError as exc:
+            # The request was served, a profile that cannot be written must not fail it
+            logger.warning("Failed to write the profile of %s %s: %s",
+                           request.method, request.url.path, exc)
+        response.headers.update(headers)
+        return response
     finally:
-        request.state.db.close()
-    return response
+        release_profiling_session()
+
+
+# Outermost, shed requests cost neither a session nor a thread
+app.add_middleware(AdmissionMiddleware)
 
 app.include_router(roles.routes, tags=["CRUD on Roles"])
 app.include_router(resources.routes, tags=["CRUD on Resources"])
@@ -36,6 +93,10 @@ app.include_router(permissions.routes, tags=["CRUD on Permissions"])
 app.include_router(users.routes, tags=["CRUD on Users"])
 app.include_router(service_accounts.routes, tags=["CRUD on Service Accounts"])
 app.include_router(groups.routes, tags=["CRUD on Groups"])
+app.include_router(policy.routes, tags=["Policy"])
+app.include_router(watch.routes, tags=["Watch"])
+app.include_router(metrics.routes, tags=["Metrics"])
+app.include_router(health.routes, tags=["Health"])
 
 if __name__ == "__main__":
     import uvicorn
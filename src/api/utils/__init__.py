@@ -1,3 +1,3 @@
 from .json_merge_patch import json_merge_patch
-from .db import get_db
-from .exceptions import RecordNotFoundException
+from .db import DB_NAME, MONGO_DB__HOST_PORT, MONGO_DB__HOST_URI, close_client, get_client, get_db
+from .exceptions import RecordNotFoundException, UnsupportedExpandException, UnsupportedSortException
@@ -0,0 +1,126 @@
+import asyncio
+import os
+from collections import deque
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
+
+from utils.metrics import Counter, Gauge
+from utils.namespace import resolve_namespace
+
+ADMISSION__READ_LIMIT = int(os.environ.get("ADMISSION__READ_LIMIT", 24))
+ADMISSION__READ_QUEUE_SIZE = int(os.environ.get("ADMISSION__READ_QUEUE_SIZE", 48))
+ADMISSION__WRITE_LIMIT = int(os.environ.get("ADMISSION__WRITE_LIMIT", 8))
+ADMISSION__WRITE_QUEUE_SIZE = int(os.environ.get("ADMISSION__WRITE_QUEUE_SIZE", 16))
+ADMISSION__QUEUE_TIMEOUT = float(os.environ.get("ADMISSION__QUEUE_TIMEOUT", 0.5))
+ADMISSION__RETRY_AFTER = int(os.environ.get("ADMISSION__RETRY_AFTER", 1))
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# Long polls mostly sleep, and probes and scrapes must answer under overload
+EXEMPT_PATHS = ("/watch", "/metrics", "/livez", "/readyz")
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "gala_iam_admission_in_flight", "Requests being served by budget", ("budget",))
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "gala_iam_admission_queue_depth", "Requests waiting for a slot by budget", ("budget",))
+ADMISSION_ADMITTED = Counter(
+    "gala_iam_admission_admitted_total", "Admitted requests by budget, queued or not", ("budget", "queued"))
+ADMISSION_SHED = Counter(
+    "gala_iam_admission_shed_total", "Requests answered 503 by budget, reason is queue_full or timeout", ("budget", "reason"))
+
+
+class AdmissionBudget:
+    """Bounds the requests served concurrently, the next ones wait in a bounded FIFO queue
+
+    Waiting is capped by `queue_timeout` so admitted requests never queued
+    longer than that; past it, or with a full queue, requests are shed. The
+    budget is only used from the event loop and needs no locking.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float = ADMISSION__QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.active, budget=name)
+        ADMISSION_QUEUE_DEPTH.set_function(lambda: len(self._waiters), budget=name)
+
+    async def acquire(self) -> bool:
+        """Waits for a slot, False when the request is to be shed"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            ADMISSION_ADMITTED.inc(budget=self.name, queued="false")
+            return True
+        if len(self._waiters) >= self.queue_size:
+            ADMISSION_SHED.inc(budget=self.name, reason="queue_full")
+            return False
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot over by resolving the waiter, active is unchanged
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_SHED.inc(budget=self.name, reason="timeout")
+            return False
+        except asyncio.CancelledError:
+            # Client gone, give back the slot if it was handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        ADMISSION_ADMITTED.inc(budget=self.name, queued="true")
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionMiddleware:
+    """Sheds load before it reaches the threadpool and Mongo
+
+    Reads and writes have separate budgets so a burst of one cannot starve
+    the other. Shed requests get an immediate 503 with Retry-After.
+    """
+
+    def __init__(self, app, read_budget: AdmissionBudget = None, write_budget: AdmissionBudget = None):
+        self.app = app
+        self.read_budget = read_budget or AdmissionBudget(
+            "read", ADMISSION__READ_LIMIT, ADMISSION__READ_QUEUE_SIZE)
+        self.write_budget = write_budget or AdmissionBudget(
+            "write", ADMISSION__WRITE_LIMIT, ADMISSION__WRITE_QUEUE_SIZE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _, path = resolve_namespace(scope["path"], Headers(scope=scope))
+        if path.rstrip("/") in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.read_budget if scope["method"] in READ_METHODS else self.write_budget
+        if not await budget.acquire():
+            response = JSONResponse(dict(error="Server overloaded, retry later"),
+                                    status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                                    headers={"Retry-After": str(ADMISSION__RETRY_AFTER)})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release()
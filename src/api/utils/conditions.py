@@ -0,0 +1,207 @@
+import ast
+import operator
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+from ipaddress import ip_address, ip_network
+from typing import Any, Callable, Optional, Tuple
+
+POLICY__CONDITION_MAX_LENGTH = int(
+    os.environ.get("POLICY__CONDITION_MAX_LENGTH", 1000))
+POLICY__CONDITION_CACHE_SIZE = int(
+    os.environ.get("POLICY__CONDITION_CACHE_SIZE", 4096))
+
+# Compiled condition, called with the context of a check
+Condition = Callable[[dict], Any]
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+}
+
+
+class ConditionError(ValueError):
+    pass
+
+
+class UndecidedError(ValueError):
+    """Raised when a condition reads a value missing from the context, which leaves it undecided"""
+
+
+def parse_datetime(value) -> datetime:
+    """ISO 8601 date and time, in UTC unless it has an offset"""
+    if not isinstance(value, (str, datetime)):
+        raise TypeError("expected an ISO 8601 string, got %s" % type(value).__name__)
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(
+            value[:-1] + "+00:00" if value.endswith("Z") else value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+# Functions of the language, only called on literals: they run once, when the condition is compiled
+_FUNCTIONS = {
+    "cidr": lambda value: ip_network(value, strict=False),
+    "datetime": parse_datetime,
+}
+
+
+def _constant(node: ast.AST) -> Tuple[bool, Any]:
+    """(True, value) for literals and calls on literals, (False, None) for expressions depending on the context"""
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS \
+                or node.keywords or len(node.args) != 1:
+            raise ConditionError("only %s calls with one argument are supported" % ", ".join(_FUNCTIONS))
+        found, argument = _constant(node.args[0])
+        if not found:
+            raise ConditionError("%s() only accepts a literal" % node.func.id)
+        try:
+            return True, _FUNCTIONS[node.func.id](argument)
+        except (TypeError, ValueError) as exc:
+            raise ConditionError("%s(%r): %s" % (node.func.id, argument, exc))
+    if isinstance(node, (ast.List, ast.Tuple)):
+        elements = [_constant(element) for element in node.elts]
+        if all(found for found, _ in elements):
+            return True, [value for _, value in elements]
+        return False, None
+    if isinstance(node, (ast.Name, ast.Attribute, ast.Compare, ast.BoolOp, ast.UnaryOp)) \
+            and not isinstance(getattr(node, "op", None), ast.USub):
+        return False, None
+    try:
+        return True, ast.literal_eval(node)
+    except ValueError:
+        return False, None
+
+
+def _as_datetime(get_value: Condition) -> Condition:
+    return lambda context: parse_datetime(get_value(context))
+
+
+def _compile_comparison(left: ast.AST, op: ast.cmpop, right: ast.AST) -> Condition:
+    left_found, left_value = _constant(left)
+    right_found, right_value = _constant(right)
+    get_left, get_right = _compile(left), _compile(right)
+
+    if isinstance(op, (ast.In, ast.NotIn)) and right_found:
+        networks = right_value if isinstance(right_value, list) else [right_value]
+        if networks and all(hasattr(network, "network_address") for network in networks):
+            inside = isinstance(op, ast.In)
+
+            def in_networks(context):
+                address = ip_address(get_left(context))
+                return any(address in network for network in networks) == inside
+            return in_networks
+
+    # Context values are JSON, dates and times arrive as strings
+    if right_found and isinstance(right_value, datetime):
+        get_left = _as_datetime(get_left)
+    elif left_found and isinstance(left_value, datetime):
+        get_right = _as_datetime(get_right)
+
+    compare = _COMPARISONS[type(op)]
+    return lambda context: compare(get_left(context), get_right(context))
+
+
+def _compile(node: ast.AST) -> Condition:
+    found, value = _constant(node)
+    if found:
+        return lambda context: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+
+        def variable(context):
+            if name not in context:
+                raise UndecidedError(name)
+            return context[name]
+        return variable
+
+    if isinstance(node, ast.Attribute):
+        # Attributes read keys of the context, never attributes of Python objects
+        get_parent, name = _compile(node.value), node.attr
+
+        def attribute(context):
+            parent = get_parent(context)
+            if not isinstance(parent, dict) or name not in parent:
+                raise UndecidedError(name)
+            return parent[name]
+        return attribute
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile(operand) for operand in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda context: all(operand(context) for operand in operands)
+        return lambda context: any(operand(context) for operand in operands)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile(node.operand)
+        return lambda context: not operand(context)
+
+    if isinstance(node, ast.Compare):
+        if any(type(op) not in _COMPARISONS for op in node.ops):
+            raise ConditionError("unsupported comparison")
+        operands = [node.left] + node.comparators
+        comparisons = [_compile_comparison(left, op, right)
+                       for left, op, right in zip(operands, node.ops, operands[1:])]
+        if len(comparisons) == 1:
+            return comparisons[0]
+        return lambda context: all(comparison(context) for comparison in comparisons)
+
+    raise ConditionError("unsupported expression [%s]" % type(node).__name__)
+
+
+@lru_cache(maxsize=POLICY__CONDITION_CACHE_SIZE)
+def compile_condition(source: str) -> Condition:
+    """Compiles a rule condition into a closure over the context of a check
+
+    Conditions are Python expressions restricted to literals, context
+    values (`request.ip`, `now`), comparisons, `and`, `or`, `not`, and the
+    `cidr()` and `datetime()` functions applied to literals. Dotted names
+    read keys of the context and nothing else, so a condition cannot reach
+    the interpreter. Compiled conditions are cached by source: the rules of
+    a role revision are compiled once, and a check costs a few calls.
+
+    Arguments:
+        source {str} -- Condition, eg. `request.ip in cidr("10.0.0.0/8") and now < datetime("2026-06-01")`
+
+    Raises:
+        ConditionError: Raised if the condition is not part of the language
+
+    Returns:
+        Condition -- Closure evaluating the condition against a context
+    """
+    if len(source) > POLICY__CONDITION_MAX_LENGTH:
+        raise ConditionError("longer than %d characters" % POLICY__CONDITION_MAX_LENGTH)
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise ConditionError("invalid syntax at column %s" % exc.offset)
+    except (RecursionError, MemoryError):
+        raise ConditionError("too deeply nested")
+    return _compile(tree.body)
+
+
+def check_condition(source: str) -> Optional[str]:
+    """Error message for conditions outside of the language, None when valid"""
+    try:
+        compile_condition(source)
+    except ConditionError as exc:
+        return "Condition [%s] is invalid: %s" % (source, exc)
+    return None
+
+
+def evaluate(condition: Condition, context: dict) -> Optional[bool]:
+    """Result of a condition, None when missing or mistyped context values leave it undecided
+
+    A missing value never defaults to None: `request.country != "RU"` or
+    `not request.blocked` would otherwise hold for an empty context.
+    """
+    try:
+        return bool(condition(context))
+    except (TypeError, ValueError):
+        return None
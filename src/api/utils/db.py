@@ -1,7 +1,39 @@
 import os
+from typing import Optional
+
+from pymongo import MongoClient
 from starlette.requests import Request
 
+MONGO_DB__HOST_URI = os.environ.get("MONGO_DB__HOST_URI", "localhost")
+MONGO_DB__HOST_PORT = int(os.environ.get("MONGO_DB__HOST_PORT", 27017))
+DB_NAME = os.environ.get("DB_NAME", "GALA_IAM_DB")
+MONGO_DB__MIN_POOL_SIZE = int(os.environ.get("MONGO_DB__MIN_POOL_SIZE", 10))
+
+_client: Optional[MongoClient] = None
+_client_pid: Optional[int] = None
+
+
+def get_client() -> MongoClient:
+    """MongoClient of the current process, created on first use
+
+    MongoClient is not fork safe: a client created before the server forks
+    its workers, eg. with a preloaded app, is replaced in each worker by one
+    owning its own sockets and monitor threads.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = MongoClient(host=MONGO_DB__HOST_URI, port=MONGO_DB__HOST_PORT,
+                              minPoolSize=MONGO_DB__MIN_POOL_SIZE, connect=False)
+        _client_pid = os.getpid()
+    return _client
+
+
+def close_client():
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        _client.close()
+    _client = _client_pid = None
+
 
 def get_db(request: Request):
-    db_name = os.environ.get("DB_NAME", "GALA_IAM_DB")
-    return request.state.db.connection[db_name]
+    return request.state.db.connection[DB_NAME]
@@ -9,3 +9,25 @@ class RecordNotFoundException(Exception):
 
     def __str__(self):
         return f"Record: {self.record_id} for Model '{self.model_name}' not found"
+
+
+class UnsupportedSortException(Exception):
+    def __init__(self, model_name, fields, sortable_fields, *args, **kwargs):
+        super(UnsupportedSortException, self).__init__(*args, **kwargs)
+        self.model_name = model_name
+        self.fields = fields
+        self.sortable_fields = sortable_fields
+
+    def __str__(self):
+        return f"Cannot sort {self.model_name} by {self.fields}, sort by one of {self.sortable_fields}, prefixed with '-' for descending order"
+
+
+class UnsupportedExpandException(Exception):
+    def __init__(self, model_name, references, expandable, *args, **kwargs):
+        super(UnsupportedExpandException, self).__init__(*args, **kwargs)
+        self.model_name = model_name
+        self.references = references
+        self.expandable = expandable
+
+    def __str__(self):
+        return f"Cannot expand {self.references} of {self.model_name}, expand one or more of {self.expandable}"
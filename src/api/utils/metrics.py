@@ -0,0 +1,88 @@
+import threading
+from typing import Callable, Dict, List, Tuple
+
+
+class Metric:
+    """Process wide metric rendered in the Prometheus text exposition format
+
+    Samples are kept per tuple of label values, in the order of `labelnames`.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self) -> str:
+        lines = ["# HELP %s %s" % (self.name, self.documentation),
+                 "# TYPE %s %s" % (self.name, self.type)]
+        for key, value in self.samples():
+            labels = ",".join('%s="%s"' % (name, label)
+                              for name, label in zip(self.labelnames, key))
+            lines.append("%s%s %s" % (self.name, "{%s}" % labels if labels else "", repr(float(value))))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """Reads the value from function whenever the gauge is rendered"""
+        self._functions[self._key(labels)] = function
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        values = dict(super().samples())
+        values.update({key: function()
+                       for key, function in self._functions.items()})
+        return sorted(values.items())
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        assert metric.name not in self._metrics, "Metric %s already registered" % metric.name
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,69 @@
+import re
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.status import HTTP_400_BAD_REQUEST
+
+DEFAULT_NAMESPACE = "default"
+NAMESPACE_HEADER = "x-gala-namespace"
+NAMESPACE_PATH_PREFIX = "/namespaces/"
+NAMESPACE_PATTERN = re.compile(r"^[a-z0-9]([-a-z0-9]{0,61}[a-z0-9])?$")
+
+current_namespace: ContextVar[str] = ContextVar(
+    "current_namespace", default=DEFAULT_NAMESPACE)
+
+
+def get_namespace() -> str:
+    """Namespace of the request being served, DEFAULT_NAMESPACE outside of requests"""
+    return current_namespace.get()
+
+
+def resolve_namespace(path: str, headers) -> Tuple[Optional[str], str]:
+    """Extracts the namespace of a request from its /namespaces/{namespace}/... prefix or X-Gala-Namespace header
+
+    Arguments:
+        path {str} -- Request path
+        headers {Headers} -- Request headers
+
+    Returns:
+        Tuple[Optional[str], str] -- Namespace, None when invalid, and the path without the namespace prefix
+    """
+    namespace = headers.get(NAMESPACE_HEADER) or DEFAULT_NAMESPACE
+    if path.startswith(NAMESPACE_PATH_PREFIX):
+        namespace, _, path = path[len(NAMESPACE_PATH_PREFIX):].partition("/")
+        path = "/" + path
+    if not NAMESPACE_PATTERN.match(namespace):
+        return None, path
+    return namespace, path
+
+
+class NamespaceMiddleware:
+    """Serves each request in the namespace of its prefix or header
+
+    /namespaces/{namespace}/roles is routed as /roles, and the namespace is
+    available through get_namespace() to everything serving the request,
+    route handlers running in the threadpool included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        namespace, path = resolve_namespace(scope["path"], Headers(scope=scope))
+        if namespace is None:
+            response = JSONResponse(dict(error="Invalid namespace"),
+                                    status_code=HTTP_400_BAD_REQUEST)
+            await response(scope, receive, send)
+            return
+
+        token = current_namespace.set(namespace)
+        try:
+            await self.app(dict(scope, path=path), receive, send)
+        finally:
+            current_namespace.reset(token)
@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Optional, Set
+
+WILDCARD = "*"
+
+
+def is_pattern(value: Optional[str]) -> bool:
+    """Whether a rule value is a prefix pattern, eg. "event-2026-*" or "*", rather than an exact name"""
+    return value is not None and value.endswith(WILDCARD)
+
+
+def check_pattern(value: str) -> Optional[str]:
+    """Error message for values with a wildcard elsewhere than at their end, None when valid"""
+    if WILDCARD in value.rstrip(WILDCARD) or value.endswith(WILDCARD * 2):
+        return "Pattern [%s] may only end with a single '%s'" % (value, WILDCARD)
+    return None
+
+
+class _Node:
+    __slots__ = ("children", "exact", "prefix")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.exact: List[Any] = []
+        self.prefix: List[Any] = []
+
+    def copy(self) -> "_Node":
+        node = _Node()
+        node.children = dict(self.children)
+        node.exact = list(self.exact)
+        node.prefix = list(self.prefix)
+        return node
+
+
+class PatternTrie:
+    """Maps exact keys and prefix patterns to values
+
+    A key is matched against every pattern in a single walk down the trie,
+    collecting the values of the patterns ending on its path: the cost is
+    O(len(key)) whatever the number of patterns.
+
+    copy() returns a trie sharing every node with the original; changes to
+    the copy duplicate the nodes on the changed paths only, so readers of
+    the original are never affected. The original must not be changed once
+    copied.
+    """
+
+    __slots__ = ("_root", "_owned", "size")
+
+    def __init__(self):
+        self._root = _Node()
+        # Nodes created by this trie, changed in place; the others are shared
+        self._owned: Set[int] = {id(self._root)}
+        self.size = 0
+
+    def copy(self) -> "PatternTrie":
+        trie = PatternTrie()
+        trie._root = self._root.copy()
+        trie._owned = {id(trie._root)}
+        trie.size = self.size
+        self._owned = set()
+        return trie
+
+    def _owned_child(self, node: _Node, char: str) -> _Node:
+        child = node.children.get(char)
+        if child is None:
+            child = _Node()
+        elif id(child) not in self._owned:
+            child = child.copy()
+        else:
+            return child
+        node.children[char] = child
+        self._owned.add(id(child))
+        return child
+
+    def _path(self, pattern: str) -> _Node:
+        node = self._root
+        for char in pattern[:-1] if is_pattern(pattern) else pattern:
+            node = self._owned_child(node, char)
+        return node
+
+    def add(self, pattern: str, value: Any):
+        node = self._path(pattern)
+        (node.prefix if is_pattern(pattern) else node.exact).append(value)
+        self.size += 1
+
+    def remove(self, pattern: str, value: Any):
+        """Removes one value added under pattern, emptied nodes are left in place"""
+        node = self._path(pattern)
+        values = node.prefix if is_pattern(pattern) else node.exact
+        if value in values:
+            values.remove(value)
+            self.size -= 1
+
+    def match(self, key: str) -> List[Any]:
+        """Values of the exact key and of every pattern prefixing it"""
+        node = self._root
+        values = list(node.prefix)
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return values
+            values.extend(node.prefix)
+        values.extend(node.exact)
+        return values
+
+    def __len__(self) -> int:
+        return self.size
@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+PROFILING__ADMIN_TOKEN = os.environ.get("PROFILING__ADMIN_TOKEN")
+PROFILING__SAMPLE_RATE = float(os.environ.get("PROFILING__SAMPLE_RATE", 0))
+PROFILING__OUTPUT_DIR = os.environ.get(
+    "PROFILING__OUTPUT_DIR", "/tmp/gala-iam-profiles")
+PROFILING__INTERVAL = float(os.environ.get("PROFILING__INTERVAL", 0.005))
+
+PROFILE_HEADER = "x-gala-profile"
+PROFILE_INLINE_HEADER = "x-gala-profile-inline"
+
+# Characters of the request path kept in profile file names, and their maximum length
+_UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9_-]+")
+PROFILE_SLUG_LENGTH = 64
+
+# Leaf frames in these modules are threads parked on a lock, queue or selector
+_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+_session_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples the stacks of every thread of the process at a fixed interval
+
+    Route handlers run in the threadpool, away from the event loop that runs
+    the middleware, so the sampler walks all threads instead of profiling the
+    current one. Stacks are aggregated in the folded format understood by
+    flamegraph.pl and speedscope ("outer;inner;leaf count").
+    """
+
+    def __init__(self, interval: float = PROFILING__INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name="gala-iam-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                    continue
+                self.stacks[self._fold(frame)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append("%s (%s:%d)" % (code.co_name, os.path.basename(
+                code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def folded(self) -> str:
+        return "\n".join("%s %d" % (stack, count)
+                         for stack, count in self.stacks.most_common())
+
+
+def profiling_requested(headers) -> Optional[str]:
+    """Decides whether a request is to be profiled
+
+    Arguments:
+        headers {Headers} -- Incoming request headers
+
+    Returns:
+        Optional[str] -- "inline" or "file" when the request is to be profiled, None otherwise
+    """
+    token = headers.get(PROFILE_HEADER)
+    if token and PROFILING__ADMIN_TOKEN and hmac.compare_digest(token, PROFILING__ADMIN_TOKEN):
+        if headers.get(PROFILE_INLINE_HEADER, "").lower() in ("1", "true", "yes"):
+            return "inline"
+        return "file"
+    if PROFILING__SAMPLE_RATE and random.random() < PROFILING__SAMPLE_RATE:
+        return "file"
+    return None
+
+
+def acquire_profiling_session() -> bool:
+    """Only one request is profiled at a time, the sampler sees the whole process"""
+    return _session_lock.acquire(blocking=False)
+
+
+def release_profiling_session():
+    _session_lock.release()
+
+
+def write_profile(sampler: StackSampler, method: str, path: str) -> str:
+    """Writes the folded stacks of a profiled request to PROFILING__OUTPUT_DIR
+
+    The file name keeps the safe characters of the path, truncated, and a
+    digest of the whole path: paths come from clients and may be long or
+    hold any decoded character.
+
+    Raises:
+        OSError: Raised if the profile cannot be written
+
+    Returns:
+        str -- Path of the written profile
+    """
+    os.makedirs(PROFILING__OUTPUT_DIR, exist_ok=True)
+    slug = _UNSAFE_CHARACTERS.sub("_", path.strip("/"))[:PROFILE_SLUG_LENGTH] or "root"
+    digest = hashlib.sha1(path.encode("utf-8", "surrogatepass")).hexdigest()[:8]
+    file_name = "%d-%s-%s-%s.folded" % (time.time() * 1000, _UNSAFE_CHARACTERS.sub("_", method)[:16],
+                                        slug, digest)
+    file_path = os.path.join(PROFILING__OUTPUT_DIR, file_name)
+    with open(file_path, "w") as profile_file:
+        profile_file.write(sampler.folded())
+        profile_file.write("\n")
+    return file_path
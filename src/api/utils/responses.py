@@ -0,0 +1,72 @@
+import json
+import os
+import typing
+
+from fastapi import APIRouter
+from starlette.datastructures import Headers
+from starlette.middleware import gzip
+from starlette.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+GZIP__MINIMUM_SIZE = int(os.environ.get("GZIP__MINIMUM_SIZE", 1024))
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, falling back to the stdlib encoder when orjson is not installed"""
+
+    def render(self, content: typing.Any) -> bytes:
+        if orjson is None:
+            return super(ORJSONResponse, self).render(content)
+        return orjson.dumps(content)
+
+
+class NDJSONResponse(StreamingResponse):
+    """Streams an iterable of objects as newline delimited JSON, one object per line, as they are produced"""
+    media_type = "application/x-ndjson"
+
+    def __init__(self, content: typing.Iterable[typing.Any], **kwargs) -> None:
+        super(NDJSONResponse, self).__init__(self._lines(content), **kwargs)
+
+    @staticmethod
+    def _lines(content: typing.Iterable[typing.Any]) -> typing.Iterator[bytes]:
+        for item in content:
+            if orjson is None:
+                yield json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            else:
+                yield orjson.dumps(item) + b"\n"
+
+
+class ORJSONRouter(APIRouter):
+    """APIRouter whose routes render with ORJSONResponse unless another response_class is given"""
+
+    def add_api_route(self, path: str, endpoint: typing.Callable, **kwargs) -> None:
+        if kwargs.get("response_class", JSONResponse) is JSONResponse:
+            kwargs["response_class"] = ORJSONResponse
+        super(ORJSONRouter, self).add_api_route(path, endpoint, **kwargs)
+
+
+class GZipMiddleware(gzip.GZipMiddleware):
+    """GZipMiddleware leaving responses that are already encoded, eg. precompressed buffers, untouched"""
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = GZipResponder(self.app, self.minimum_size)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class GZipResponder(gzip.GZipResponder):
+    passthrough = False
+
+    async def send_with_gzip(self, message) -> None:
+        if message["type"] == "http.response.start" and "content-encoding" in Headers(raw=message["headers"]):
+            self.passthrough = True
+        if self.passthrough:
+            await self.send(message)
+            return
+        await super(GZipResponder, self).send_with_gzip(message)
@@ -0,0 +1,73 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from utils.metrics import Counter
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "gala_iam_single_flight_calls_total",
+    "Coalesced calls by group, role is leader for calls that ran and follower for calls that shared their result",
+    ("group", "role"))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs concurrent calls sharing a key once, every caller gets the result of the same run
+
+    Only calls overlapping in time are coalesced, nothing is cached once the
+    run completed. invalidate() makes later callers start a new run instead of
+    joining one that may have started before a write.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: Dict[Hashable, _Call] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Returns compute(), or the result of the in-flight run of the same key
+
+        Arguments:
+            key {Hashable} -- Identity of the call
+            compute {Callable[[], Any]} -- Function whose result is shared, it must not be mutated by callers
+
+        Returns:
+            Any -- Result of compute, its exception is raised to every caller
+        """
+        with self._lock:
+            key = (self._generation, key)
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLE_FLIGHT_CALLS.inc(group=self.group, role="follower")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLE_FLIGHT_CALLS.inc(group=self.group, role="leader")
+        try:
+            call.result = compute()
+            return call.result
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
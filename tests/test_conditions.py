@@ -0,0 +1,73 @@
+import pytest
+
+from models.group.group_model import GROUP_MODEL_NAME
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.resource.resource_model import RESOURCE_MODEL_NAME
+from models.resource_action.resource_action_model import RESOURCE_ACTION_MODEL_NAME
+from models.role.role_model import ROLE_MODEL_NAME
+from policy import CompiledPolicy
+from utils.conditions import compile_condition, evaluate, parse_datetime
+
+
+@pytest.mark.parametrize("value", [None, 5, ["2026-06-01"], {"time": "2026-06-01"}])
+def test_parse_datetime_rejects_non_strings(value):
+    with pytest.raises(TypeError):
+        parse_datetime(value)
+
+
+@pytest.mark.parametrize("context", [{}, {"request": {}}, {"request": {"time": None}}, {"request": {"time": 5}}])
+def test_datetime_comparison_with_missing_or_mistyped_value_is_undecided(context):
+    assert evaluate(compile_condition('request.time < datetime("2026-06-01")'), context) is None
+
+
+@pytest.mark.parametrize("source", [
+    'request.country != "RU"',
+    'request.country == "FR"',
+    'not request.blocked',
+    'request.country not in ["RU", "KP"]',
+    'request.country in ["FR", "DE"]',
+    'request.ip in cidr("10.0.0.0/8")',
+    'request.ip not in cidr("10.0.0.0/8")',
+])
+@pytest.mark.parametrize("context", [{}, {"request": {}}, {"request": "FR"}])
+def test_missing_context_value_is_undecided(source, context):
+    assert evaluate(compile_condition(source), context) is None
+
+
+@pytest.mark.parametrize("source, context, expected", [
+    ('request.country != "RU"', {"request": {"country": "FR"}}, True),
+    ('request.country == "FR"', {"request": {"country": "RU"}}, False),
+    ('not request.blocked', {"request": {"blocked": False}}, True),
+    ('request.country not in ["RU", "KP"]', {"request": {"country": "KP"}}, False),
+    ('request.country == None', {"request": {"country": None}}, True),
+    ('request.time < datetime("2026-06-01")', {"request": {"time": "2026-05-31T23:59:59Z"}}, True),
+])
+def test_present_context_value_is_decided(source, context, expected):
+    assert evaluate(compile_condition(source), context) is expected
+
+
+def _policy(condition: str, effect: str = "ALLOW") -> CompiledPolicy:
+    records = {model_name: {} for model_name in (ROLE_MODEL_NAME, PERMISSION_MODEL_NAME, GROUP_MODEL_NAME,
+                                                 RESOURCE_ACTION_MODEL_NAME, RESOURCE_MODEL_NAME)}
+    records[ROLE_MODEL_NAME]["role"] = {
+        "uuid": "role", "metadata": {"name": "role"},
+        "rules": [{"resource_kind": "EVENT", "resource": "*", "resource_actions": ["view"],
+                   "effect": effect, "condition": condition}]}
+    records[PERMISSION_MODEL_NAME]["permission"] = {
+        "uuid": "permission", "metadata": {"name": "permission"}, "role": "role",
+        "subjects": [{"kind": "USER", "name": "u"}]}
+    return CompiledPolicy(1, records)
+
+
+@pytest.mark.parametrize("condition", ['request.country != "RU"', "not request.blocked",
+                                       'request.time < datetime("2026-06-01")'])
+@pytest.mark.parametrize("context", [{}, {"request": {"time": 5}}])
+def test_conditional_allow_needs_its_values(condition, context):
+    policy = _policy(condition)
+    assert policy.check(("USER", "u"), "EVENT", "e1", "view", context) is None
+
+
+def test_conditional_deny_applies_when_undecided():
+    policy = _policy('request.country != "RU"', effect="DENY")
+    grant = policy.check(("USER", "u"), "EVENT", "e1", "view", {})
+    assert grant is not None and grant.effect == "DENY"
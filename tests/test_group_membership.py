@@ -0,0 +1,51 @@
+import pytest
+
+from models.group.group_membership import (GROUP_MEMBERSHIP_MODEL_NAME,
+                                           rebuild_memberships)
+from models.group.group_model import GROUP_MODEL_NAME
+from models.indexes import (MIGRATION_MODEL_NAME, _claim_migration,
+                            ensure_group_memberships)
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["gala-iam-test"]
+    db[GROUP_MODEL_NAME].insert_many([
+        {"metadata": {"name": "parent", "namespace": "default"}, "subjects": [{"kind": "GROUP", "name": "child"}]},
+        {"metadata": {"name": "child", "namespace": "default"}, "subjects": [{"kind": "USER", "name": "u"}]},
+    ])
+    return db
+
+
+def _memberships(db):
+    return {(membership["kind"], membership["name"]): membership["groups"]
+            for membership in db[GROUP_MEMBERSHIP_MODEL_NAME].find()}
+
+
+def test_rebuild_keeps_current_and_drops_stale_memberships(db):
+    db[GROUP_MEMBERSHIP_MODEL_NAME].insert_many([
+        {"namespace": "default", "kind": "USER", "name": "u", "groups": ["child"]},
+        {"namespace": "default", "kind": "USER", "name": "gone", "groups": ["child"]},
+    ])
+    kept = db[GROUP_MEMBERSHIP_MODEL_NAME].find_one({"name": "u"})["_id"]
+
+    assert rebuild_memberships(db) == 2
+    assert _memberships(db) == {("USER", "u"): ["child", "parent"], ("GROUP", "child"): ["parent"]}
+    assert db[GROUP_MEMBERSHIP_MODEL_NAME].find_one({"name": "u"})["_id"] == kept
+
+
+def test_memberships_are_built_once(db):
+    assert ensure_group_memberships(db) == 2
+    assert db[MIGRATION_MODEL_NAME].find_one({"_id": GROUP_MEMBERSHIP_MODEL_NAME})["finished_at"]
+
+    db[GROUP_MEMBERSHIP_MODEL_NAME].delete_many({})
+    assert ensure_group_memberships(db) == 0
+    assert _memberships(db) == {}
+
+
+def test_claimed_rebuild_is_left_to_its_worker(db):
+    assert _claim_migration(db, GROUP_MEMBERSHIP_MODEL_NAME, 600)
+    assert ensure_group_memberships(db) == 0
+    assert _claim_migration(db, GROUP_MEMBERSHIP_MODEL_NAME, 0)
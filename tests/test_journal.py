@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import CRUD
+from db.crud import SEQUENCE_MODEL_NAME
+from db.journal import (CHANGES_SEQUENCE, JOURNAL_MODEL_NAME, UPSERT,
+                        JournalTruncatedException, read_changes)
+from models.role.role_model import ROLE_MODEL_NAME
+from policy.snapshot import SnapshotCache, build_snapshot, save_snapshot
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["gala-iam-test"]
+
+
+def _advance_sequence(db, count: int) -> int:
+    return CRUD.next_sequence(db, CHANGES_SEQUENCE, count)
+
+
+def _age_sequence(db, age: float):
+    db[SEQUENCE_MODEL_NAME].update_one({"_id": CHANGES_SEQUENCE},
+                                       {"$set": {"at": datetime.utcnow() - timedelta(seconds=age)}})
+
+
+def _journal(db, seq: int, age: float = 0):
+    db[JOURNAL_MODEL_NAME].insert_one({"seq": seq, "namespace": "default", "kind": ROLE_MODEL_NAME,
+                                       "uuid": "role-%d" % seq, "op": UPSERT,
+                                       "at": datetime.utcnow() - timedelta(seconds=age)})
+
+
+def test_expired_journal_is_truncated(db):
+    _advance_sequence(db, 5)
+    with pytest.raises(JournalTruncatedException) as exc:
+        read_changes(db, 3, "default")
+    assert exc.value.oldest == 6
+
+
+def test_caught_up_reader_is_not_truncated(db):
+    _advance_sequence(db, 5)
+    assert read_changes(db, 5, "default") == ([], 5)
+
+
+def test_pending_write_after_journaled_entry_is_not_truncated(db):
+    _advance_sequence(db, 5)
+    _journal(db, 4)
+    assert read_changes(db, 4, "default") == ([], 4)
+
+
+def test_snapshot_file_older_than_journal_is_rebuilt(db, tmp_path):
+    _advance_sequence(db, 3)
+    save_snapshot(str(tmp_path), "default", build_snapshot(db, "default", 3))
+
+    db[ROLE_MODEL_NAME].insert_one({"uuid": "role", "metadata": {"name": "role", "namespace": "default"},
+                                    "rules": []})
+    # Journaled as 4 and 5, both expired since
+    _advance_sequence(db, 2)
+
+    snapshot = SnapshotCache(version_ttl=0, directory=str(tmp_path)).get(db, "default")
+    assert snapshot.version == 5
+    assert "role" in snapshot.records[ROLE_MODEL_NAME]
+
+
+def test_tail_hole_settles_after_gap_timeout(db):
+    _advance_sequence(db, 5)
+    _journal(db, 4, age=60)
+    _age_sequence(db, 60)
+    assert read_changes(db, 4, "default") == ([], 5)
+
+
+def test_snapshot_moves_past_settled_tail_hole(db):
+    _advance_sequence(db, 4)
+    _journal(db, 4, age=60)
+    cache = SnapshotCache(version_ttl=0)
+    assert cache.get(db, "default").version == 4
+
+    # Allocated by a writer that failed to journal
+    _advance_sequence(db, 1)
+    _age_sequence(db, 60)
+    snapshot = cache.get(db, "default")
+    assert snapshot.version == 5
+    assert cache.get(db, "default") is snapshot
@@ -0,0 +1,43 @@
+import os
+import re
+
+import pytest
+from starlette.testclient import TestClient
+
+import utils.profiling as profiling
+from utils.profiling import StackSampler, write_profile
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING__OUTPUT_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize("path", ["/roles/" + "a" * 1000, "/roles/\x00", "/rôles/é☃", "/", "/../../etc/passwd"])
+def test_profile_file_name_is_safe(output_dir, path):
+    file_path = write_profile(StackSampler(), "GET", path)
+    file_name = os.path.basename(file_path)
+    assert os.path.dirname(file_path) == str(output_dir)
+    assert re.fullmatch(r"[A-Za-z0-9_.-]+", file_name)
+    assert len(file_name) < 128
+    assert os.path.exists(file_path)
+
+
+def test_profile_file_names_differ_by_path(output_dir):
+    first = write_profile(StackSampler(), "GET", "/roles/" + "a" * 100 + "1")
+    second = write_profile(StackSampler(), "GET", "/roles/" + "a" * 100 + "2")
+    assert first.split("-")[-1] != second.split("-")[-1]
+
+
+def test_unwritable_profile_keeps_the_response(tmp_path, monkeypatch):
+    import server
+
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    monkeypatch.setattr(profiling, "PROFILING__SAMPLE_RATE", 1)
+    monkeypatch.setattr(profiling, "PROFILING__OUTPUT_DIR", str(blocked))
+    response = TestClient(server.app).get("/livez")
+    assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+    assert "x-gala-profile-file" not in response.headers
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+import policy.snapshot_file as snapshot_file
+from models.group.group_model import GROUP_MODEL_NAME
+from models.permission.permission_model import PERMISSION_MODEL_NAME
+from models.resource.resource_model import RESOURCE_MODEL_NAME
+from models.resource_action.resource_action_model import RESOURCE_ACTION_MODEL_NAME
+from models.role.role_model import ROLE_MODEL_NAME
+from policy import CompiledPolicy
+from policy.shared import encode
+from policy.snapshot_file import read_snapshot_file, write_snapshot_file
+
+
+def _records():
+    records = {model_name: {} for model_name in (ROLE_MODEL_NAME, PERMISSION_MODEL_NAME, GROUP_MODEL_NAME,
+                                                 RESOURCE_ACTION_MODEL_NAME, RESOURCE_MODEL_NAME)}
+    records[ROLE_MODEL_NAME]["role"] = {
+        "uuid": "role", "metadata": {"name": "role"},
+        "rules": [{"resource_kind": "EVENT", "resource": "*", "resource_actions": ["view"]}]}
+    records[PERMISSION_MODEL_NAME]["permission"] = {
+        "uuid": "permission", "metadata": {"name": "permission"}, "role": "role",
+        "subjects": [{"kind": "USER", "name": "u"}], "expires_at": datetime(2026, 6, 4, 12, 30)}
+    return records
+
+
+def _write(path, records):
+    write_snapshot_file(str(path), "default", 7, encode(CompiledPolicy(7, records)), records, None)
+
+
+def test_records_round_trip_as_json_without_msgpack(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_file, "msgpack", None)
+    records = _records()
+    _write(tmp_path / "default.snapshot", records)
+    loaded = read_snapshot_file(str(tmp_path / "default.snapshot"), "default")
+    assert loaded.version == 7
+    assert loaded.records == records
+    assert isinstance(loaded.records[PERMISSION_MODEL_NAME]["permission"]["expires_at"], datetime)
+
+
+def test_msgpack_records_without_msgpack_are_invalid(tmp_path, monkeypatch):
+    pytest.importorskip("msgpack")
+    _write(tmp_path / "default.snapshot", _records())
+    monkeypatch.setattr(snapshot_file, "msgpack", None)
+    with pytest.raises(ValueError):
+        read_snapshot_file(str(tmp_path / "default.snapshot"), "default")